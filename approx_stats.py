@@ -0,0 +1,207 @@
+"""
+Approximate Statistics
+HyperLogLog distinct counts and rowid-sampled COUNT/SUM/AVG with confidence intervals
+"""
+import math
+import random
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosqlite
+import numpy as np
+from pandas.util import hash_array
+
+# Rowids looked up per query while sampling
+PROBE_BATCH = 5000
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """Vectorized splitmix64 finalizer: spreads uint64 inputs over all 64 bits"""
+    with np.errstate(over="ignore"):
+        x = (x + np.uint64(0x9E3779B97F4A7C15)) & _MASK64
+        x = ((x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)) & _MASK64
+        x = ((x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)) & _MASK64
+        return x ^ (x >> np.uint64(31))
+
+
+def hash_values(values: np.ndarray) -> np.ndarray:
+    """
+    64-bit hashes of an object array of SQLite values (NULLs are dropped)
+
+    Numbers hash by value, so 1 and 1.0 collide the way SQLite's DISTINCT
+    treats them; text and blobs go through pandas' vectorized hash.
+    """
+    present = values[values != None]  # noqa: E711 - elementwise None test
+    if not len(present):
+        return np.empty(0, dtype=np.uint64)
+    numeric = np.fromiter(
+        (t is int or t is float for t in map(type, present)), dtype=bool, count=len(present)
+    )
+    hashes = np.empty(len(present), dtype=np.uint64)
+    if numeric.any():
+        as_float = present[numeric].astype(np.float64) + 0.0  # folds -0.0 into 0.0
+        hashes[numeric] = _splitmix64(as_float.view(np.uint64))
+    if not numeric.all():
+        hashes[~numeric] = hash_array(present[~numeric], categorize=False)
+    return hashes
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch
+
+    2**precision one-byte registers; the relative standard error is about
+    1.04 / sqrt(2**precision) (0.81% at the default precision of 14, 16 KiB).
+    """
+
+    def __init__(self, precision: int = 14, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.m)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.intp)
+        rest = hashes & ((np.uint64(1) << (np.uint64(64) - p)) - np.uint64(1))
+        # rest < 2**50 converts to float64 exactly, so frexp gives its bit length
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - self.precision - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def add(self, values: np.ndarray) -> None:
+        """Add an object array of values"""
+        self.add_hashes(hash_values(values))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m * self.m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            # Small cardinalities: linear counting is more accurate
+            return self.m * math.log(self.m / zeros)
+        return float(raw)
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        registers = np.frombuffer(data, dtype=np.uint8).copy()
+        return cls(precision=int(math.log2(len(registers))), registers=registers)
+
+
+def z_score(confidence: float) -> float:
+    """Two-sided normal quantile, e.g. 1.96 for 0.95"""
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+def round_sig(value: Optional[float], digits: int = 4) -> Optional[float]:
+    if value is None or not math.isfinite(value):
+        return None
+    return float(f"{value:.{digits}g}")
+
+
+def interval(estimate: float, half_width: float) -> Dict[str, Any]:
+    return {
+        "estimate": round_sig(estimate),
+        "ci_low": round_sig(estimate - half_width),
+        "ci_high": round_sig(estimate + half_width),
+    }
+
+
+async def probe_rows(
+    db: aiosqlite.Connection,
+    table_sql: str,
+    select_sql: str,
+    probes: int,
+    rng: random.Random,
+    where: Optional[str] = None,
+) -> Optional[Tuple[List[Tuple[Any, ...]], int, int]]:
+    """
+    Look up `probes` distinct random rowids and return the matching rows
+
+    Every rowid between MIN(rowid) and MAX(rowid) is equally likely to be
+    probed, so matches / probes estimates (matching rows) / span.
+
+    Returns:
+        (matching rows, probes made, rowid span), or None for tables without rowids
+    """
+    try:
+        cursor = await db.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table_sql}")
+    except aiosqlite.OperationalError:
+        return None
+    low, high = await cursor.fetchone()
+    if low is None:
+        return [], 0, 0
+    span = high - low + 1
+    probes = min(probes, span)
+
+    if probes == span:
+        rowids = list(range(low, high + 1))
+    else:
+        rowids = [low + offset for offset in rng.sample(range(span), probes)]
+
+    filter_sql = f" AND ({where})" if where else ""
+    rows: List[Tuple[Any, ...]] = []
+    for start in range(0, len(rowids), PROBE_BATCH):
+        batch = rowids[start:start + PROBE_BATCH]
+        cursor = await db.execute(
+            f"SELECT {select_sql} FROM {table_sql} WHERE rowid IN ({', '.join('?' * len(batch))}){filter_sql}",
+            batch,
+        )
+        rows.extend(await cursor.fetchall())
+    return rows, probes, span
+
+
+def sampled_aggregates(
+    values: Optional[np.ndarray],
+    matches: int,
+    probes: int,
+    span: int,
+    z: float,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    COUNT, SUM and AVG estimates from a uniform rowid probe sample
+
+    COUNT and SUM scale the per-probe mean up to the whole rowid span (a probe
+    that misses contributes zero); AVG is the mean of the matched values.
+    Intervals use the normal approximation with a finite population correction.
+
+    Args:
+        values: Numeric values of the matched rows (NaN for NULL), or None for COUNT only
+        matches: Rows matched by the probes
+        probes: Rowids probed
+        span: Size of the rowid range
+        z: Normal quantile for the confidence level
+    """
+    fpc = math.sqrt((span - probes) / (span - 1)) if span > 1 else 0.0
+    p = matches / probes
+    count_se = span * math.sqrt(p * (1 - p) / probes) * fpc
+    results = {"count": interval(span * p, z * count_se)}
+    if values is None:
+        return results
+
+    # One y per probe: the value for matched rows, zero for misses and NULLs
+    y = np.zeros(probes)
+    y[:len(values)] = np.nan_to_num(values, nan=0.0)
+    sum_se = span * y.std(ddof=1) / math.sqrt(probes) * fpc if probes > 1 else 0.0
+    results["sum"] = interval(span * y.mean(), z * sum_se)
+
+    present = values[~np.isnan(values)]
+    if len(present):
+        avg_se = present.std(ddof=1) / math.sqrt(len(present)) * fpc if len(present) > 1 else 0.0
+        results["avg"] = interval(float(present.mean()), z * avg_se)
+    else:
+        results["avg"] = {"estimate": None, "ci_low": None, "ci_high": None}
+    return results
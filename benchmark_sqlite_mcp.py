@@ -0,0 +1,409 @@
+"""
+Benchmarks for the SQLite MCP server
+Run: python benchmark_sqlite_mcp.py [benchmark ...]
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiosqlite
+
+# Add current directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import sql_functions
+import sqlite_mcp_fastmcp as server
+
+
+def create_sample_db(path: Path, rows: int = 10000) -> None:
+    """Create a small sales table to benchmark against"""
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sales (id INTEGER PRIMARY KEY, region TEXT, product TEXT, amount REAL, qty INTEGER)"
+        )
+        conn.executemany(
+            "INSERT INTO sales (region, product, amount, qty) VALUES (?, ?, ?, ?)",
+            [
+                (f"region_{i % 7}", f"product_{i % 53}", (i * 37 % 1000) / 10.0, i % 11)
+                for i in range(rows)
+            ],
+        )
+        conn.commit()
+
+
+def report(label: str, timings_ms: list[float]) -> None:
+    timings_ms = sorted(timings_ms)
+    p95 = timings_ms[int(len(timings_ms) * 0.95) - 1]
+    print(
+        f"   {label:<28} total={sum(timings_ms):8.1f}ms  "
+        f"mean={statistics.mean(timings_ms):6.3f}ms  p95={p95:6.3f}ms"
+    )
+
+
+async def _legacy_execute_query(query: str) -> str:
+    """execute_query as it worked before pooling: one connection per call"""
+    async with aiosqlite.connect(server.DB_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(query)
+        rows = await cursor.fetchall()
+        return json.dumps([dict(row) for row in rows], indent=2, default=str)
+
+
+async def bench_pool(burst: int = 100) -> None:
+    """Burst of small queries: per-call connect vs persistent pool"""
+    print("\n=== Connection pool: burst of", burst, "small queries ===")
+    queries = [
+        f"SELECT region, product, amount FROM sales WHERE id = {i * 13 % 10000 + 1}"
+        for i in range(burst)
+    ]
+
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        await _legacy_execute_query(q)
+        timings.append((time.perf_counter() - start) * 1000)
+    report("connect per call (before)", timings)
+
+    await server.get_pool()
+    # Measure the pool, not the result cache (a repeated burst would be all hits)
+    cache_bytes, server.result_cache.max_bytes = server.result_cache.max_bytes, 0
+    try:
+        timings = []
+        for q in queries:
+            start = time.perf_counter()
+            await server.execute_query(q)
+            timings.append((time.perf_counter() - start) * 1000)
+        report("pooled (after)", timings)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(server.execute_query(q) for q in queries))
+        print(f"   {'pooled, concurrent burst':<28} total={(time.perf_counter() - start) * 1000:8.1f}ms")
+    finally:
+        server.result_cache.max_bytes = cache_bytes
+
+    # Cache misses still check the data version before running the query
+    server.result_cache.clear()
+    timings = []
+    for q in queries:
+        start = time.perf_counter()
+        await server.execute_query(q)
+        timings.append((time.perf_counter() - start) * 1000)
+    report("pooled, cache misses", timings)
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token for English/JSON text)"""
+    return (len(text) + 3) // 4
+
+
+async def bench_formats() -> None:
+    """Bytes and approximate tokens per result_format on examples/sales_data.csv"""
+    import pandas as pd
+    from data_pipeline import DataPipeline
+
+    print("\n=== Result formats: examples/sales_data.csv ===")
+    csv_path = Path(__file__).parent / "examples" / "sales_data.csv"
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = DataPipeline(upload_dir=tmp)
+        result = await pipeline.convert_csv_to_sqlite(csv_path, "sales")
+
+        # Also measure a larger synthetic table with the same shape
+        df = pd.read_csv(csv_path)
+        big = pd.concat([df] * 100, ignore_index=True)
+        big.columns = [pipeline.sanitize_column_name(c) for c in big.columns]
+        with sqlite3.connect(result["db_path"]) as conn:
+            big.to_sql("data_x100", conn, index=False)
+
+        previous_db = server.DB_FILE
+        await server.close_pool()
+        server.DB_FILE = result["db_path"]
+        try:
+            for label, query in [
+                ("SELECT * (10 rows)", "SELECT * FROM data"),
+                ("SELECT * (1,000 rows)", "SELECT * FROM data_x100"),
+                ("GROUP BY product", "SELECT product, SUM(total) AS revenue, COUNT(*) AS n FROM data GROUP BY product"),
+            ]:
+                print(f"   {label}")
+                baseline = None
+                for fmt in server.RESULT_FORMATS:
+                    text = await server.execute_query(query, result_format=fmt)
+                    # What actually crosses the pipe: the tool result wrapped in JSON
+                    wire = json.dumps({"result": text})
+                    baseline = baseline or len(wire)
+                    print(
+                        f"      {fmt:<8} bytes={len(text):7d}  wire={len(wire):7d}  "
+                        f"~tokens={approx_tokens(wire):6d}  ({len(wire) / baseline:5.1%} of json)"
+                    )
+        finally:
+            await server.close_pool()
+            server.DB_FILE = previous_db
+
+
+async def bench_mirror(rows: int = 300000, repeats: int = 20) -> None:
+    """Pool startup and uncached query latency: database file vs in-memory mirror"""
+    print("\n=== Memory mirror:", f"{rows:,}", "rows ===")
+    queries = [
+        ("point lookups (x50)", [f"SELECT * FROM sales WHERE id = {i * 997 % rows + 1}" for i in range(50)]),
+        ("GROUP BY scan", ["SELECT region, SUM(amount), COUNT(*) FROM sales GROUP BY region"]),
+        ("LIKE filter scan", ["SELECT COUNT(*) FROM sales WHERE product LIKE '%_1%'"]),
+    ]
+    previous = (server.DB_FILE, server.MEMORY_MIRROR_MAX_BYTES)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "mirror.db"
+        create_sample_db(db_path, rows=rows)
+        print(f"   database size {db_path.stat().st_size / 1e6:.1f} MB")
+        await server.close_pool()
+        server.DB_FILE = str(db_path)
+        try:
+            for label, mirror_bytes in [("file", 0), ("mirror", 1 << 40)]:
+                server.MEMORY_MIRROR_MAX_BYTES = mirror_bytes
+                start = time.perf_counter()
+                pool = await server.get_pool()
+                print(f"   {label}: pool open {(time.perf_counter() - start) * 1000:.1f}ms (mirrored={pool.mirrored})")
+                for name, batch in queries:
+                    timings = []
+                    for _ in range(repeats):
+                        # Measure execution, not the result cache
+                        server.result_cache.clear()
+                        start = time.perf_counter()
+                        for q in batch:
+                            await server.execute_query(q, result_format="compact")
+                        timings.append((time.perf_counter() - start) * 1000)
+                    report(f"{label}: {name}", timings)
+                start = time.perf_counter()
+                await server.execute_query("UPDATE sales SET qty = qty + 1 WHERE id = 1")
+                print(f"   {label + ': single-row UPDATE':<28} total={(time.perf_counter() - start) * 1000:8.1f}ms")
+                await server.close_pool()
+        finally:
+            await server.close_pool()
+            server.DB_FILE, server.MEMORY_MIRROR_MAX_BYTES = previous
+
+
+async def bench_udfs(rows: int = 300000, repeats: int = 5) -> None:
+    """Per-row cost of the Python SQL functions vs pure-SQL equivalents"""
+    print("\n=== SQL functions:", f"{rows:,}", "rows ===")
+    moments = "SUM(amount * amount) - SUM(amount) * SUM(amount) / COUNT(amount)"
+    middle = "SELECT amount FROM sales WHERE amount IS NOT NULL ORDER BY amount LIMIT 1 OFFSET"
+    pairs = [
+        ("AVG (C built-in)", "SELECT AVG(amount) FROM sales", None),
+        ("stddev", "SELECT stddev(amount) FROM sales",
+         f"SELECT sqrt(({moments}) / (COUNT(amount) - 1)) FROM sales"),
+        ("variance", "SELECT variance(amount) FROM sales",
+         f"SELECT ({moments}) / (COUNT(amount) - 1) FROM sales"),
+        ("corr", "SELECT corr(amount, qty) FROM sales",
+         "SELECT (AVG(amount * qty) - AVG(amount) * AVG(qty)) / sqrt((AVG(amount * amount) - AVG(amount) * AVG(amount))"
+         " * (AVG(qty * qty) - AVG(qty) * AVG(qty))) FROM sales"),
+        ("median", "SELECT median(amount) FROM sales",
+         f"{middle} (SELECT COUNT(amount) / 2 FROM sales)"),
+        ("percentile 90", "SELECT percentile(amount, 90) FROM sales",
+         f"{middle} (SELECT COUNT(amount) * 9 / 10 FROM sales)"),
+        ("REGEXP vs GLOB", "SELECT COUNT(*) FROM sales WHERE product REGEXP '_1[0-9]$'",
+         "SELECT COUNT(*) FROM sales WHERE product GLOB '*_1[0-9]'"),
+        ("moving stddev (window 100)",
+         "SELECT MAX(s) FROM (SELECT stddev(amount) OVER (ORDER BY id ROWS 99 PRECEDING) AS s FROM sales)",
+         "SELECT MAX(s) FROM (SELECT sqrt((SUM(amount * amount) OVER w - SUM(amount) OVER w * SUM(amount) OVER w"
+         " / COUNT(amount) OVER w) / (COUNT(amount) OVER w - 1)) AS s FROM sales WINDOW w AS (ORDER BY id ROWS 99 PRECEDING))"),
+    ]
+
+    def per_row_ns(conn: sqlite3.Connection, sql: str) -> float:
+        best = min(_timed(conn, sql) for _ in range(repeats))
+        return best * 1e9 / rows
+
+    def _timed(conn: sqlite3.Connection, sql: str) -> float:
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        return time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "udfs.db"
+        create_sample_db(db_path, rows=rows)
+        conn = sqlite3.connect(db_path)
+        try:
+            sql_functions.register(conn)
+            for label, udf_sql, plain_sql in pairs:
+                udf = per_row_ns(conn, udf_sql)
+                if plain_sql is None:
+                    print(f"   {label:<28} {udf:8.1f} ns/row")
+                    continue
+                plain = per_row_ns(conn, plain_sql)
+                print(f"   {label:<28} {udf:8.1f} ns/row   pure SQL {plain:8.1f} ns/row   ({udf / plain:4.1f}x)")
+        finally:
+            conn.close()
+
+
+async def bench_prewarm(switches: int = 5) -> None:
+    """Connect/switch latency: launching a server per database vs a pre-started pool"""
+    from mcp_client_fixed import MCPClient, MCPServerConfig
+    from mcp_server_pool import SQLiteServerPool
+
+    print("\n=== Server pool:", switches, "database switches ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(switches):
+            path = Path(tmp) / f"switch_{i}.db"
+            create_sample_db(path, rows=1000)
+            paths.append(str(path))
+
+        timings = []
+        for path in paths:
+            start = time.perf_counter()
+            client = MCPClient(MCPServerConfig.sqlite_server_params(path))
+            await client.connect()
+            timings.append((time.perf_counter() - start) * 1000)
+            await client.close()
+        report("launch per database", timings)
+
+        pool = SQLiteServerPool(size=2)
+        pool.start()
+        try:
+            timings = []
+            for path in paths:
+                # Switches are seconds apart in practice; let the refill finish
+                while pool.idle < pool.size:
+                    await asyncio.sleep(0.05)
+                start = time.perf_counter()
+                client = await pool.acquire(path)
+                timings.append((time.perf_counter() - start) * 1000)
+                await client.close()
+            report("pre-started pool", timings)
+            print(f"   pool stats: {pool.stats}")
+        finally:
+            await pool.close()
+
+
+def server_rss_mb() -> float:
+    """Total resident memory of this process's SQLite MCP server children (Linux /proc)"""
+    total = 0
+    for proc in Path("/proc").iterdir():
+        if not proc.name.isdigit():
+            continue
+        try:
+            stat = (proc / "stat").read_text()
+            cmdline = (proc / "cmdline").read_bytes()
+            if int(stat.rsplit(")", 1)[1].split()[1]) == os.getpid() and b"sqlite_mcp_fastmcp.py" in cmdline:
+                total += int((proc / "statm").read_text().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            continue
+    return total / 1024 / 1024
+
+
+async def bench_shared(users: int = 8) -> None:
+    """Server memory and connect latency for N users: a process each vs one shared server"""
+    from mcp_client_fixed import MCPClient, MCPServerConfig
+    from mcp_server_pool import SharedSQLiteServer
+
+    print("\n=== Shared server:", users, "users, one database each ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(users):
+            path = Path(tmp) / f"user_{i}.db"
+            create_sample_db(path, rows=1000)
+            paths.append(str(path))
+
+        async def run_users(connect) -> None:
+            clients, timings = [], []
+            try:
+                for path in paths:
+                    start = time.perf_counter()
+                    client = await connect(path)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    clients.append(client)
+                    await client.call_tool("execute_query", {"query": "SELECT COUNT(*) FROM sales"})
+                return timings, server_rss_mb()
+            finally:
+                for client in clients:
+                    await client.close()
+
+        async def launch(path):
+            client = MCPClient(MCPServerConfig.sqlite_server_params(path))
+            await client.connect()
+            return client
+
+        timings, rss = await run_users(launch)
+        report("process per user", timings)
+        print(f"   server RSS: {rss:.1f} MB")
+
+        shared = SharedSQLiteServer(roots=[tmp])
+        try:
+            timings, rss = await run_users(shared.acquire)
+            # The first connect includes starting the shared server itself
+            report("shared server", timings)
+            print(f"   server RSS: {rss:.1f} MB")
+        finally:
+            await shared.close()
+
+
+async def bench_transport(calls: int = 200) -> None:
+    """Per-call latency of the same tool calls over stdio vs the in-process transport"""
+    from mcp_client_fixed import MCPClient, MCPServerConfig
+    from mcp_server_pool import InProcessSQLiteServer
+
+    print("\n=== Transport:", calls, "execute_query calls ===")
+    queries = {
+        "1 row": "SELECT COUNT(*) FROM sales",
+        "1000 rows": "SELECT * FROM sales LIMIT 1000",
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "transport.db")
+        create_sample_db(path, rows=5000)
+
+        async def measure(label: str, client) -> None:
+            for name, query in queries.items():
+                # The result cache answers repeats, so this times the transport
+                await client.call_tool("execute_query", {"query": query})
+                timings = []
+                for _ in range(calls):
+                    start = time.perf_counter()
+                    await client.call_tool("execute_query", {"query": query})
+                    timings.append((time.perf_counter() - start) * 1000)
+                report(f"{label}, {name}", timings)
+
+        client = MCPClient(MCPServerConfig.sqlite_server_params(path))
+        await client.connect()
+        try:
+            await measure("stdio", client)
+        finally:
+            await client.close()
+
+        in_process = InProcessSQLiteServer(roots=[tmp])
+        try:
+            client = await in_process.acquire(path)
+            try:
+                await measure("in-process", client)
+            finally:
+                await client.close()
+        finally:
+            await in_process.close()
+
+
+BENCHMARKS = {
+    "pool": bench_pool,
+    "formats": bench_formats,
+    "mirror": bench_mirror,
+    "udfs": bench_udfs,
+    "prewarm": bench_prewarm,
+    "shared": bench_shared,
+    "transport": bench_transport,
+}
+
+
+async def main(selected: list[str]) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        create_sample_db(db_path)
+        server.DB_FILE = str(db_path)
+        try:
+            for name in selected or BENCHMARKS:
+                await BENCHMARKS[name]()
+        finally:
+            await server.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
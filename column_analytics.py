@@ -0,0 +1,203 @@
+"""
+Column Analytics
+Vectorized NumPy statistics over SQLite columns loaded once and cached in memory
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def to_numeric(values: np.ndarray) -> np.ndarray:
+    """
+    Convert an object array of SQLite values to float64
+
+    NULLs and text that does not parse as a number become NaN.
+    """
+    result = np.full(len(values), np.nan)
+    present = values != None  # noqa: E711 - elementwise None test
+    if not present.any():
+        return result
+    try:
+        result[present] = values[present].astype(np.float64)
+        return result
+    except (TypeError, ValueError):
+        pass
+
+    # Mixed column: fall back to converting value by value
+    for i in np.flatnonzero(present):
+        try:
+            result[i] = float(values[i])
+        except (TypeError, ValueError):
+            pass
+    return result
+
+
+def group_labels(values: np.ndarray) -> np.ndarray:
+    """Convert an object array of group-by values to a string array ("null" for NULL)"""
+    labels = values.astype(str)
+    labels[values == None] = "null"  # noqa: E711 - elementwise None test
+    return labels
+
+
+def _num(value: Any) -> Optional[float]:
+    """Round to 6 significant digits; NaN/inf become None so the JSON stays valid"""
+    value = float(value)
+    if not np.isfinite(value):
+        return None
+    return float(f"{value:.6g}")
+
+
+def describe(values: np.ndarray, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Any]:
+    """Descriptive statistics of a float array; missing counts NaN (NULL or non-numeric)"""
+    finite = values[~np.isnan(values)]
+    stats: Dict[str, Any] = {"count": int(len(finite)), "missing": int(len(values) - len(finite))}
+    if not len(finite):
+        return stats
+    stats.update({
+        "mean": _num(finite.mean()),
+        "std": _num(finite.std(ddof=1)) if len(finite) > 1 else None,
+        "min": _num(finite.min()),
+        "max": _num(finite.max()),
+        "sum": _num(finite.sum()),
+    })
+    qs = np.quantile(finite, list(quantiles))
+    stats["quantiles"] = {f"p{q * 100:g}": _num(v) for q, v in zip(quantiles, qs)}
+    return stats
+
+
+def _complete_cases(arrays: Dict[str, np.ndarray]) -> Tuple[List[str], np.ndarray]:
+    """Stack columns into a matrix and keep only rows without NaN"""
+    names = list(arrays)
+    matrix = np.column_stack([arrays[n] for n in names])
+    return names, matrix[~np.isnan(matrix).any(axis=1)]
+
+
+def correlation(arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Pearson correlation matrix over rows where every column is present"""
+    names, matrix = _complete_cases(arrays)
+    if len(matrix) < 2:
+        return {"columns": names, "rows_used": int(len(matrix)), "matrix": None}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = np.corrcoef(matrix, rowvar=False)
+    return {
+        "columns": names,
+        "rows_used": int(len(matrix)),
+        "matrix": [[_num(v) for v in row] for row in np.atleast_2d(corr)],
+    }
+
+
+def linear_regression(target: str, arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """Ordinary least squares of target on every other column, with an intercept"""
+    names, matrix = _complete_cases(arrays)
+    target_index = names.index(target)
+    predictors = [n for n in names if n != target]
+    y = matrix[:, target_index]
+    x = np.column_stack([np.ones(len(matrix)), np.delete(matrix, target_index, axis=1)])
+    if len(matrix) <= x.shape[1]:
+        return {"target": target, "rows_used": int(len(matrix)), "error": "Not enough complete rows"}
+
+    coef, _, rank, _ = np.linalg.lstsq(x, y, rcond=None)
+    residuals = y - x @ coef
+    ss_res = float(residuals @ residuals)
+    ss_tot = float(((y - y.mean()) ** 2).sum())
+    return {
+        "target": target,
+        "rows_used": int(len(matrix)),
+        "intercept": _num(coef[0]),
+        "coefficients": {name: _num(c) for name, c in zip(predictors, coef[1:])},
+        "r_squared": _num(1 - ss_res / ss_tot) if ss_tot > 0 else None,
+        "rank_deficient": bool(rank < x.shape[1]),
+    }
+
+
+def grouped(
+    labels: np.ndarray,
+    arrays: Dict[str, np.ndarray],
+    max_groups: int = 50,
+) -> Dict[str, Any]:
+    """
+    count/mean/sum/min/max/std per group for every column
+
+    Groups are computed with one np.unique and a handful of bincount calls per
+    column; the largest max_groups groups are returned.
+    """
+    group_names, inverse, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    order = np.argsort(-sizes, kind="stable")[:max_groups]
+    n_groups = len(group_names)
+
+    per_column = {}
+    for name, values in arrays.items():
+        valid = ~np.isnan(values)
+        idx = inverse[valid]
+        v = values[valid]
+        count = np.bincount(idx, minlength=n_groups)
+        total = np.bincount(idx, weights=v, minlength=n_groups)
+        minimum = np.full(n_groups, np.inf)
+        maximum = np.full(n_groups, -np.inf)
+        np.minimum.at(minimum, idx, v)
+        np.maximum.at(maximum, idx, v)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            # Second pass over deviations keeps the variance accurate for large values
+            squared = np.bincount(idx, weights=(v - mean[idx]) ** 2, minlength=n_groups)
+            std = np.sqrt(squared / (count - 1))
+        per_column[name] = (count, total, mean, std, minimum, maximum)
+
+    groups = []
+    for g in order:
+        entry = {"group": str(group_names[g]), "rows": int(sizes[g])}
+        for name, (count, total, mean, std, minimum, maximum) in per_column.items():
+            entry[name] = {
+                "count": int(count[g]),
+                "mean": _num(mean[g]),
+                "sum": _num(total[g]),
+                "min": _num(minimum[g]),
+                "max": _num(maximum[g]),
+                "std": _num(std[g]) if count[g] > 1 else None,
+            }
+        groups.append(entry)
+
+    return {"group_count": n_groups, "groups_omitted": max(0, n_groups - len(groups)), "groups": groups}
+
+
+class ColumnArrayCache:
+    """
+    LRU cache of loaded column arrays keyed by (table, column)
+
+    Entries remember the data version they were loaded at and are dropped on
+    lookup when the version moved on. Total size is bounded by nbytes.
+    """
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, np.ndarray]]" = OrderedDict()
+
+    def get(self, table: str, column: str, version: Any) -> Optional[np.ndarray]:
+        key = (table, column)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] != version:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, table: str, column: str, version: Any, values: np.ndarray) -> None:
+        key = (table, column)
+        if key in self._entries:
+            self._remove(key)
+        if values.nbytes > self.max_bytes:
+            return
+        while self._entries and self.current_bytes + values.nbytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+        self._entries[key] = (version, values)
+        self.current_bytes += values.nbytes
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        _, values = self._entries.pop(key)
+        self.current_bytes -= values.nbytes
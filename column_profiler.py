@@ -0,0 +1,249 @@
+"""
+Column Profiler
+Single-pass, NumPy-vectorized column statistics for SQLite tables
+"""
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from approx_stats import HyperLogLog
+
+# Distinct values counted per column. Past this the heaviest half is kept
+# (their counts become lower bounds) and distinct values are estimated with a
+# HyperLogLog sketch instead
+MAX_TRACKED_VALUES = 100_000
+
+# Numeric values kept per column, as a uniform reservoir sample, for the
+# quartiles and histogram; count, mean, std, min and max stay exact
+SAMPLE_SIZE = 20_000
+
+
+class _ValueCounts:
+    """Occurrences per distinct value, bounded to MAX_TRACKED_VALUES entries"""
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        # Started when the bound is first exceeded, from every value seen so far
+        self.sketch: Optional[HyperLogLog] = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.sketch is not None
+
+    def update(self, values: np.ndarray) -> Optional[np.ndarray]:
+        """Count one chunk of values; returns its distinct values, sorted"""
+        if not len(values):
+            return None
+        uniques, counts = np.unique(values, return_counts=True)
+        self.counts.update(dict(zip(uniques.tolist(), counts.tolist())))
+        if self.sketch is not None:
+            self.sketch.add(uniques.astype(object))
+        if len(self.counts) > MAX_TRACKED_VALUES:
+            if self.sketch is None:
+                self.sketch = HyperLogLog()
+                self.sketch.add(np.array(list(self.counts), dtype=object))
+            # A value dropped here starts from zero if it shows up again
+            self.counts = Counter(dict(self.counts.most_common(MAX_TRACKED_VALUES // 2)))
+        return uniques
+
+    def distinct(self) -> int:
+        return round(self.sketch.estimate()) if self.sketch is not None else len(self.counts)
+
+
+class _ColumnAccumulator:
+    """Running statistics for one column, fed one chunk of values at a time"""
+
+    def __init__(self, name: str, declared_type: str):
+        self.name = name
+        self.declared_type = declared_type
+        self.count = 0
+        self.null_count = 0
+        # Finite numeric values: exact moments and range, plus a reservoir sample
+        self.numeric_count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.numeric_min = np.inf
+        self.numeric_max = -np.inf
+        self.sample = np.empty(0)
+        self.rng = np.random.default_rng(0)
+        self.numeric_counts = _ValueCounts()
+        self.text_counts = _ValueCounts()
+        self.text_count = 0
+        self.text_length_sum = 0
+        self.text_min: Optional[str] = None
+        self.text_max: Optional[str] = None
+
+    def update(self, values: np.ndarray) -> None:
+        self.count += len(values)
+        present = values[values != None]  # noqa: E711 - elementwise None test
+        self.null_count += len(values) - len(present)
+        if not len(present):
+            return
+
+        types = set(map(type, present))
+        if types <= {int, float}:
+            self._add_numeric(present.astype(np.float64))
+            return
+
+        numeric_mask = np.fromiter(
+            (t is int or t is float for t in map(type, present)), dtype=bool, count=len(present)
+        )
+        if numeric_mask.any():
+            self._add_numeric(present[numeric_mask].astype(np.float64))
+        text = present[~numeric_mask].astype(str)
+        self.text_count += len(text)
+        self.text_length_sum += int(np.char.str_len(text).sum())
+
+        uniques = self.text_counts.update(text)
+        if uniques is not None:
+            low, high = uniques[0].item(), uniques[-1].item()
+            self.text_min = low if self.text_min is None else min(self.text_min, low)
+            self.text_max = high if self.text_max is None else max(self.text_max, high)
+
+    def _add_numeric(self, numeric: np.ndarray) -> None:
+        numeric = numeric[np.isfinite(numeric)]
+        if not len(numeric):
+            return
+        self.numeric_counts.update(numeric)
+
+        # Merge the chunk's mean and sum of squared deviations (Chan et al.)
+        n, chunk_mean = len(numeric), float(numeric.mean())
+        total = self.numeric_count + n
+        delta = chunk_mean - self.mean
+        self.m2 += float(((numeric - chunk_mean) ** 2).sum()) + delta * delta * self.numeric_count * n / total
+        self.mean += delta * n / total
+        self.numeric_min = min(self.numeric_min, float(numeric.min()))
+        self.numeric_max = max(self.numeric_max, float(numeric.max()))
+
+        # Reservoir sampling (algorithm R): the i-th value replaces a random
+        # slot with probability SAMPLE_SIZE / i
+        free = SAMPLE_SIZE - len(self.sample)
+        if free > 0:
+            self.sample = np.concatenate([self.sample, numeric[:free]])
+        rest = numeric[max(free, 0):]
+        if len(rest):
+            positions = self.numeric_count + max(free, 0) + np.arange(1, len(rest) + 1)
+            accepted = rest[self.rng.random(len(rest)) * positions < SAMPLE_SIZE]
+            self.sample[self.rng.integers(0, SAMPLE_SIZE, len(accepted))] = accepted
+        self.numeric_count = total
+
+    def result(self, top_k: int, bins: int) -> Dict[str, Any]:
+        if self.count == self.null_count:
+            kind = "empty"
+        elif not self.text_count:
+            kind = "numeric"
+        elif not self.numeric_count:
+            kind = "text"
+        else:
+            kind = "mixed"
+
+        profile: Dict[str, Any] = {
+            "name": self.name,
+            "declared_type": self.declared_type,
+            "kind": kind,
+            "count": self.count,
+            "null_count": self.null_count,
+            "null_fraction": round(self.null_count / self.count, 4) if self.count else 0.0,
+        }
+
+        distinct = 0
+        if self.numeric_count:
+            numeric_distinct = self.numeric_counts.distinct()
+            distinct += numeric_distinct
+            sampled = self.numeric_count > len(self.sample)
+            profile["min"] = _number(self.numeric_min)
+            profile["max"] = _number(self.numeric_max)
+            profile["mean"] = round(self.mean, 6)
+            profile["std"] = round((self.m2 / self.numeric_count) ** 0.5, 6)
+            p25, p50, p75 = np.percentile(self.sample, [25, 50, 75])
+            profile["quartiles"] = [float(p25), float(p50), float(p75)]
+            hist_counts, edges = np.histogram(
+                self.sample,
+                bins=max(1, min(bins, numeric_distinct)),
+                range=(self.numeric_min, self.numeric_max),
+            )
+            if sampled:
+                hist_counts = np.rint(hist_counts * (self.numeric_count / len(self.sample))).astype(np.int64)
+            profile["histogram"] = {
+                "edges": [float(e) for e in edges],
+                "counts": hist_counts.tolist(),
+            }
+            # Quartiles and histogram come from a sample of SAMPLE_SIZE values
+            profile["quantiles_exact"] = not sampled
+            if kind == "numeric" and not self.numeric_counts.truncated and numeric_distinct <= top_k:
+                # Low-cardinality numbers (flags, ratings) are really categories
+                profile["top_values"] = [
+                    {"value": _number(value), "count": count}
+                    for value, count in self.numeric_counts.counts.most_common()
+                ]
+
+        if self.text_count:
+            distinct += self.text_counts.distinct()
+            profile["top_values"] = [
+                {"value": value, "count": count}
+                for value, count in self.text_counts.counts.most_common(top_k)
+            ]
+            profile["avg_length"] = round(self.text_length_sum / self.text_count, 2)
+            if not self.numeric_count:
+                profile["min"] = self.text_min
+                profile["max"] = self.text_max
+
+        truncated = self.numeric_counts.truncated or self.text_counts.truncated
+        profile["distinct_count"] = distinct
+        profile["distinct_exact"] = not truncated
+        # More than MAX_TRACKED_VALUES distinct values: distinct_count is an
+        # estimate and top_values counts are lower bounds
+        profile["counts_truncated"] = truncated
+        return profile
+
+
+def _number(value: Any) -> Any:
+    """Return integral floats as int so JSON shows 3 rather than 3.0"""
+    value = float(value)
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+
+class TableProfiler:
+    """
+    Profile every column of a table in one pass over its rows
+
+    Rows are fed in chunks (e.g. from cursor.fetchmany); each chunk is turned
+    into a 2-D object array and every column is processed with vectorized
+    NumPy operations instead of one SQL aggregate per statistic. Memory per
+    column is bounded by SAMPLE_SIZE and MAX_TRACKED_VALUES, not the row count.
+    """
+
+    def __init__(self, columns: Sequence[str], declared_types: Optional[Sequence[str]] = None):
+        """
+        Args:
+            columns: Column names in result order
+            declared_types: Declared SQLite types, parallel to columns
+        """
+        declared_types = declared_types or [""] * len(columns)
+        self.columns = [_ColumnAccumulator(c, t or "") for c, t in zip(columns, declared_types)]
+        self.row_count = 0
+
+    def update(self, rows: Iterable[Sequence[Any]]) -> None:
+        """Add one chunk of rows"""
+        rows = list(rows)
+        if not rows:
+            return
+        self.row_count += len(rows)
+        matrix = np.empty((len(rows), len(self.columns)), dtype=object)
+        matrix[:] = rows
+        for i, column in enumerate(self.columns):
+            column.update(matrix[:, i])
+
+    def result(self, top_k: int = 10, bins: int = 10) -> Dict[str, Any]:
+        """
+        Finish the pass and return the profile
+
+        Args:
+            top_k: Most frequent values to report per column
+            bins: Histogram buckets for numeric columns
+        """
+        return {
+            "row_count": self.row_count,
+            "columns": [c.result(top_k, bins) for c in self.columns],
+        }
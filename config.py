@@ -20,6 +20,11 @@ class Config:
         self.debug = os.getenv("DEBUG", "false").lower() == "true"
         self.log_level = os.getenv("LOG_LEVEL", "INFO")
         
+        # Longest an MCP tool call may take before the client gives up (0 waits
+        # forever); above the SQLite server's longest deadline (export_query's
+        # 10 minutes) so the server reports its own timeouts first
+        self.mcp_tool_timeout_seconds = float(os.getenv("MCP_TOOL_TIMEOUT_SECONDS", "660"))
+        
         # Notion OAuth settings
         self.notion_client_id = os.getenv("NOTION_CLIENT_ID")
         self.notion_client_secret = os.getenv("NOTION_CLIENT_SECRET")
@@ -61,6 +66,7 @@ OPENROUTER_API_KEY = config.openrouter_api_key
 DEFAULT_MODEL = config.default_model
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 OPENROUTER_ENDPOINT = config.openrouter_endpoint
+MCP_TOOL_TIMEOUT_SECONDS = config.mcp_tool_timeout_seconds or None
 
 # Notion configuration exports
 NOTION_CLIENT_ID = config.notion_client_id
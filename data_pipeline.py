@@ -12,6 +12,8 @@ from typing import Dict, Any, List
 from datetime import datetime
 import logging
 
+from stats_store import stats_path
+
 logger = logging.getLogger(__name__)
 
 SQL_RESERVED_WORDS = {
@@ -28,6 +30,7 @@ class DataPipeline:
         self.upload_dir = Path(upload_dir)
         self.db_dir = self.upload_dir / "databases"
         self.original_dir = self.upload_dir / "original_files"
+        self.export_dir = self.upload_dir / "exports"
         self.metadata_file = self.upload_dir / "metadata.json"
         self._ensure_directories()
         
@@ -36,6 +39,7 @@ class DataPipeline:
         self.upload_dir.mkdir(exist_ok=True)
         self.db_dir.mkdir(exist_ok=True)
         self.original_dir.mkdir(exist_ok=True)
+        self.export_dir.mkdir(exist_ok=True)
         logger.info(f"Upload directories initialized at {self.upload_dir}")
         
     def sanitize_column_name(self, name: str) -> str:
@@ -321,6 +325,40 @@ class DataPipeline:
                 return db
         raise ValueError(f"Database not found: {db_id}")
     
+    def attachment_aliases(self, exclude_path: str = None, limit: int = 10) -> Dict[str, str]:
+        """
+        Stable SQL aliases for the uploaded databases, for attaching them to one server
+        
+        Aliases come from the upload names in upload order, so a database keeps
+        its alias as more files are uploaded. They are "db_" plus the name in
+        lowercase ASCII letters, digits and underscores, so every alias is a
+        plain identifier (never empty, a keyword or starting with a digit).
+        
+        Args:
+            exclude_path: Database file to leave out (the one the server opens as main)
+            limit: Maximum number of databases to return (the most recent uploads win)
+            
+        Returns:
+            Dictionary of alias -> database file path
+        """
+        databases = sorted(self.list_databases().get("databases", []), key=lambda db: db.get("uploaded_at", ""))
+        excluded = Path(exclude_path).resolve() if exclude_path else None
+        aliases = {}
+        for db in databases:
+            stem = re.sub(r"[^0-9a-z]+", "_", Path(db["name"]).stem.lower()).strip("_")
+            alias = f"db_{stem}" if stem else "db"
+            base, n = alias, 2
+            while alias in aliases:
+                alias = f"{base}_{n}"
+                n += 1
+            aliases[alias] = db["db_path"]
+        
+        selected = [
+            (alias, path) for alias, path in aliases.items()
+            if Path(path).exists() and Path(path).resolve() != excluded
+        ]
+        return dict(selected[-limit:]) if limit > 0 else {}
+        
     def update_active_database(self, db_id: str):
         """
         Mark a database as active and others as inactive
@@ -355,6 +393,11 @@ class DataPipeline:
             db_path.unlink()
             logger.info(f"Deleted database file: {db_path}")
         
+        # Column statistics the SQLite MCP server kept for it
+        stats_file = stats_path(str(db_path))
+        if stats_file.exists():
+            stats_file.unlink()
+        
         # Delete original file
         for ext in ['.csv', '.xlsx', '.xls']:
             original_path = self.original_dir / f"{db_id}{ext}"
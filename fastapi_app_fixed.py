@@ -55,12 +55,14 @@ import shutil
 from pathlib import Path
 
 from mcp_client_fixed import MCPClient, MCPServerConfig, ToolCall
+from mcp_server_pool import InProcessSQLiteServer, SQLiteServerPool, SharedSQLiteServer
 import sys
-from mcp import StdioServerParameters
 from llm_integration import LLMAgent
 from llm_integration_streaming import StreamingLLMAgent
 from llm_multi_server import MultiServerLLMAgent
 from data_pipeline import DataPipeline
+from result_export import is_export_name
+from user_sessions import ANONYMOUS, SessionActivityMiddleware, UserSessionManager
 from config import (
     DEFAULT_MODEL,
     NOTION_CLIENT_ID,
@@ -99,32 +101,122 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-user clients, agents and locks, evicted when idle, beyond the live
+# session cap or under memory pressure, and restored on the next chat
+user_sessions = UserSessionManager(
+    idle_ttl_seconds=float(os.environ.get("USER_SESSION_IDLE_TTL_SECONDS", "1800")),
+    max_live=int(os.environ.get("USER_SESSION_MAX_LIVE", "50")),
+    min_available_mb=float(os.environ.get("USER_SESSION_MIN_AVAILABLE_MB", "256")),
+)
+
+# Marks users busy while a request of theirs runs (so it is not evicted under
+# them); added before SessionMiddleware so it sees the session. The sidebar
+# polls /api/status, which must not keep an idle user alive.
+app.add_middleware(SessionActivityMiddleware, sessions=user_sessions, passive_paths=("/api/status",))
+
 # Session middleware (cookie-based sessions)
 SESSION_SECRET = os.environ.get("SESSION_SECRET", "dev-secret-change-me")
 if SESSION_SECRET == "dev-secret-change-me":
     logger.warning("⚠️  Using default session secret! Set SESSION_SECRET environment variable for production.")
 app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET, max_age=60 * 60 * 24 * 7)
 
-# Per-user client and agent instances
-user_clients: dict[str, MCPClient] = {}
-user_agents: dict[str, LLMAgent] = {}
-user_stream_agents: dict[str, StreamingLLMAgent] = {}
-user_locks: dict[str, asyncio.Lock] = {}
+# Per-user client and agent instances (owned by user_sessions)
+user_clients: dict[str, MCPClient] = user_sessions.clients
+user_agents: dict[str, LLMAgent] = user_sessions.agents
+user_stream_agents: dict[str, StreamingLLMAgent] = user_sessions.stream_agents
+user_locks: dict[str, asyncio.Lock] = user_sessions.locks
 
 # Per-user Notion API clients
-user_notion_clients: dict[str, Dict[str, NotionAPIClient]] = {}
+user_notion_clients: dict[str, Dict[str, NotionAPIClient]] = user_sessions.notion_clients
 
 # Global web search client (shared across all users)
 web_search_client: Optional[WebSearchClient] = None
 
 def get_lock_for_user(username: str) -> asyncio.Lock:
-    if username not in user_locks:
-        user_locks[username] = asyncio.Lock()
-    return user_locks[username]
+    return user_sessions.lock(username)
 
 # --- Minimal Auth + Chat History (SQLite) ---
 APP_DB_PATH = os.environ.get("APP_DB_PATH", "server.db")
 
+# Serve uploaded (ingested) databases through an immutable read-only SQLite server
+READ_ONLY_UPLOADS = os.environ.get("SQLITE_MCP_READ_ONLY_UPLOADS", "false").lower() == "true"
+
+# Attach the user's other uploads to the SQLite server so one process can query
+# (and join) all of them as alias.table; off (0) unless configured
+ATTACH_UPLOADS_LIMIT = int(os.environ.get("SQLITE_MCP_ATTACH_UPLOADS", "0"))
+
+
+# export_query files land in uploads/<user>/exports and are served from here
+EXPORTS_URL = "/api/exports"
+
+
+def upload_server_options(pipeline: DataPipeline, db_path: str) -> Dict[str, Any]:
+    """SQLite server options for an uploaded database, with the user's other uploads attached"""
+    return {
+        "read_only": READ_ONLY_UPLOADS,
+        "attachments": pipeline.attachment_aliases(exclude_path=db_path, limit=ATTACH_UPLOADS_LIMIT),
+        "export_dir": str(pipeline.export_dir),
+        "export_url": EXPORTS_URL,
+    }
+
+
+# Idle SQLite servers, already started, that connect/switch/upload hand out;
+# off (0) unless configured, since each one is a Python process kept running
+SQLITE_PREWARM = int(os.environ.get("SQLITE_MCP_PREWARM", "0"))
+
+# Or serve every user's SQLite database from a few shared server processes,
+# each user being one session on them, instead of one process per user
+SQLITE_SHARED = os.environ.get("SQLITE_MCP_SHARED", "false").lower() == "true"
+SQLITE_SHARED_PROCESSES = int(os.environ.get("SQLITE_MCP_SHARED_PROCESSES", "1"))
+
+# Or host the SQLite server inside this process (no subprocess or stdio hop)
+SQLITE_IN_PROCESS = os.environ.get("SQLITE_MCP_IN_PROCESS", "false").lower() == "true"
+
+SQLITE_ROOTS = [str(Path("uploads").resolve()), MCPServerConfig.default_db_path()]
+if SQLITE_IN_PROCESS:
+    server_pool = InProcessSQLiteServer(roots=SQLITE_ROOTS)
+elif SQLITE_SHARED:
+    server_pool = SharedSQLiteServer(roots=SQLITE_ROOTS, processes=SQLITE_SHARED_PROCESSES)
+else:
+    server_pool = SQLiteServerPool(size=SQLITE_PREWARM)
+
+async def open_user_client(reconnect: Dict[str, Any]) -> MCPClient:
+    """
+    Connect a user's MCP client
+    
+    Args:
+        reconnect: {"server_name": ...} for a configured server, or with
+            "db_path" and "options" for the SQLite server on a database
+    """
+    if reconnect.get("db_path"):
+        # A pre-started server when one is idle
+        return await server_pool.acquire(reconnect["db_path"], **reconnect["options"])
+    client = MCPClient(MCPServerConfig.get_configs()[reconnect["server_name"]])
+    await client.connect()
+    return client
+
+
+async def set_user_client(username: str, client: MCPClient, reconnect: Dict[str, Any]) -> None:
+    """Store a user's new client with fresh agents and remember how to reconnect it after eviction"""
+    user_clients[username] = client
+    user_agents[username] = LLMAgent(client, model=DEFAULT_MODEL)
+    user_stream_agents[username] = StreamingLLMAgent(client, model=DEFAULT_MODEL)
+    tools = [
+        {"name": t.name, "description": t.description or "", "source": "SQLite"}
+        for t in await client.list_tools()
+    ]
+    await user_sessions.connected(username, reconnect, tools)
+
+
+async def restore_user_session(username: str, snapshot: Dict[str, Any]) -> None:
+    """Reconnect an evicted user's clients; the new agents hydrate history from server.db"""
+    if snapshot.get("sqlite"):
+        client = await open_user_client(snapshot["sqlite"])
+        await set_user_client(username, client, snapshot["sqlite"])
+    for workspace_id in snapshot.get("notion", []):
+        await get_notion_client(username, workspace_id)
+
+
 async def init_app_db():
     import aiosqlite
     async with aiosqlite.connect(APP_DB_PATH) as db:
@@ -183,12 +275,22 @@ def require_user(request: Request) -> str:
         raise HTTPException(status_code=401, detail="Authentication required")
     return username
 
+# Usernames allowed to use the /api/admin endpoints (comma-separated)
+ADMIN_USERS = {u.strip() for u in os.environ.get("ADMIN_USERS", "").split(",") if u.strip()}
+
+def require_admin(request: Request) -> str:
+    """Get current user if they are listed in ADMIN_USERS, else raise 401/403"""
+    username = require_user(request)
+    if username not in ADMIN_USERS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return username
+
 def get_user_or_anonymous(request: Request) -> str:
     """Get current user or return anonymous for public endpoints"""
     username = request.session.get("username")
     if not username:
         # For public endpoints, return anonymous user
-        username = "anonymous"
+        username = ANONYMOUS
         request.session["username"] = username
         request.session["session_id"] = str(uuid.uuid4())
     return username
@@ -267,6 +369,12 @@ async def on_startup():
     
     await init_app_db()
     
+    # Start the idle SQLite servers in the background
+    server_pool.start()
+    
+    # Evict idle sessions in the background
+    user_sessions.start(restore=restore_user_session)
+    
     # Initialize web search client
     web_search_client = WebSearchClient()
     await web_search_client.connect()
@@ -290,6 +398,7 @@ async def api_root(request: Request):
         "message": "MCP Client API (Fixed)",
         "status": "running",
         "connected": bool(user_clients.get(request.session.get("username")))
+        or user_sessions.is_evicted(request.session.get("username"))
     }
 
 # ------------------ AUTH ------------------
@@ -380,49 +489,40 @@ async def connect_to_server(request: ConnectRequest, http_request: Request):
             
             # Create new client
             logger.info(f"Creating client for server: {request.server_name}")
-            server_config = server_configs[request.server_name]
             
             # IMPORTANT: For SQLite server, use the currently selected database instead of example.db
+            reconnect: Dict[str, Any] = {"server_name": request.server_name}
             if request.server_name == "SQLite":
+                pipeline = get_pipeline(username)
+                # Exports still go to the user's own directory on the example database
+                db_path = MCPServerConfig.default_db_path()
+                options = {"export_dir": str(pipeline.export_dir), "export_url": EXPORTS_URL}
                 active_database_id = http_request.session.get("active_database_id")
                 if active_database_id:
                     # User has selected a database - use that instead of example.db
-                    pipeline = get_pipeline(username)
                     try:
                         db_metadata = pipeline.get_database_by_id(active_database_id)
                         db_path = db_metadata["db_path"]
                         
-                        # Override server config to use the selected database
-                        current_dir = Path(__file__).parent.resolve()
-                        sqlite_server_script = str(current_dir / "sqlite_mcp_fastmcp.py")
-                        
-                        server_config = StdioServerParameters(
-                            command=sys.executable,
-                            args=["-u", sqlite_server_script, str(Path(db_path).resolve())],
-                            env=os.environ.copy(),
-                        )
+                        # Override server options to use the selected database
+                        options = upload_server_options(pipeline, db_path)
                         logger.info(f"Using selected database: {db_metadata['name']} ({db_path})")
                     except Exception as e:
                         logger.warning(f"Could not load selected database, using default: {e}")
                         # Fall back to default config
-            
-            client = MCPClient(server_config)
+                
+                reconnect.update(db_path=db_path, options=options)
             
             # Connect
-            await client.connect()
+            client = await open_user_client(reconnect)
+            
+            # Store client and LLM agents (regular and streaming) for this user -
+            # always DEFAULT_MODEL from config
+            await set_user_client(username, client, reconnect)
             
             # Get available tools (full objects)
             tools = await client.list_tools()
             
-            # Create LLM agents (regular and streaming) - Always use DEFAULT_MODEL from config
-            agent = LLMAgent(client, model=DEFAULT_MODEL)
-            streaming_agent = StreamingLLMAgent(client, model=DEFAULT_MODEL)
-            
-            # Store client and agents for this user
-            user_clients[username] = client
-            user_agents[username] = agent
-            user_stream_agents[username] = streaming_agent
-            
             logger.info(f"Successfully connected to {request.server_name} with LLM model {DEFAULT_MODEL}")
             
             # Serialize tools for UI
@@ -453,7 +553,12 @@ async def disconnect_from_server(http_request: Request):
     username = get_user_or_anonymous(http_request)
     lock = get_lock_for_user(username)
     async with lock:
+        # Do not reconnect this user after an eviction either
+        was_evicted = user_sessions.is_evicted(username)
+        user_sessions.forget(username)
         if user_clients.get(username) is None:
+            if was_evicted:
+                return {"status": "disconnected", "message": "Successfully disconnected"}
             return {"status": "not_connected", "message": "No active connection"}
         
         try:
@@ -474,7 +579,8 @@ async def disconnect_from_server(http_request: Request):
 async def get_status(http_request: Request):
     """Get connection status"""
     username = http_request.session.get("username")
-    if not username or user_clients.get(username) is None:
+    # An evicted user still counts as connected: the next chat reconnects them
+    if not username or (user_clients.get(username) is None and not user_sessions.is_evicted(username)):
         return {
             "connected": False,
             "server": None,
@@ -495,6 +601,8 @@ async def get_status(http_request: Request):
                     "description": getattr(t, "description", "") or "",
                     "source": "SQLite"
                 })
+        else:
+            tools_json.extend(user_sessions.evicted_tools(username))
         
         # Add Notion tools if connected
         if username in user_notion_clients:
@@ -537,6 +645,9 @@ async def chat(request: ChatRequest, http_request: Request):
     """Send a chat message with intelligent LLM tool calling"""
     username = get_user_or_anonymous(http_request)
     
+    # Reconnect a user whose session was evicted while idle
+    await user_sessions.restore(username)
+    
     # Check if we have any MCP servers (SQLite, Notion, or Web Search)
     has_sqlite = user_clients.get(username) is not None
     has_notion = username in user_notion_clients and len(user_notion_clients[username]) > 0
@@ -646,6 +757,9 @@ async def chat_stream(message: str, http_request: Request):
     """
     username = get_user_or_anonymous(http_request)
     
+    # Reconnect a user whose session was evicted while idle
+    await user_sessions.restore(username)
+    
     # Check if we have any MCP servers (SQLite, Notion, or Web Search)
     has_sqlite = user_clients.get(username) is not None
     has_notion = username in user_notion_clients and len(user_notion_clients[username]) > 0
@@ -777,6 +891,9 @@ async def chat_multi_server(request: ChatRequest, http_request: Request):
     session_id = http_request.session.get("session_id") or str(uuid.uuid4())
     http_request.session["session_id"] = session_id
     
+    # Reconnect a user whose session was evicted while idle
+    await user_sessions.restore(username)
+    
     try:
         logger.info(f"🔀 Multi-server chat: {request.message}")
         
@@ -948,27 +1065,16 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
                 except Exception as e:
                     logger.warning(f"Error closing previous client: {e}")
             
-            # Create new server config for uploaded database
-            current_dir = Path(__file__).parent.resolve()
-            sqlite_server_script = str(current_dir / "sqlite_mcp_fastmcp.py")
-            
-            server_config = StdioServerParameters(
-                command=sys.executable,
-                args=["-u", sqlite_server_script, str(Path(db_path).resolve())],
-                env=os.environ.copy(),
-            )
-            
             # Connect to new database
-            client = MCPClient(server_config)
-            await client.connect()
+            reconnect = {
+                "server_name": "SQLite",
+                "db_path": str(db_path),
+                "options": upload_server_options(pipeline, str(db_path)),
+            }
+            client = await open_user_client(reconnect)
             
             # Create agents
-            agent = LLMAgent(client, model=DEFAULT_MODEL)
-            streaming_agent = StreamingLLMAgent(client, model=DEFAULT_MODEL)
-            
-            user_clients[username] = client
-            user_agents[username] = agent
-            user_stream_agents[username] = streaming_agent
+            await set_user_client(username, client, reconnect)
             
             # Update session
             pipeline.update_active_database(database_id)
@@ -1061,29 +1167,17 @@ async def switch_database(request: dict, http_request: Request):
                 except Exception as e:
                     logger.warning(f"Error closing previous client: {e}")
             
-            # Create new server config for this database
-            # Use absolute paths for production deployment
-            current_dir = Path(__file__).parent.resolve()
-            sqlite_server_script = str(current_dir / "sqlite_mcp_fastmcp.py")
-            
-            server_config = StdioServerParameters(
-                command=sys.executable,
-                args=["-u", sqlite_server_script, str(Path(db_path).resolve())],
-                env=os.environ.copy(),
-            )
-            
             # Connect to new database
-            client = MCPClient(server_config)
-            await client.connect()
+            reconnect = {
+                "server_name": "SQLite",
+                "db_path": db_path,
+                "options": upload_server_options(pipeline, db_path),
+            }
+            client = await open_user_client(reconnect)
             
             # Always use DEFAULT_MODEL from config (modular approach)
             # Create new agents
-            agent = LLMAgent(client, model=DEFAULT_MODEL)
-            streaming_agent = StreamingLLMAgent(client, model=DEFAULT_MODEL)
-            
-            user_clients[username] = client
-            user_agents[username] = agent
-            user_stream_agents[username] = streaming_agent
+            await set_user_client(username, client, reconnect)
             
             # Update metadata
             pipeline.update_active_database(database_id)
@@ -1115,7 +1209,7 @@ async def switch_database(request: dict, http_request: Request):
         logger.error(f"Database switch failed: {type(e).__name__}: {str(e)}")
         logger.error(f"Full traceback:\n{traceback.format_exc()}")
         logger.error(f"Database path attempted: {db_path if 'db_path' in locals() else 'N/A'}")
-        logger.error(f"Server script: {sqlite_server_script if 'sqlite_server_script' in locals() else 'N/A'}")
+        logger.error(f"Server args: {getattr(client.server_params, 'args', None) if 'client' in locals() else 'N/A'}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1243,6 +1337,8 @@ async def delete_database(database_id: str, request: Request):
         
         # If this is the active database, disconnect first
         username = request.session.get("username")
+        if db_metadata.get("is_active"):
+            user_sessions.forget(username)
         if user_clients.get(username) and db_metadata.get("is_active"):
             lock = get_lock_for_user(username)
             async with lock:
@@ -1271,6 +1367,63 @@ async def delete_database(database_id: str, request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/exports/{file_name}")
+async def download_export(file_name: str, request: Request):
+    """Download a file written by the export_query tool (supports HTTP Range requests)"""
+    username = get_user_or_anonymous(request)
+    if not is_export_name(file_name):
+        raise HTTPException(status_code=400, detail="Invalid export file name")
+    
+    path = get_pipeline(username).export_dir / file_name
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Export not found (exports expire after a day)")
+    
+    if file_name.endswith(".gz"):
+        media_type = "application/gzip"
+    elif file_name.endswith(".ndjson"):
+        media_type = "application/x-ndjson"
+    else:
+        media_type = "text/csv"
+    # FileResponse answers Range requests with 206 partial content
+    return FileResponse(path, media_type=media_type, filename=file_name)
+
+
+# ================ ADMIN ================
+
+@app.get("/api/admin/query-stats")
+async def admin_query_stats(
+    request: Request,
+    top_n: int = 10,
+    order_by: str = "total_ms",
+    username: Optional[str] = None
+):
+    """Slow-query report (query_stats) from every connected SQLite server, per user"""
+    require_admin(request)
+    
+    clients = {username: user_clients.get(username)} if username else dict(user_clients)
+    servers = {}
+    for name, client in clients.items():
+        if client is None:
+            continue
+        try:
+            tool_call = await client.call_tool(
+                "query_stats", {"top_n": top_n, "order_by": order_by}, timeout_seconds=10
+            )
+            servers[name] = tool_call.json()
+        except Exception as e:
+            # Other MCP servers (or older SQLite servers) have no query_stats tool
+            servers[name] = {"status": "error", "message": str(e)}
+    
+    return {"servers": servers, "count": len(servers)}
+
+
+@app.get("/api/admin/sessions")
+async def admin_sessions(request: Request):
+    """Live, idle and evicted user session counts and the eviction limits"""
+    require_admin(request)
+    return user_sessions.stats()
+
+
 # ================ NOTION MCP INTEGRATION ================
 
 async def get_notion_client(username: str, workspace_id: str) -> Optional[NotionAPIClient]:
@@ -1553,6 +1706,8 @@ async def disconnect_notion(workspace_id: str, request: Request):
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
+    await user_sessions.close()
+    
     # Close all SQLite MCP clients
     for username, client in list(user_clients.items()):
         logger.info(f"Shutting down - closing MCP client for {username}")
@@ -1563,6 +1718,7 @@ async def shutdown_event():
     user_clients.clear()
     user_agents.clear()
     user_stream_agents.clear()
+    await server_pool.close()
     
     # Close all Notion MCP clients
     for username, workspaces in list(user_notion_clients.items()):
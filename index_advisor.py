@@ -0,0 +1,238 @@
+"""
+Index Advisor
+Query plan inspection and CREATE INDEX suggestions for slow SQLite queries
+"""
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_IDENT = r'(?:"[^"]+"|`[^`]+`|\[[^\]]+\]|\w+)'
+
+# Start of every clause we care about; the text up to the next keyword is the clause body
+_CLAUSE_RE = re.compile(
+    r"\b(WHERE|ON|ORDER\s+BY|GROUP\s+BY|HAVING|LIMIT|FROM|JOIN|SELECT|UNION|EXCEPT|INTERSECT|WINDOW|RETURNING|SET|USING)\b",
+    re.IGNORECASE,
+)
+_TABLE_REF_RE = re.compile(
+    rf"\b(?:FROM|JOIN|UPDATE|INTO)\s+({_IDENT})(?:\s+(?:AS\s+)?(?!(?:WHERE|ON|JOIN|LEFT|RIGHT|INNER|CROSS|NATURAL|OUTER|FULL|GROUP|ORDER|LIMIT|SET|USING|UNION|EXCEPT|INTERSECT|WINDOW|HAVING)\b)(\w+))?",
+    re.IGNORECASE,
+)
+_PREDICATE_RE = re.compile(
+    rf"({_IDENT}\s*\.\s*)?({_IDENT})\s*(==|=|<=|>=|<>|!=|<|>|\bIN\b|\bIS\b|\bBETWEEN\b)",
+    re.IGNORECASE,
+)
+_ORDER_TERM_RE = re.compile(rf"({_IDENT}\s*\.\s*)?({_IDENT})\s*(?:ASC|DESC|COLLATE\s+\w+)?\s*(?:,|$)", re.IGNORECASE)
+_AUTOMATIC_INDEX_RE = re.compile(r"^SEARCH (\S+) USING AUTOMATIC .*INDEX \((.*)\)", re.IGNORECASE)
+_SCAN_RE = re.compile(r"^SCAN (\S+)", re.IGNORECASE)
+
+_EQUALITY_OPS = {"=", "==", "IN", "IS"}
+
+
+def _unquote(ident: str) -> str:
+    ident = ident.strip()
+    if ident[:1] in ('"', "`", "[") and len(ident) > 1:
+        return ident[1:-1]
+    return ident
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def analyze_plan(plan_rows: Iterable[Tuple[Any, ...]]) -> Dict[str, Any]:
+    """
+    Summarize EXPLAIN QUERY PLAN output
+
+    Args:
+        plan_rows: (id, parent, notused, detail) rows from EXPLAIN QUERY PLAN
+
+    Returns:
+        Dictionary with the plan steps and the problems found in them
+    """
+    steps = []
+    full_scans = []
+    temp_btrees = []
+    automatic_indexes = []
+
+    for row in plan_rows:
+        detail = row[-1]
+        steps.append({"id": row[0], "parent": row[1], "detail": detail})
+
+        auto = _AUTOMATIC_INDEX_RE.match(detail)
+        if auto:
+            columns = [c.split("=")[0].strip() for c in auto.group(2).split(" AND ")]
+            automatic_indexes.append({"table": auto.group(1), "columns": columns, "detail": detail})
+            continue
+
+        scan = _SCAN_RE.match(detail)
+        # "SCAN t USING INDEX"/"USING COVERING INDEX" walks an index, not the table
+        if scan and "USING" not in detail.upper() and not detail.upper().startswith("SCAN CONSTANT"):
+            full_scans.append({"table": scan.group(1), "detail": detail})
+
+        if "USE TEMP B-TREE" in detail.upper():
+            temp_btrees.append(detail)
+
+    return {
+        "plan": steps,
+        "full_scans": full_scans,
+        "temp_btrees": temp_btrees,
+        "automatic_indexes": automatic_indexes,
+        "needs_attention": bool(full_scans or temp_btrees or automatic_indexes),
+    }
+
+
+def table_aliases(query: str) -> Dict[str, str]:
+    """Map every alias (and bare table name) in FROM/JOIN clauses to its table"""
+    aliases = {}
+    for match in _TABLE_REF_RE.finditer(_STRING_LITERAL_RE.sub("''", query)):
+        table = _unquote(match.group(1))
+        aliases[table] = table
+        if match.group(2):
+            aliases[match.group(2)] = table
+    return aliases
+
+
+def clause_columns(query: str) -> Dict[str, List[Tuple[Optional[str], str]]]:
+    """
+    Columns used by WHERE/ON predicates and ORDER BY/GROUP BY terms
+
+    Returns:
+        {"equality": [...], "range": [...], "order": [...]} where each entry is
+        (qualifier or None, column name), in order of appearance
+    """
+    text = _STRING_LITERAL_RE.sub("''", query)
+    result: Dict[str, List[Tuple[Optional[str], str]]] = {"equality": [], "range": [], "order": []}
+
+    matches = list(_CLAUSE_RE.finditer(text))
+    for i, match in enumerate(matches):
+        keyword = re.sub(r"\s+", " ", match.group(1).upper())
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.end():end]
+
+        if keyword in ("WHERE", "ON", "HAVING"):
+            for pred in _PREDICATE_RE.finditer(body):
+                qualifier = _unquote(pred.group(1).rstrip(" .")) if pred.group(1) else None
+                column = _unquote(pred.group(2))
+                op = pred.group(3).upper()
+                kind = "equality" if op in _EQUALITY_OPS else "range"
+                if (qualifier, column) not in result[kind]:
+                    result[kind].append((qualifier, column))
+        elif keyword in ("ORDER BY", "GROUP BY"):
+            for term in _ORDER_TERM_RE.finditer(body.strip()):
+                qualifier = _unquote(term.group(1).rstrip(" .")) if term.group(1) else None
+                column = _unquote(term.group(2))
+                if (qualifier, column) not in result["order"]:
+                    result["order"].append((qualifier, column))
+
+    return result
+
+
+@dataclass
+class IndexCandidate:
+    """A proposed index on one table"""
+    table: str
+    columns: List[str]
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        raw = "_".join(["idx", self.table, *self.columns])
+        return re.sub(r"\W+", "_", raw).lower()
+
+    def create_sql(self) -> str:
+        cols = ", ".join(_quote(c) for c in self.columns)
+        return f"CREATE INDEX IF NOT EXISTS {_quote(self.name)} ON {_quote(self.table)} ({cols})"
+
+
+def propose_indexes(
+    query: str,
+    plan: Dict[str, Any],
+    table_columns: Dict[str, Set[str]],
+) -> List[IndexCandidate]:
+    """
+    Suggest indexes that would remove the full scans, temp B-trees and
+    automatic indexes found in a query plan
+
+    Equality columns go first, then one range column, then ORDER BY/GROUP BY
+    columns, which is the order SQLite can use them in a single index.
+
+    Args:
+        query: The SQL text
+        plan: Output of analyze_plan() for the query
+        table_columns: Column names per table (lower-cased)
+    """
+    aliases = table_aliases(query)
+    clauses = clause_columns(query)
+
+    def resolve(qualifier: Optional[str], column: str, alias: str) -> bool:
+        table = aliases.get(alias, alias)
+        if qualifier is not None:
+            return aliases.get(qualifier, qualifier) == table and column.lower() in table_columns.get(table, set())
+        return column.lower() in table_columns.get(table, set())
+
+    candidates: Dict[Tuple[str, Tuple[str, ...]], IndexCandidate] = OrderedDict()
+
+    def add(table: str, columns: List[str], reason: str) -> None:
+        if not columns or table not in table_columns:
+            return
+        key = (table, tuple(c.lower() for c in columns))
+        candidate = candidates.setdefault(key, IndexCandidate(table=table, columns=columns))
+        if reason not in candidate.reasons:
+            candidate.reasons.append(reason)
+
+    for auto in plan["automatic_indexes"]:
+        add(aliases.get(auto["table"], auto["table"]), auto["columns"], "replaces automatic index")
+
+    # Tables whose rows get sorted: the scanned ones, or the only table queried
+    sorted_aliases: List[str] = []
+    if plan["temp_btrees"]:
+        sorted_aliases = [scan["table"] for scan in plan["full_scans"]]
+        if not sorted_aliases and len(set(aliases.values())) == 1:
+            sorted_aliases = list(set(aliases.values()))
+
+    for scan in plan["full_scans"]:
+        alias = scan["table"]
+        table = aliases.get(alias, alias)
+        eq = [c for q, c in clauses["equality"] if resolve(q, c, alias)]
+        rng = [c for q, c in clauses["range"] if resolve(q, c, alias) and c not in eq][:1]
+        columns = eq + rng
+        if columns:
+            add(table, columns, "removes full table scan")
+
+    for alias in sorted_aliases:
+        table = aliases.get(alias, alias)
+        eq = [c for q, c in clauses["equality"] if resolve(q, c, alias)]
+        order = [c for q, c in clauses["order"] if resolve(q, c, alias) and c not in eq]
+        if order:
+            add(table, eq + order, "removes temp B-tree sort")
+
+    return list(candidates.values())
+
+
+class SlowQueryLog:
+    """Bounded per-fingerprint record of queries that exceeded the slow threshold"""
+
+    def __init__(self, max_queries: int = 200):
+        self.max_queries = max_queries
+        self._queries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def record(self, fingerprint: str, query: str, duration_ms: float) -> None:
+        entry = self._queries.get(fingerprint)
+        if entry is None:
+            entry = {"query": query, "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            self._queries[fingerprint] = entry
+            if len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        else:
+            self._queries.move_to_end(fingerprint)
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        return list(self._queries.values())
+
+    def clear(self) -> None:
+        self._queries.clear()
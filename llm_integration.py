@@ -90,27 +90,8 @@ You have access to powerful tools for data querying and analysis. Use them effec
             if not self.mcp_client.session:
                 return []
             
-            tools_result = await self.mcp_client.session.list_tools()
-            
-            # Convert to OpenRouter format
-            openrouter_tools = []
-            for tool in tools_result.tools:
-                openrouter_tool = {
-                    "type": "function",
-                    "function": {
-                        "name": tool.name,
-                        "description": tool.description or f"Tool: {tool.name}",
-                        "parameters": tool.inputSchema or {
-                            "type": "object",
-                            "properties": {},
-                            "required": []
-                        }
-                    }
-                }
-                openrouter_tools.append(openrouter_tool)
-            
-            logger.info(f"Converted {len(openrouter_tools)} MCP tools to OpenRouter format")
-            return openrouter_tools
+            # Converted once by the client and cached until its tool list changes
+            return await self.mcp_client.openrouter_tools()
             
         except Exception as e:
             logger.error(f"Error converting MCP tools: {e}")
@@ -78,6 +78,10 @@ You have access to powerful tools for data querying and analysis. Use them effec
             return []
         
         try:
+            if hasattr(self.mcp_client, 'openrouter_tools'):
+                # MCPClient converts once and caches until its tool list changes
+                return await self.mcp_client.openrouter_tools()
+            
             tools_result = await self.mcp_client.list_tools()
             # tools_result may be a list[Tool] already; if not, adapt.
             tools = []
@@ -156,27 +156,17 @@ You have access to powerful tools for data querying and analysis across multiple
                 
                 # Handle MCPClient (SQLite)
                 elif hasattr(client, 'session') and client.session:
-                    tools_result = await client.session.list_tools()
-                    logger.info(f"  📊 Processing {len(tools_result.tools)} tools from {server_name} (MCPClient)")
+                    # Converted once by the client and cached until its tool list changes
+                    server_tools = await client.openrouter_tools(server_name)
+                    logger.info(f"  📊 Processing {len(server_tools)} tools from {server_name} (MCPClient)")
                     
-                    for tool in tools_result.tools:
-                        openrouter_tool = {
-                            "type": "function",
-                            "function": {
-                                "name": tool.name,
-                                "description": tool.description or f"Tool from {server_name}",
-                                "parameters": tool.inputSchema or {
-                                    "type": "object",
-                                    "properties": {},
-                                    "required": []
-                                }
-                            }
-                        }
+                    for openrouter_tool in server_tools:
                         all_tools.append(openrouter_tool)
-                        logger.debug(f"    ✓ Added tool: {tool.name} from {server_name}")
+                        tool_name = openrouter_tool["function"]["name"]
+                        logger.debug(f"    ✓ Added tool: {tool_name} from {server_name}")
                         
                         # Update routing
-                        self.tool_routing[tool.name] = server_name
+                        self.tool_routing[tool_name] = server_name
                 
                 else:
                     logger.warning(f"⚠️ Cannot extract tools from {server_name}")
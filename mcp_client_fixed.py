@@ -3,16 +3,19 @@ Fixed MCP Client for FastAPI
 Based on official MCP Python SDK patterns
 """
 import asyncio
+import json
 import logging
-from typing import Optional, Dict, Any, List
-from dataclasses import dataclass
-from datetime import datetime
+from typing import Optional, Dict, Any, List, Union
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from pydantic import AnyUrl
+from mcp.client.streamable_http import streamablehttp_client
 import mcp.types as types
 
+from config import MCP_TOOL_TIMEOUT_SECONDS
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -23,6 +26,29 @@ class ToolCall:
     result: str
     timestamp: datetime
     duration_ms: float
+    
+    def json(self) -> Any:
+        """Decode a JSON result (FastMCP wraps plain string results in {"result": ...})"""
+        data = json.loads(self.result)
+        if isinstance(data, dict) and set(data) == {"result"} and isinstance(data["result"], str):
+            data = json.loads(data["result"])
+        return data
+
+
+@dataclass
+class SharedServerParameters:
+    """One database on a shared SQLite MCP server (sqlite_mcp_fastmcp.py --shared)"""
+    url: str
+    token: str = field(repr=False)
+    db_path: str
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class InProcessServerParameters:
+    """One database on the SQLite MCP server hosted in this process (mcp_inprocess.py)"""
+    db_path: str
+    options: Dict[str, Any] = field(default_factory=dict)
 
 
 class MCPClient:
@@ -31,13 +57,35 @@ class MCPClient:
     Based on official MCP Python SDK patterns
     """
     
-    def __init__(self, server_params: StdioServerParameters):
-        """Initialize with server parameters"""
+    def __init__(
+        self,
+        server_params: Union[StdioServerParameters, SharedServerParameters, InProcessServerParameters],
+        tool_timeout_seconds: Optional[float] = MCP_TOOL_TIMEOUT_SECONDS
+    ):
+        """
+        Initialize with server parameters
+        
+        Args:
+            server_params: How to launch the stdio MCP server, or which database
+                to open on a shared or in-process server (the client is then a
+                per-user session on that server rather than the owner of a process)
+            tool_timeout_seconds: Default limit for a single tool call (None or 0 waits forever)
+        """
         self.server_params = server_params
+        self.tool_timeout_seconds = tool_timeout_seconds
         self.session: Optional[ClientSession] = None
-        self._stdio_context = None
-        self._read_stream = None
-        self._write_stream = None
+        # The stdio and session contexts are entered and exited by one task
+        # (anyio cancel scopes must be), so close() works from any task
+        self._lifecycle: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Future] = None
+        self._closing: Optional[asyncio.Event] = None
+        # Tool list and its OpenRouter schemas, kept until the server sends
+        # tools/list_changed or the client reconnects; the generation stops a
+        # fetch that raced an invalidation from storing a stale list
+        self._tools: Optional[List[types.Tool]] = None
+        self._openrouter_tools: Optional[List[Dict[str, Any]]] = None
+        self._openrouter_server_name: Optional[str] = None
+        self._tools_generation = 0
         
     async def connect(self) -> None:
         """Connect to MCP server"""
@@ -51,9 +99,9 @@ class MCPClient:
             
             if not isinstance(loop, asyncio.ProactorEventLoop):
                 logger.error("=" * 80)
-                logger.error(f"❌❌❌ FATAL ERROR: Wrong Event Loop Type! ❌❌❌")
+                logger.error("❌❌❌ FATAL ERROR: Wrong Event Loop Type! ❌❌❌")
                 logger.error(f"Current: {loop_type}")
-                logger.error(f"Required: ProactorEventLoop")
+                logger.error("Required: ProactorEventLoop")
                 logger.error("")
                 logger.error("Windows REQUIRES ProactorEventLoop for subprocess operations!")
                 logger.error("")
@@ -71,60 +119,196 @@ class MCPClient:
                     f"Subprocess operations will fail. Please restart with 'python run_windows.py'"
                 )
         
-        try:
+        if isinstance(self.server_params, InProcessServerParameters):
+            logger.info(f"Connecting to in-process MCP server for {self.server_params.db_path}")
+        elif self.shared:
+            logger.info(f"Connecting to shared MCP server {self.server_params.url} for {self.server_params.db_path}")
+        else:
             logger.info(f"Connecting to MCP server: {self.server_params.command}")
             logger.info(f"Server command: {self.server_params.command}")
             logger.info(f"Server args: {self.server_params.args}")
             logger.info(f"Server env: {'SET' if self.server_params.env else 'None'}")
-            
-            # Create stdio client context
-            self._stdio_context = stdio_client(self.server_params)
-            self._read_stream, self._write_stream = await self._stdio_context.__aenter__()
-            
-            logger.info("Stdio transport established")
-            
-            # Create client session
-            self.session = ClientSession(self._read_stream, self._write_stream)
-            await self.session.__aenter__()
-            
-            logger.info("Client session created")
-            
-            # Initialize the connection
-            await self.session.initialize()
-            
-            logger.info("Successfully connected and initialized MCP session")
-            
-        except Exception as e:
-            import traceback
-            logger.error(f"Failed to connect to MCP server: {type(e).__name__}: {str(e)}")
-            logger.error(f"Full traceback:\n{traceback.format_exc()}")
+        
+        self._ready = ready = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._lifecycle = asyncio.create_task(self._run_session(ready))
+        try:
+            await asyncio.shield(ready)
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                import traceback
+                logger.error(f"Failed to connect to MCP server: {type(e).__name__}: {str(e)}")
+                logger.error(f"Full traceback:\n{traceback.format_exc()}")
             await self.close()
             raise
+        
+        logger.info("Successfully connected and initialized MCP session")
+    
+    @property
+    def shared(self) -> bool:
+        """True for a session on a shared (or in-process) SQLite server"""
+        return isinstance(self.server_params, (SharedServerParameters, InProcessServerParameters))
+    
+    def _transport(self):
+        if isinstance(self.server_params, InProcessServerParameters):
+            from mcp_inprocess import host
+            
+            return host.connect()
+        if self.shared:
+            return streamablehttp_client(
+                self.server_params.url,
+                headers={"Authorization": f"Bearer {self.server_params.token}"},
+            )
+        return stdio_client(self.server_params)
+    
+    async def _open_shared_database(self) -> None:
+        """Bind this session of a shared server to its database"""
+        arguments = MCPServerConfig.sqlite_open_arguments(self.server_params.db_path, **self.server_params.options)
+        tool_call = await self.call_tool("open_database", arguments, timeout_seconds=30)
+        try:
+            result = tool_call.json()
+        except ValueError:
+            result = {"message": tool_call.result}
+        if not isinstance(result, dict) or result.get("status") != "success":
+            raise ConnectionError(f"Shared server could not open {self.server_params.db_path}: {result}")
+    
+    async def _run_session(self, ready: asyncio.Future) -> None:
+        """Own the transport and session until close() is called"""
+        try:
+            async with self._transport() as streams:
+                read_stream, write_stream = streams[0], streams[1]
+                logger.info("Transport established")
+                async with ClientSession(read_stream, write_stream, message_handler=self._handle_message) as session:
+                    logger.info("Client session created")
+                    try:
+                        await session.initialize()
+                        self.invalidate_tools()
+                        self.session = session
+                        if self.shared:
+                            await self._open_shared_database()
+                    except Exception as e:
+                        # Report this error, not the transport's wrapped teardown error
+                        ready.set_exception(e)
+                        raise
+                    ready.set_result(None)
+                    await self._closing.wait()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            elif ready.exception() is None:
+                logger.warning(f"MCP session ended with an error: {type(e).__name__}: {e}")
+        finally:
+            self.session = None
+            self.invalidate_tools()
+            if not ready.done():
+                ready.set_exception(ConnectionError("MCP server connection closed during startup"))
+    
+    async def _handle_message(self, message) -> None:
+        """ClientSession message handler: drop the cached tools when the server's list changes"""
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ToolListChangedNotification):
+            logger.info("Server tool list changed")
+            self.invalidate_tools()
+    
+    def invalidate_tools(self) -> None:
+        """Forget the cached tool list; the next list_tools() asks the server"""
+        self._tools = None
+        self._openrouter_tools = None
+        self._tools_generation += 1
     
     async def list_tools(self) -> List[types.Tool]:
-        """List available tools (full objects)"""
+        """
+        List available tools (full objects)
+        
+        The list is fetched once and cached until the server sends
+        tools/list_changed or the client reconnects.
+        """
         if not self.session:
             raise RuntimeError("Not connected. Call connect() first.")
         
+        if self._tools is not None:
+            return list(self._tools)
+        
         try:
+            generation = self._tools_generation
             tools_result = await self.session.list_tools()
             # Return full Tool objects for richer metadata (name, description, input schema)
-            return list(tools_result.tools)
+            tools = list(tools_result.tools)
+            if self.shared:
+                # The session is already bound; the LLM has no use for it
+                tools = [t for t in tools if t.name != "open_database"]
+            if generation == self._tools_generation:
+                self._tools = tools
+            return list(tools)
         except Exception as e:
             logger.error(f"Failed to list tools: {e}")
             raise
     
-    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> ToolCall:
-        """Execute a tool and return ToolCall object"""
+    async def openrouter_tools(self, server_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        The tools as OpenAI/OpenRouter function schemas, cached with the tool list
+        
+        Args:
+            server_name: Name the tools are registered under; tools without a
+                description are described as "Tool from <server_name>"
+        """
+        if (
+            self._openrouter_tools is None
+            or self._tools is None
+            or self._openrouter_server_name != server_name
+        ):
+            generation = self._tools_generation
+            converted = [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool.name,
+                        "description": tool.description or (
+                            f"Tool from {server_name}" if server_name else f"Tool: {tool.name}"
+                        ),
+                        "parameters": tool.inputSchema or {
+                            "type": "object",
+                            "properties": {},
+                            "required": []
+                        }
+                    }
+                }
+                for tool in await self.list_tools()
+            ]
+            if generation == self._tools_generation:
+                self._openrouter_tools = converted
+                self._openrouter_server_name = server_name
+            return list(converted)
+        return list(self._openrouter_tools)
+    
+    async def call_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        timeout_seconds: Optional[float] = None
+    ) -> ToolCall:
+        """
+        Execute a tool and return ToolCall object
+        
+        The call gives up after timeout_seconds (default: the client's
+        tool_timeout_seconds) and returns an error ToolCall. The SQLite server
+        bounds the work itself with its own query deadlines.
+        """
         if not self.session:
             raise RuntimeError("Not connected. Call connect() first.")
         
         start_time = datetime.now()
+        timeout_seconds = timeout_seconds if timeout_seconds is not None else self.tool_timeout_seconds
         
         try:
             logger.info(f"Calling tool '{tool_name}' with arguments: {arguments}")
             
-            result = await self.session.call_tool(tool_name, arguments)
+            result = await self.session.call_tool(
+                tool_name,
+                arguments,
+                read_timeout_seconds=timedelta(seconds=timeout_seconds) if timeout_seconds else None,
+            )
             
             end_time = datetime.now()
             duration_ms = (end_time - start_time).total_seconds() * 1000
@@ -176,22 +360,18 @@ class MCPClient:
         try:
             logger.info("Closing MCP client connection...")
             
-            if self.session:
-                try:
-                    await self.session.__aexit__(None, None, None)
-                except Exception as e:
-                    logger.warning(f"Error closing session: {e}")
-                self.session = None
-            
-            if self._stdio_context:
-                try:
-                    await self._stdio_context.__aexit__(None, None, None)
-                except Exception as e:
-                    logger.warning(f"Error closing stdio context: {e}")
-                self._stdio_context = None
-            
-            self._read_stream = None
-            self._write_stream = None
+            lifecycle, self._lifecycle = self._lifecycle, None
+            if lifecycle is not None:
+                self._closing.set()
+                if not self._ready.done():
+                    # Still starting up: nothing to shut down gracefully
+                    lifecycle.cancel()
+                await asyncio.wait({lifecycle})
+                if not lifecycle.cancelled() and lifecycle.exception():
+                    logger.warning(f"Error closing session: {lifecycle.exception()}")
+                if not self._ready.cancelled():
+                    self._ready.exception()  # startup errors were raised by connect()
+            self.session = None
             
             logger.info("MCP client closed successfully")
             
@@ -203,8 +383,25 @@ class MCPServerConfig:
     """MCP Server configurations"""
     
     @staticmethod
-    def get_configs() -> Dict[str, StdioServerParameters]:
-        """Get predefined server configurations"""
+    def sqlite_server_params(
+        db_path: str,
+        read_only: bool = False,
+        attachments: Optional[Dict[str, str]] = None,
+        export_dir: Optional[str] = None,
+        export_url: Optional[str] = None
+    ) -> StdioServerParameters:
+        """
+        Server parameters for the bundled SQLite MCP server
+        
+        Args:
+            db_path: Database file the server should open
+            read_only: Open the file immutable/read-only (for ingested uploads
+                that are never written)
+            attachments: Other database files to attach read-only, alias -> path;
+                their tables are queried as alias.table
+            export_dir: Directory export_query writes files to
+            export_url: URL prefix that serves export_dir (returned as download_url)
+        """
         import sys
         import os
         from pathlib import Path
@@ -212,17 +409,93 @@ class MCPServerConfig:
         # Get absolute paths for production deployment
         current_dir = Path(__file__).parent.resolve()
         sqlite_server_script = str(current_dir / "sqlite_mcp_fastmcp.py")
-        default_db = str(current_dir / "example.db")
+        
+        args = ["-u", sqlite_server_script, str(Path(db_path).resolve())]
+        if read_only:
+            args.append("--read-only")
+        for alias, path in (attachments or {}).items():
+            args += ["--attach", f"{alias}={Path(path).resolve()}"]
+        if export_dir:
+            args += ["--export-dir", str(Path(export_dir).resolve())]
+        if export_url:
+            args += ["--export-url", export_url]
         
         # Use current Python interpreter (works in venv/production)
-        python_executable = sys.executable
+        return StdioServerParameters(
+            command=sys.executable,
+            args=args,
+            env=os.environ.copy()
+        )
+    
+    @staticmethod
+    def sqlite_open_arguments(
+        db_path: str,
+        read_only: bool = False,
+        attachments: Optional[Dict[str, str]] = None,
+        export_dir: Optional[str] = None,
+        export_url: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Arguments of the open_database tool equivalent to sqlite_server_params"""
+        from pathlib import Path
         
+        arguments: Dict[str, Any] = {"db_path": str(Path(db_path).resolve()), "read_only": read_only}
+        if attachments:
+            arguments["attachments"] = {alias: str(Path(path).resolve()) for alias, path in attachments.items()}
+        if export_dir:
+            arguments["export_dir"] = str(Path(export_dir).resolve())
+        if export_url:
+            arguments["export_url"] = export_url
+        return arguments
+    
+    @staticmethod
+    def sqlite_standby_params() -> StdioServerParameters:
+        """
+        Server parameters for a SQLite MCP server started without a database
+        
+        It waits for the open_database tool, which takes the same options as
+        sqlite_server_params (see SQLiteServerPool).
+        """
+        import sys
+        import os
+        from pathlib import Path
+        
+        sqlite_server_script = str(Path(__file__).parent.resolve() / "sqlite_mcp_fastmcp.py")
+        return StdioServerParameters(
+            command=sys.executable,
+            args=["-u", sqlite_server_script, "--standby"],
+            env=os.environ.copy()
+        )
+    
+    @staticmethod
+    def sqlite_shared_params(roots: List[str], host: str, port: int) -> StdioServerParameters:
+        """
+        Command line of a shared SQLite MCP server serving databases under roots
+        
+        It listens for streamable HTTP on host:port (not stdio) and needs the
+        SQLITE_MCP_SHARED_TOKEN environment variable; see SharedSQLiteServer.
+        """
+        import sys
+        import os
+        from pathlib import Path
+        
+        sqlite_server_script = str(Path(__file__).parent.resolve() / "sqlite_mcp_fastmcp.py")
+        args = ["-u", sqlite_server_script, "--shared", "--host", host, "--port", str(port)]
+        for root in roots:
+            args += ["--shared-root", str(Path(root).resolve())]
+        return StdioServerParameters(command=sys.executable, args=args, env=os.environ.copy())
+    
+    @staticmethod
+    def default_db_path() -> str:
+        """The bundled example database"""
+        from pathlib import Path
+        
+        return str(Path(__file__).parent.resolve() / "example.db")
+    
+    @staticmethod
+    def get_configs() -> Dict[str, StdioServerParameters]:
+        """Get predefined server configurations"""
         return {
-            "SQLite": StdioServerParameters(
-                command=python_executable,
-                args=["-u", sqlite_server_script, default_db],
-                env=os.environ.copy()
-            ),
+            "SQLite": MCPServerConfig.sqlite_server_params(MCPServerConfig.default_db_path()),
             "Filesystem": StdioServerParameters(
                 command="npx",
                 args=["-y", "@modelcontextprotocol/server-filesystem", "."],
@@ -0,0 +1,176 @@
+"""
+MCP In-Process Host
+The bundled SQLite MCP server run on a background thread of this process, reached over in-memory streams
+"""
+import asyncio
+import logging
+import math
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Tuple
+
+import anyio
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+
+logger = logging.getLogger(__name__)
+
+
+def _deliver(stream: MemoryObjectSendStream, message) -> None:
+    """Hand a message to a stream owned by the loop this runs on (the other side may be gone)"""
+    try:
+        stream.send_nowait(message)
+    except (anyio.BrokenResourceError, anyio.ClosedResourceError):
+        pass
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback, *args) -> None:
+    """loop.call_soon_threadsafe, ignoring a loop that has already been closed"""
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        pass
+
+
+async def _forward(
+    source: MemoryObjectReceiveStream,
+    loop: asyncio.AbstractEventLoop,
+    target: MemoryObjectSendStream
+) -> None:
+    """Pass every message from source to target, which belongs to another thread's loop"""
+    try:
+        async with source:
+            async for message in source:
+                _call_soon(loop, _deliver, target, message)
+    finally:
+        # Ending the stream ends the session on the other side
+        _call_soon(loop, target.close)
+
+
+class InProcessHost:
+    """
+    Runs sqlite_mcp_fastmcp's FastMCP app in shared mode on its own thread
+    and event loop
+
+    Each connect() is one MCP session. Messages are passed between the two
+    loops as objects, with no JSON encoding, pipe or second process. The
+    SQLite calls run on aiosqlite's worker threads and the rest of each tool
+    call on the host loop, so the caller's loop is never blocked by tools.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self, roots: List[str]) -> None:
+        """
+        Start the host thread if it is not running and set the allowed roots
+
+        Args:
+            roots: Directories (or files) sessions may open databases from
+        """
+        # Imported here: the server module opens nothing, but pulls in numpy and the tools
+        import sqlite_mcp_fastmcp
+
+        with self._lock:
+            sqlite_mcp_fastmcp.enable_shared_mode(roots)
+            if self._loop is not None:
+                return
+            # The SDK logs every request at INFO; in this process that would
+            # flood the host app's log and cost more than the call itself
+            logging.getLogger("mcp.server.lowlevel.server").setLevel(logging.WARNING)
+            started = threading.Event()
+
+            def run_loop() -> None:
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                self._loop = loop
+                started.set()
+                try:
+                    loop.run_forever()
+                finally:
+                    loop.close()
+
+            self._thread = threading.Thread(target=run_loop, name="sqlite-mcp-in-process", daemon=True)
+            self._thread.start()
+            started.wait()
+            logger.info("In-process SQLite MCP host started")
+
+    async def _serve(
+        self,
+        to_server: MemoryObjectReceiveStream,
+        client_loop: asyncio.AbstractEventLoop,
+        to_client: MemoryObjectSendStream
+    ) -> None:
+        """One MCP session, on the host loop"""
+        import sqlite_mcp_fastmcp
+
+        write_send, write_receive = anyio.create_memory_object_stream(0)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(_forward, write_receive, client_loop, to_client)
+            async with to_server, write_send:
+                await sqlite_mcp_fastmcp.serve_session(to_server, write_send)
+
+    @asynccontextmanager
+    async def connect(self) -> AsyncIterator[Tuple[MemoryObjectReceiveStream, MemoryObjectSendStream]]:
+        """
+        A new MCP session: yields (read_stream, write_stream) for a ClientSession
+
+        The session ends, and releases its database, when the context exits.
+        """
+        if self._loop is None:
+            raise RuntimeError("In-process MCP host is not running. Call start() first.")
+        client_loop = asyncio.get_running_loop()
+        # Each loop only waits on streams it owns; _forward hops between them.
+        # The receiving ends are unbounded so a hop never has to wait.
+        to_client, read_stream = anyio.create_memory_object_stream(math.inf)
+        write_stream, from_client = anyio.create_memory_object_stream(0)
+        to_server, server_read = anyio.create_memory_object_stream(math.inf)
+
+        session = asyncio.run_coroutine_threadsafe(self._serve(server_read, client_loop, to_client), self._loop)
+        try:
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(_forward, from_client, self._loop, to_server)
+                async with read_stream, write_stream:
+                    yield read_stream, write_stream
+        finally:
+            with anyio.CancelScope(shield=True):
+                # Closing write_stream ended the session; wait for its cleanup
+                try:
+                    await asyncio.wrap_future(session)
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.warning(f"In-process MCP session ended with an error: {type(e).__name__}: {e}")
+
+    async def stop(self) -> None:
+        """End open sessions, close the databases and stop the host thread"""
+        import sqlite_mcp_fastmcp
+
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+
+        async def shut_down() -> None:
+            # Sessions release their databases as they end; close any left after
+            current = asyncio.current_task()
+            tasks = [task for task in asyncio.all_tasks() if task is not current]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await sqlite_mcp_fastmcp.close_shared_databases()
+
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(shut_down(), loop))
+        loop.call_soon_threadsafe(loop.stop)
+        await asyncio.to_thread(thread.join)
+        logger.info("In-process SQLite MCP host stopped")
+
+
+# The server module's state is per process, so there is one host per process
+host = InProcessHost()
@@ -0,0 +1,331 @@
+"""
+MCP Server Pool
+Pre-started SQLite MCP server processes, shared multi-database servers or the in-process server, handed out as connected clients
+"""
+import asyncio
+import logging
+import secrets
+import socket
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from config import MCP_TOOL_TIMEOUT_SECONDS
+from mcp_client_fixed import InProcessServerParameters, MCPClient, MCPServerConfig, SharedServerParameters
+from mcp_inprocess import host
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteServerPool:
+    """
+    Keeps `size` standby SQLite MCP servers connected and idle
+
+    acquire() takes an idle server, points it at the database with the
+    open_database tool and starts a replacement in the background, so the
+    caller skips interpreter startup, imports and MCP initialization. When no
+    idle server is ready, or the hand-off fails, it launches a server for the
+    database directly, as before.
+    """
+
+    def __init__(self, size: int = 2, tool_timeout_seconds: Optional[float] = MCP_TOOL_TIMEOUT_SECONDS):
+        """
+        Args:
+            size: Number of idle servers to keep (0 disables pre-starting)
+            tool_timeout_seconds: Passed to every MCPClient handed out
+        """
+        self.size = max(0, size)
+        self.tool_timeout_seconds = tool_timeout_seconds
+        self._idle: Deque[MCPClient] = deque()
+        self._starting = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+        self.stats = {"warm": 0, "cold": 0, "failed_handoffs": 0, "failed_starts": 0}
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    def start(self) -> None:
+        """Begin starting idle servers in the background"""
+        self._closed = False
+        self._refill()
+
+    def _refill(self) -> None:
+        while not self._closed and len(self._idle) + self._starting < self.size:
+            self._starting += 1
+            task = asyncio.create_task(self._start_one())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _start_one(self) -> None:
+        client = MCPClient(MCPServerConfig.sqlite_standby_params(), self.tool_timeout_seconds)
+        try:
+            await client.connect()
+            # Lets the session validate open_database's result without a warning
+            await client.list_tools()
+        except Exception as e:
+            # Not retried here: the next acquire() tries again
+            self.stats["failed_starts"] += 1
+            logger.warning(f"Could not start a standby SQLite server: {e}")
+            await client.close()
+            return
+        finally:
+            self._starting -= 1
+        if self._closed:
+            await client.close()
+        else:
+            self._idle.append(client)
+
+    async def _hand_off(self, client: MCPClient, db_path: str, options: Dict[str, Any]) -> bool:
+        """Open the database on a standby server; False if it is unusable"""
+        arguments = MCPServerConfig.sqlite_open_arguments(db_path, **options)
+        tool_call = await client.call_tool("open_database", arguments, timeout_seconds=30)
+        try:
+            result = tool_call.json()
+        except ValueError:
+            result = {"message": tool_call.result}
+        if not isinstance(result, dict) or result.get("status") != "success":
+            logger.warning(f"Standby SQLite server could not open {db_path}: {result}")
+            return False
+        # Describe the server the way a direct launch would (logging, reconnects)
+        client.server_params = MCPServerConfig.sqlite_server_params(db_path, **options)
+        return True
+
+    async def acquire(
+        self,
+        db_path: str,
+        read_only: bool = False,
+        attachments: Optional[Dict[str, str]] = None,
+        export_dir: Optional[str] = None,
+        export_url: Optional[str] = None
+    ) -> MCPClient:
+        """
+        A connected client for a SQLite server on db_path
+
+        Takes the same arguments as MCPServerConfig.sqlite_server_params. The
+        caller owns the returned client and closes it as usual.
+        """
+        options = {
+            "read_only": read_only,
+            "attachments": attachments,
+            "export_dir": export_dir,
+            "export_url": export_url,
+        }
+        if self._idle:
+            client = self._idle.popleft()
+            self._refill()
+            if await self._hand_off(client, db_path, options):
+                self.stats["warm"] += 1
+                return client
+            # A dead server or a bad database: the direct launch below reports which
+            self.stats["failed_handoffs"] += 1
+            await client.close()
+
+        self._refill()
+        client = MCPClient(
+            MCPServerConfig.sqlite_server_params(db_path, **options), self.tool_timeout_seconds
+        )
+        await client.connect()
+        self.stats["cold"] += 1
+        return client
+
+    async def close(self) -> None:
+        """Stop the idle servers and any still starting"""
+        self._closed = True
+        if self._tasks:
+            await asyncio.wait(set(self._tasks))
+        while self._idle:
+            await self._idle.popleft().close()
+
+
+class SharedSQLiteServer:
+    """
+    A few long-running shared SQLite MCP servers (--shared) that every user's
+    MCPClient connects to over HTTP, instead of each user owning a process
+
+    Each client is one MCP session bound to its database; the server keeps a
+    connection pool per open database. Databases are spread over the
+    processes by path, so every session on one database shares its pool.
+    acquire() matches SQLiteServerPool.acquire.
+    """
+
+    def __init__(
+        self,
+        roots: List[str],
+        processes: int = 1,
+        host: str = "127.0.0.1",
+        tool_timeout_seconds: Optional[float] = MCP_TOOL_TIMEOUT_SECONDS,
+        startup_timeout_seconds: float = 30
+    ):
+        """
+        Args:
+            roots: Directories (or files) sessions may open databases from
+            processes: Number of server processes to run
+            host: Address the servers listen on
+            tool_timeout_seconds: Passed to every MCPClient handed out
+            startup_timeout_seconds: How long to wait for a server to listen
+        """
+        self.roots = [str(Path(root).resolve()) for root in roots]
+        self.processes = max(1, processes)
+        self.host = host
+        self.tool_timeout_seconds = tool_timeout_seconds
+        self.startup_timeout_seconds = startup_timeout_seconds
+        # Passed to the servers through the environment, never the command line
+        self.token = secrets.token_urlsafe(32)
+        self._servers: List[Optional[Tuple[asyncio.subprocess.Process, int]]] = [None] * self.processes
+        self._locks = [asyncio.Lock() for _ in range(self.processes)]
+        # Background starts, kept so they are not collected mid-run and close() can stop them
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {"sessions": 0, "server_starts": 0, "failed_starts": 0}
+
+    def start(self) -> None:
+        """Begin starting the server processes in the background"""
+        for index in range(self.processes):
+            task = asyncio.create_task(self._server(index))
+            self._tasks.add(task)
+            task.add_done_callback(self._start_done)
+
+    def _start_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        # Not retried here: the next acquire() for the slot tries again
+        self.stats["failed_starts"] += 1
+        logger.warning(f"Could not start a shared SQLite MCP server: {task.exception()}")
+
+    @staticmethod
+    def _free_port(host: str) -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind((host, 0))
+            return sock.getsockname()[1]
+
+    async def _server(self, index: int) -> Tuple[asyncio.subprocess.Process, int]:
+        """The running process for slot index, (re)starting it if needed"""
+        async with self._locks[index]:
+            server = self._servers[index]
+            if server is not None and server[0].returncode is None:
+                return server
+            port = self._free_port(self.host)
+            params = MCPServerConfig.sqlite_shared_params(self.roots, self.host, port)
+            env = dict(params.env or {}, SQLITE_MCP_SHARED_TOKEN=self.token)
+            process = await asyncio.create_subprocess_exec(params.command, *params.args, env=env)
+            self.stats["server_starts"] += 1
+            try:
+                await self._wait_listening(process, port)
+            except BaseException:
+                if process.returncode is None:
+                    process.kill()
+                raise
+            logger.info(f"Shared SQLite MCP server {index} listening on {self.host}:{port}")
+            self._servers[index] = (process, port)
+            return process, port
+
+    async def _wait_listening(self, process: asyncio.subprocess.Process, port: int) -> None:
+        deadline = asyncio.get_running_loop().time() + self.startup_timeout_seconds
+        while True:
+            if process.returncode is not None:
+                raise ConnectionError(f"Shared SQLite MCP server exited with code {process.returncode}")
+            try:
+                _, writer = await asyncio.open_connection(self.host, port)
+            except OSError:
+                if asyncio.get_running_loop().time() > deadline:
+                    raise TimeoutError("Shared SQLite MCP server did not start listening in time")
+                await asyncio.sleep(0.05)
+                continue
+            writer.close()
+            return
+
+    async def acquire(
+        self,
+        db_path: str,
+        read_only: bool = False,
+        attachments: Optional[Dict[str, str]] = None,
+        export_dir: Optional[str] = None,
+        export_url: Optional[str] = None
+    ) -> MCPClient:
+        """A connected client (one MCP session) bound to db_path on a shared server"""
+        index = zlib.crc32(str(Path(db_path).resolve()).encode()) % self.processes
+        _, port = await self._server(index)
+        options = {
+            "read_only": read_only,
+            "attachments": attachments,
+            "export_dir": export_dir,
+            "export_url": export_url,
+        }
+        client = MCPClient(
+            SharedServerParameters(f"http://{self.host}:{port}/mcp", self.token, db_path, options),
+            self.tool_timeout_seconds,
+        )
+        await client.connect()
+        self.stats["sessions"] += 1
+        return client
+
+    async def close(self) -> None:
+        """Stop the server processes, including any still starting"""
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for index, server in enumerate(self._servers):
+            if server is None:
+                continue
+            process, _ = server
+            if process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), 10)
+                except asyncio.TimeoutError:
+                    process.kill()
+            self._servers[index] = None
+
+
+class InProcessSQLiteServer:
+    """
+    Serves every user's SQLite database from this process (mcp_inprocess.py),
+    skipping the stdio hop and the per-call JSON encoding and pipe round trip
+
+    Each client is one in-memory MCP session bound to its database. acquire()
+    matches SQLiteServerPool.acquire.
+    """
+
+    def __init__(self, roots: List[str], tool_timeout_seconds: Optional[float] = MCP_TOOL_TIMEOUT_SECONDS):
+        """
+        Args:
+            roots: Directories (or files) sessions may open databases from
+            tool_timeout_seconds: Passed to every MCPClient handed out
+        """
+        self.roots = [str(Path(root).resolve()) for root in roots]
+        self.tool_timeout_seconds = tool_timeout_seconds
+        self.stats = {"sessions": 0}
+
+    def start(self) -> None:
+        """Start the host thread"""
+        host.start(self.roots)
+
+    async def acquire(
+        self,
+        db_path: str,
+        read_only: bool = False,
+        attachments: Optional[Dict[str, str]] = None,
+        export_dir: Optional[str] = None,
+        export_url: Optional[str] = None
+    ) -> MCPClient:
+        """A connected client (one in-memory MCP session) bound to db_path"""
+        if not host.running:
+            self.start()
+        options = {
+            "read_only": read_only,
+            "attachments": attachments,
+            "export_dir": export_dir,
+            "export_url": export_url,
+        }
+        client = MCPClient(InProcessServerParameters(db_path, options), self.tool_timeout_seconds)
+        await client.connect()
+        self.stats["sessions"] += 1
+        return client
+
+    async def close(self) -> None:
+        """Stop the host thread, ending any sessions still open"""
+        await host.stop()
@@ -0,0 +1,133 @@
+"""
+Query Result Cache
+Byte-bounded LRU cache for serialized read-query results
+"""
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+# Quoted literals/identifiers are kept verbatim; runs of whitespace outside them collapse
+_SQL_TOKEN_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])|(\s+)""")
+
+# Functions whose result changes between runs even if the data does not
+_VOLATILE_SQL_RE = re.compile(
+    r"\b(random|randomblob|changes|total_changes|last_insert_rowid)\s*\(|"
+    r"'now'|\bcurrent_(date|time|timestamp)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normalize a SQL string for use as a cache key
+
+    Whitespace outside string literals is collapsed and a trailing semicolon
+    is dropped, so reformatted copies of the same query share one entry.
+    """
+    def _replace(match: re.Match) -> str:
+        return match.group(1) if match.group(1) is not None else " "
+
+    return _SQL_TOKEN_RE.sub(_replace, query).strip().rstrip(";").strip()
+
+
+def is_cacheable_sql(query: str) -> bool:
+    """True unless the query calls a volatile function such as random()"""
+    return _VOLATILE_SQL_RE.search(query) is None
+
+
+@dataclass
+class _CacheEntry:
+    value: str
+    version: Any
+    size: int
+    rows: int = 0
+
+
+class QueryResultCache:
+    """
+    LRU cache of query results bounded by total size in bytes
+
+    Every entry remembers the database version it was computed at; a lookup
+    with a different version treats the entry as stale and drops it.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: Total budget for cached values (0 disables caching)
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str, version: Any) -> Optional[str]:
+        """Return the cached value for key if it is still valid at version"""
+        entry = self.get_entry(key, version)
+        return entry.value if entry is not None else None
+
+    def get_entry(self, key: str, version: Any) -> Optional[_CacheEntry]:
+        """Like get(), but return the whole entry (value, size and row count)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.version != version:
+            self._remove(key)
+            self.invalidations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, value: str, version: Any, rows: int = 0) -> None:
+        """Store a value (and the number of rows it holds), evicting least recently used entries to fit the budget"""
+        size = len(value.encode("utf-8"))
+        # A single result may use at most a quarter of the budget
+        if size > self.max_bytes // 4:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        while self._entries and self.current_bytes + size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+        self._entries[key] = _CacheEntry(value=value, version=version, size=size, rows=rows)
+        self.current_bytes += size
+
+    def clear(self, prefix: Optional[str] = None) -> None:
+        """Drop every entry, or only those whose key starts with prefix (counters are kept)"""
+        if prefix is None:
+            self._entries.clear()
+            self.current_bytes = 0
+            return
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current usage"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes_used": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
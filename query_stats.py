@@ -0,0 +1,217 @@
+"""
+Query Statistics
+Bounded log of execute_query calls grouped by SQL fingerprint for slow-query reports
+"""
+import hashlib
+import json
+import logging
+import math
+import re
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Orderings accepted by QueryStatsLog.summary()
+SUMMARY_ORDERS = ("total_ms", "calls", "mean_ms", "p95_ms", "max_ms", "bytes")
+
+_FINGERPRINT_TOKEN_RE = re.compile(
+    r"""
+    (?P<string>[xX]?'(?:[^']|'')*')
+    | (?P<ident>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+    | (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<number>\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)\b|\B\.\d+\b)
+    | (?P<word>[^\W\d]\w*|[$:@?]\w*)
+    | (?P<space>\s+)
+    | (?P<other><=|>=|<>|!=|==|\|\||<<|>>|->>|->|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_VALUE_LIST_RE = re.compile(r"\( \?(?: , \?)+ \)")
+
+
+def fingerprint(query: str) -> str:
+    """
+    Shape of a SQL statement with its literal values removed
+
+    String and numeric literals become ?, lists of them collapse to (?+),
+    comments are dropped and unquoted text is lower-cased. Tokens are
+    re-joined with single spaces, so "WHERE id = 7" and "where id=42" share
+    the fingerprint "where id = ?".
+    """
+    tokens = []
+    for match in _FINGERPRINT_TOKEN_RE.finditer(query):
+        kind = match.lastgroup
+        if kind in ("string", "number"):
+            tokens.append("?")
+        elif kind == "ident":
+            tokens.append(match.group())
+        elif kind not in ("space", "comment"):
+            tokens.append(match.group().lower())
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return _VALUE_LIST_RE.sub("(?+)", " ".join(tokens))
+
+
+def fingerprint_id(text: str) -> str:
+    """Short stable id of a fingerprint"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+@dataclass
+class QueryRecord:
+    """One execute_query call"""
+    fingerprint_id: str
+    fingerprint: str
+    duration_ms: float
+    rows: int
+    bytes: int
+    cache_hit: bool
+    status: str
+    at: float
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, math.ceil(q * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class QueryStatsLog:
+    """
+    Ring buffer of the most recent query records
+
+    When a path is given every record is also appended to it as one JSON
+    line, and the newest records are loaded back from it on startup so the
+    statistics survive a server restart. Whenever the file grows past twice
+    max_records lines it is rewritten with just the records in memory.
+    """
+
+    def __init__(self, max_records: int = 5000, path: Optional[str] = None):
+        self.max_records = max(1, max_records)
+        self.path = Path(path) if path else None
+        self._records: Deque[QueryRecord] = deque(maxlen=self.max_records)
+        self._file = None
+        # Lines in the file, to know when to compact it
+        self._file_lines = 0
+        if self.path is not None:
+            self._load()
+
+    def _load(self) -> None:
+        lines: List[str] = []
+        if self.path.exists():
+            try:
+                lines = self.path.read_text(encoding="utf-8").splitlines()
+                for line in lines[-self.max_records:]:
+                    self._records.append(QueryRecord(**json.loads(line)))
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Could not load query stats from {self.path}: {e}")
+        self._file_lines = len(lines)
+        if self._file_lines > 2 * self.max_records:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the file with only the records held in memory"""
+        self.close()
+        try:
+            self.path.write_text(
+                "".join(json.dumps(asdict(r)) + "\n" for r in self._records), encoding="utf-8"
+            )
+            self._file_lines = len(self._records)
+        except OSError as e:
+            logger.warning(f"Could not compact query stats in {self.path}: {e}")
+
+    def record(
+        self,
+        query: str,
+        duration_ms: float,
+        rows: int = 0,
+        size: int = 0,
+        cache_hit: bool = False,
+        status: str = "success",
+    ) -> QueryRecord:
+        """Add one call to the log"""
+        text = fingerprint(query)
+        entry = QueryRecord(
+            fingerprint_id=fingerprint_id(text),
+            fingerprint=text,
+            duration_ms=round(duration_ms, 3),
+            rows=rows,
+            bytes=size,
+            cache_hit=cache_hit,
+            status=status,
+            at=round(time.time(), 3),
+        )
+        self._records.append(entry)
+        if self.path is not None:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+                self._file.write(json.dumps(asdict(entry)) + "\n")
+                self._file_lines += 1
+            except OSError as e:
+                logger.warning(f"Could not persist query stats to {self.path}: {e}")
+            if self._file_lines > 2 * self.max_records:
+                self._compact()
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def clear(self) -> None:
+        self._records.clear()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def summary(self, top_n: int = 10, order_by: str = "total_ms") -> Dict[str, Any]:
+        """
+        Per-fingerprint statistics of the logged calls
+
+        Args:
+            top_n: Number of fingerprints to return
+            order_by: One of SUMMARY_ORDERS (largest first)
+        """
+        if order_by not in SUMMARY_ORDERS:
+            raise ValueError(f"order_by must be one of: {', '.join(SUMMARY_ORDERS)}")
+
+        groups: Dict[str, List[QueryRecord]] = {}
+        for entry in self._records:
+            groups.setdefault(entry.fingerprint_id, []).append(entry)
+
+        fingerprints = []
+        for fid, entries in groups.items():
+            durations = sorted(e.duration_ms for e in entries)
+            total = sum(durations)
+            fingerprints.append({
+                "fingerprint_id": fid,
+                "fingerprint": entries[-1].fingerprint,
+                "calls": len(entries),
+                "total_ms": round(total, 2),
+                "mean_ms": round(total / len(entries), 2),
+                "p50_ms": round(_percentile(durations, 0.50), 2),
+                "p95_ms": round(_percentile(durations, 0.95), 2),
+                "max_ms": round(durations[-1], 2),
+                "rows": sum(e.rows for e in entries),
+                "bytes": sum(e.bytes for e in entries),
+                "cache_hit_rate": round(sum(e.cache_hit for e in entries) / len(entries), 4),
+                "errors": sum(e.status != "success" for e in entries),
+                "last_at": entries[-1].at,
+            })
+        fingerprints.sort(key=lambda f: f[order_by], reverse=True)
+
+        records = list(self._records)
+        return {
+            "records": len(records),
+            "max_records": self.max_records,
+            "since": records[0].at if records else None,
+            "total_ms": round(sum(r.duration_ms for r in records), 2),
+            "distinct_fingerprints": len(groups),
+            "order_by": order_by,
+            "fingerprints": fingerprints[:max(0, top_n)],
+        }
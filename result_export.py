@@ -0,0 +1,131 @@
+"""
+Result Export
+Stream query results to CSV or NDJSON files (optionally gzip) in constant memory
+"""
+import asyncio
+import csv
+import gzip
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Sequence
+
+import aiosqlite
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+_UNSAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+_EXTENSION_RE = re.compile(r"(\.(csv|ndjson|jsonl|json|gz))+$", re.IGNORECASE)
+# <stem>-<export id>.<format>[.gz], as built by export_file_name
+_EXPORT_NAME_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*-[A-Za-z0-9]+\.(csv|ndjson)(\.gz)?")
+# Suffix of the temporary file an export is written to
+PARTIAL_SUFFIX = ".part"
+
+
+def export_file_name(label: Optional[str], export_id: str, fmt: str, compress: bool) -> str:
+    """
+    File name for an export: a sanitized label plus the export id
+
+    The id keeps names unique and unguessable; the label only makes the
+    download recognizable to the user.
+    """
+    label = _EXTENSION_RE.sub("", label or "")
+    stem = _UNSAFE_NAME_RE.sub("_", label).strip("._")[:60] or "export"
+    return f"{stem}-{export_id}.{fmt}" + (".gz" if compress else "")
+
+
+def is_export_name(name: str) -> bool:
+    """True for a plain file name as produced by export_file_name (no path parts)"""
+    return name == Path(name).name and _EXPORT_NAME_RE.fullmatch(name) is not None
+
+
+class _ExportWriter:
+    """Encodes row chunks to an open text file; runs in a worker thread"""
+
+    def __init__(self, handle: IO[str], fmt: str, columns: List[str]):
+        self.handle = handle
+        self.fmt = fmt
+        self.columns = columns
+        if fmt == "csv":
+            self.csv = csv.writer(handle, lineterminator="\n")
+            self.csv.writerow(columns)
+        else:
+            # One encoder for all rows: json.dumps with options builds a new one per call
+            self.encode = json.JSONEncoder(default=str, ensure_ascii=False).encode
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        if self.fmt == "csv":
+            self.csv.writerows(rows)
+        else:
+            columns, encode = self.columns, self.encode
+            self.handle.write("".join(encode(dict(zip(columns, row))) + "\n" for row in rows))
+
+
+async def export_cursor(
+    cursor: aiosqlite.Cursor,
+    path: Path,
+    fmt: str = "csv",
+    compress: bool = False,
+    chunk_rows: int = 5000,
+) -> Dict[str, Any]:
+    """
+    Write every row of an executed cursor to path
+
+    Rows are fetched chunk_rows at a time and each chunk is encoded and
+    written in a worker thread, so memory stays at one chunk and the event
+    loop is not blocked by file I/O or compression. The file is written under
+    a temporary name and renamed into place only when complete.
+
+    Returns:
+        {"rows": ..., "bytes": ..., "columns": [...]}
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+    columns = [col[0] for col in cursor.description or []]
+    partial = path.with_name(path.name + PARTIAL_SUFFIX)
+    if compress:
+        handle = await asyncio.to_thread(gzip.open, partial, "wt", encoding="utf-8", newline="", compresslevel=6)
+    else:
+        handle = await asyncio.to_thread(open, partial, "w", encoding="utf-8", newline="")
+
+    rows = 0
+    try:
+        writer = _ExportWriter(handle, fmt, columns)
+        while chunk := await cursor.fetchmany(chunk_rows):
+            await asyncio.to_thread(writer.write, chunk)
+            rows += len(chunk)
+        await asyncio.to_thread(handle.close)
+        os.replace(partial, path)
+    except BaseException:
+        handle.close()
+        partial.unlink(missing_ok=True)
+        raise
+
+    return {"rows": rows, "bytes": path.stat().st_size, "columns": columns}
+
+
+def remove_expired_exports(directory: Path, max_age_seconds: float) -> int:
+    """
+    Delete export files (and abandoned .part files) older than max_age_seconds
+
+    Only names export_file_name produces are touched, so a misconfigured
+    export directory does not lose anything else.
+    """
+    if not directory.is_dir():
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for path in directory.iterdir():
+        name = path.name.removesuffix(PARTIAL_SUFFIX)
+        if not is_export_name(name):
+            continue
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            continue
+    return removed
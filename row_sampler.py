@@ -0,0 +1,157 @@
+"""
+Row Sampler
+Uniform random row samples from SQLite tables without sorting the whole table
+"""
+import math
+import random
+from typing import Any, List, Optional, Tuple
+
+import aiosqlite
+
+# Rowids looked up per probing round (kept well under SQLite's variable limit)
+MAX_PROBE_BATCH = 5000
+
+# Probing rounds before falling back to a full reservoir pass
+MAX_PROBE_ROUNDS = 6
+
+SampleResult = Tuple[List[str], List[Tuple[Any, ...]], int]
+
+
+def _uniform(rng: random.Random) -> float:
+    """A random float in the open interval (0, 1)"""
+    while True:
+        u = rng.random()
+        if u > 0.0:
+            return u
+
+
+def _skip(rng: random.Random, w: float) -> int:
+    """Number of rows to pass over before the next reservoir replacement"""
+    if w >= 1.0:
+        return 0
+    return int(math.log(_uniform(rng)) / math.log1p(-w))
+
+
+async def sample_by_rowid(
+    db: aiosqlite.Connection,
+    table_sql: str,
+    k: int,
+    rng: random.Random,
+    where: Optional[str] = None,
+) -> Optional[SampleResult]:
+    """
+    Sample k rows by probing random rowids between MIN(rowid) and MAX(rowid)
+
+    Rowids are drawn without replacement and each batch is fetched with one
+    rowid IN (...) lookup; gaps and rows rejected by the WHERE clause are
+    simply retried. Because every rowid in the range is equally likely to be
+    drawn, the accepted rows are a uniform sample of the matching rows. The
+    cost is proportional to k divided by the fraction of the rowid range that
+    holds matching rows.
+
+    Args:
+        db: Connection to read from
+        table_sql: Quoted table name
+        k: Number of rows wanted
+        rng: Random source (seed it for reproducible samples)
+        where: Optional SQL filter expression
+
+    Returns:
+        (columns, rows, rowids_probed), or None when probing is not worthwhile
+        (WITHOUT ROWID tables and views, small tables, very sparse matches)
+    """
+    try:
+        cursor = await db.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table_sql}")
+    except aiosqlite.OperationalError:
+        return None
+    low, high = await cursor.fetchone()
+    if low is None:
+        return None
+    span = high - low + 1
+    # A full pass over a small table is as cheap as probing it
+    if span <= 4 * k:
+        return None
+
+    filter_sql = f" AND ({where})" if where else ""
+    seen = set()
+    picked: List[Tuple[Any, ...]] = []
+    columns: List[str] = []
+    probed = 0
+    hits = 0
+
+    for _ in range(MAX_PROBE_ROUNDS):
+        need = k - len(picked)
+        if need <= 0:
+            break
+        hit_rate = hits / probed if probed else 1.0
+        remaining_budget = (MAX_PROBE_ROUNDS * MAX_PROBE_BATCH) - probed
+        if probed and hit_rate * remaining_budget < need:
+            return None  # too sparse: cheaper to stream the table once
+
+        batch = min(int(need / max(hit_rate, 1e-3) * 1.2) + 8, MAX_PROBE_BATCH, span - len(seen))
+        if batch <= 0:
+            break
+        rowids = []
+        while len(rowids) < batch:
+            rowid = rng.randint(low, high)
+            if rowid not in seen:
+                seen.add(rowid)
+                rowids.append(rowid)
+        probed += len(rowids)
+
+        placeholders = ", ".join("?" * len(rowids))
+        cursor = await db.execute(
+            f"SELECT rowid, * FROM {table_sql} WHERE rowid IN ({placeholders}){filter_sql}", rowids
+        )
+        found = {row[0]: row[1:] for row in await cursor.fetchall()}
+        columns = [col[0] for col in cursor.description][1:]
+        hits += len(found)
+        # Keep draw order so the sample does not depend on how SQLite returned rows
+        for rowid in rowids:
+            if rowid in found and len(picked) < k:
+                picked.append(found[rowid])
+
+    if len(picked) < k and len(seen) < span:
+        return None
+    return columns, picked, probed
+
+
+async def reservoir_sample(
+    db: aiosqlite.Connection,
+    table_sql: str,
+    k: int,
+    rng: random.Random,
+    where: Optional[str] = None,
+    chunk_rows: int = 1000,
+) -> SampleResult:
+    """
+    Sample k rows from one streaming pass (reservoir sampling, Algorithm L)
+
+    Works for any table or view and any WHERE clause. Memory stays at k rows;
+    random numbers are only drawn for rows that enter the reservoir, so the
+    pass costs little more than reading the rows.
+
+    Returns:
+        (columns, rows, rows_scanned)
+    """
+    filter_sql = f" WHERE ({where})" if where else ""
+    cursor = await db.execute(f"SELECT * FROM {table_sql}{filter_sql}")
+    columns = [col[0] for col in cursor.description or []]
+
+    reservoir: List[Tuple[Any, ...]] = []
+    scanned = 0
+    w = math.exp(math.log(_uniform(rng)) / k)
+    next_index = k + _skip(rng, w)
+
+    while chunk := await cursor.fetchmany(chunk_rows):
+        start = scanned
+        scanned += len(chunk)
+        if len(reservoir) < k:
+            take = chunk[:k - len(reservoir)]
+            reservoir.extend(take)
+        while next_index < scanned:
+            reservoir[rng.randrange(k)] = chunk[next_index - start]
+            w *= math.exp(math.log(_uniform(rng)) / k)
+            next_index += _skip(rng, w) + 1
+
+    return columns, reservoir, scanned
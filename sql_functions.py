@@ -0,0 +1,227 @@
+"""
+SQL Functions
+Statistical aggregate/window functions and REGEXP registered on every pooled connection
+"""
+import bisect
+import math
+import re
+import sqlite3
+from array import array
+from functools import lru_cache
+from typing import Any, Optional
+
+import numpy as np
+
+# Compiled patterns are reused across rows and queries
+_compile = lru_cache(maxsize=256)(re.compile)
+
+
+def _regexp(pattern: Optional[str], value: Any) -> Optional[int]:
+    """X REGEXP Y calls regexp(Y, X): 1 if the pattern matches anywhere in the value"""
+    if pattern is None or value is None:
+        return None
+    return 1 if _compile(pattern).search(value if isinstance(value, str) else str(value)) else 0
+
+
+class _Moments:
+    """
+    Count, mean and sum of squared deviations (Welford), with removal for windows
+
+    Constant memory and numerically stable; text, blobs and NULLs are skipped.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if type(value) is int or type(value) is float:
+            self.n += 1
+            delta = value - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (value - self.mean)
+
+    def inverse(self, value):
+        if type(value) is int or type(value) is float:
+            self.n -= 1
+            if self.n == 0:
+                self.mean = self.m2 = 0.0
+                return
+            delta = value - self.mean
+            self.mean -= delta / self.n
+            self.m2 -= delta * (value - self.mean)
+
+
+class _SampleVariance(_Moments):
+    def value(self):
+        return max(self.m2, 0.0) / (self.n - 1) if self.n > 1 else None
+
+    finalize = value
+
+
+class _PopulationVariance(_Moments):
+    def value(self):
+        return max(self.m2, 0.0) / self.n if self.n > 0 else None
+
+    finalize = value
+
+
+class _SampleStddev(_SampleVariance):
+    def value(self):
+        variance = _SampleVariance.value(self)
+        return math.sqrt(variance) if variance is not None else None
+
+    finalize = value
+
+
+class _PopulationStddev(_PopulationVariance):
+    def value(self):
+        variance = _PopulationVariance.value(self)
+        return math.sqrt(variance) if variance is not None else None
+
+    finalize = value
+
+
+class _Correlation:
+    """Pearson correlation of (y, x) pairs from streaming co-moments; rows with a NULL are skipped"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = self.mean_y = 0.0
+        self.m2_x = self.m2_y = self.c_xy = 0.0
+
+    def step(self, y, x):
+        if (type(x) is int or type(x) is float) and (type(y) is int or type(y) is float):
+            self.n += 1
+            dx = x - self.mean_x
+            dy = y - self.mean_y
+            self.mean_x += dx / self.n
+            self.mean_y += dy / self.n
+            self.m2_x += dx * (x - self.mean_x)
+            self.m2_y += dy * (y - self.mean_y)
+            self.c_xy += dx * (y - self.mean_y)
+
+    def inverse(self, y, x):
+        if (type(x) is int or type(x) is float) and (type(y) is int or type(y) is float):
+            self.n -= 1
+            if self.n == 0:
+                self.mean_x = self.mean_y = self.m2_x = self.m2_y = self.c_xy = 0.0
+                return
+            dx = x - self.mean_x
+            dy = y - self.mean_y
+            self.mean_x -= dx / self.n
+            self.mean_y -= dy / self.n
+            self.m2_x -= dx * (x - self.mean_x)
+            self.m2_y -= dy * (y - self.mean_y)
+            self.c_xy -= dx * (y - self.mean_y)
+
+    def value(self):
+        if self.n < 2 or self.m2_x <= 0 or self.m2_y <= 0:
+            return None
+        return self.c_xy / math.sqrt(self.m2_x * self.m2_y)
+
+    finalize = value
+
+
+class _Percentile:
+    """
+    Exact percentile with linear interpolation, like SQLite's percentile()
+
+    An exact answer needs every value, so they are buffered in a typed
+    array (8 bytes each, no Python objects). As a plain aggregate the result
+    is selected once with numpy's O(n) partition in finalize(). As a window
+    function value() runs for every row, so on its first call the buffer is
+    sorted and kept sorted: rows entering or leaving the frame are placed by
+    binary search (plus a memmove of the array), and value() reads the two
+    neighbouring values directly instead of re-selecting the whole frame.
+    """
+
+    def __init__(self):
+        self.values = array("d")
+        self.fraction: Optional[float] = None
+        self.ordered = False
+
+    def _check(self, p):
+        if self.fraction is None:
+            if type(p) not in (int, float) or not 0 <= p <= 100:
+                raise ValueError("percentile must be between 0 and 100")
+            self.fraction = p / 100
+
+    def step(self, value, p=50):
+        self._check(p)
+        if type(value) is int or type(value) is float:
+            if self.ordered:
+                bisect.insort(self.values, value)
+            else:
+                self.values.append(value)
+
+    def inverse(self, value, p=50):
+        if type(value) is int or type(value) is float:
+            if not self.ordered:
+                self._order()
+            del self.values[bisect.bisect_left(self.values, value)]
+
+    def _order(self):
+        self.values = array("d", sorted(self.values))
+        self.ordered = True
+
+    def value(self):
+        if not self.values:
+            return None
+        if not self.ordered:
+            self._order()
+        position = self.fraction * (len(self.values) - 1)
+        low = math.floor(position)
+        high = min(low + 1, len(self.values) - 1)
+        return self.values[low] + (self.values[high] - self.values[low]) * (position - low)
+
+    def finalize(self):
+        if not self.values:
+            return None
+        data = np.frombuffer(self.values, dtype=np.float64)
+        return float(np.quantile(data, self.fraction))
+
+
+class _Median(_Percentile):
+    def step(self, value):
+        _Percentile.step(self, value, 50)
+
+    def inverse(self, value):
+        _Percentile.inverse(self, value, 50)
+
+
+# name -> (argument count, accumulator class); all also work as window functions
+AGGREGATES = {
+    "median": (1, _Median),
+    "percentile": (2, _Percentile),
+    "stddev": (1, _SampleStddev),
+    "stddev_samp": (1, _SampleStddev),
+    "stddev_pop": (1, _PopulationStddev),
+    "variance": (1, _SampleVariance),
+    "var_samp": (1, _SampleVariance),
+    "var_pop": (1, _PopulationVariance),
+    "corr": (2, _Correlation),
+}
+
+
+def register(conn: sqlite3.Connection) -> None:
+    """Register the functions on a sqlite3 connection (call from its own thread)"""
+    conn.create_function("regexp", 2, _regexp, deterministic=True)
+    for name, (n_args, accumulator) in AGGREGATES.items():
+        # Window functions double as plain aggregates
+        conn.create_window_function(name, n_args, accumulator)
+
+
+class FunctionsConnection(sqlite3.Connection):
+    """
+    sqlite3 connection with the functions registered at creation
+
+    Pass it as factory= to sqlite3.connect or aiosqlite.connect (which
+    forwards it to sqlite3.connect on its worker thread); subclass it for
+    connections that need more setup.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        register(self)
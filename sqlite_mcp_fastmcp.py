@@ -4,21 +4,468 @@ Provides CRUD operations for SQLite database following MCP protocol
 Based on: https://felix-pappe.medium.com/
 """
 from mcp.server.fastmcp import FastMCP
-import aiosqlite
 import anyio
+import argparse
+import asyncio
+import csv
+import hmac
+import io
+import json
+import os
+import random
+import re
 import sys
+import time
+import uuid
+import zlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+import aiosqlite
+import numpy as np
+
+import column_analytics
+from approx_stats import HyperLogLog, interval, probe_rows, round_sig, sampled_aggregates, z_score
+from column_analytics import ColumnArrayCache
+from column_profiler import TableProfiler
+from index_advisor import IndexCandidate, SlowQueryLog, analyze_plan, propose_indexes
+from query_cache import QueryResultCache, is_cacheable_sql, normalize_sql
+from query_stats import SUMMARY_ORDERS, QueryStatsLog, fingerprint as sql_fingerprint
+from result_export import EXPORT_FORMATS, export_cursor, export_file_name, remove_expired_exports
+from row_sampler import reservoir_sample, sample_by_rowid
+import text_search
+from sqlite_pool import QueryTimeoutError, SQLitePool
+from stats_store import StatsStore
+
+@dataclass
+class _SessionBinding:
+    """Per-session state: the database open_database bound a shared server's session to"""
+    database: Optional["Database"] = None
+
+
+@asynccontextmanager
+async def _session_lifespan(server: FastMCP) -> AsyncIterator[_SessionBinding]:
+    """Runs once per MCP session; releases the session's database when it ends"""
+    binding = _SessionBinding()
+    try:
+        yield binding
+    finally:
+        if binding.database is not None:
+            with anyio.CancelScope(shield=True):
+                await _release_database(binding.database)
+
 
 # Initialize FastMCP server
-mcp = FastMCP("sqlite-crud")
+mcp = FastMCP("sqlite-crud", lifespan=_session_lifespan)
+
+# Database file path and open mode (set from the command line in __main__)
+DB_FILE = "example.db"
+READ_ONLY = False
+
+# Started with --standby: no database yet, the client calls open_database first
+STANDBY = False
+
+# Started with --shared (or hosted in-process, see enable_shared_mode): one
+# process serves many databases. Every MCP session is bound to one database
+# (under SHARED_ROOTS) by open_database, and with --shared every HTTP request
+# must carry SHARED_TOKEN.
+SHARED = False
+SHARED_ROOTS: list[Path] = []
+SHARED_TOKEN = os.getenv("SQLITE_MCP_SHARED_TOKEN", "")
+
+# Other databases attached at startup (alias -> path) and the directory
+# attach_database may open files from (None: the directory of DB_FILE)
+ATTACHMENTS: dict[str, str] = {}
+ATTACH_DIR: Optional[str] = None
+
+# Where export_query writes files (None: an "exports" directory next to
+# DB_FILE) and the URL prefix they are downloaded from, if one serves them
+EXPORT_DIR: Optional[str] = None
+EXPORT_URL: Optional[str] = None
+
+# Connection pool tuning (env vars are inherited from the spawning FastAPI process)
+POOL_READERS = int(os.getenv("SQLITE_MCP_READERS", "4"))
+POOL_CACHE_SIZE_KB = int(os.getenv("SQLITE_MCP_CACHE_SIZE_KB", "65536"))
+POOL_MMAP_SIZE = int(os.getenv("SQLITE_MCP_MMAP_SIZE", str(256 * 1024 * 1024)))
+POOL_TEMP_STORE = os.getenv("SQLITE_MCP_TEMP_STORE", "MEMORY")
+
+# Serve databases up to this size from an in-memory copy (0 disables the mirror)
+MEMORY_MIRROR_MAX_BYTES = int(float(os.getenv("SQLITE_MCP_MEMORY_MIRROR_MB", "0")) * 1024 * 1024)
+
+# Paged execute_query results: cursors stay open between pages for a bounded time
+CURSOR_TTL_SECONDS = float(os.getenv("SQLITE_MCP_CURSOR_TTL", "120"))
+MAX_OPEN_CURSORS = int(os.getenv("SQLITE_MCP_MAX_CURSORS", "8"))
+MAX_PAGE_ROWS = 10000
+
+# Default per-statement deadline for execute_query (0 disables it)
+QUERY_TIMEOUT_MS = int(os.getenv("SQLITE_MCP_QUERY_TIMEOUT_MS", "30000"))
+
+# Rows pulled from SQLite per round trip while materializing a result
+FETCH_CHUNK_ROWS = 500
+
+# Result encodings: "json" is a list of row objects (the original format),
+# "compact" sends the column names once and rows as arrays, "csv" is plain text
+RESULT_FORMATS = ("json", "compact", "csv")
+
+# Read-query result cache, validated against PRAGMA data_version. The version
+# is re-read after every write through the pool and otherwise at most once per
+# VERSION_CHECK_MS, which bounds how long another process's commit can go unseen
+VERSION_CHECK_MS = int(os.getenv("SQLITE_MCP_VERSION_CHECK_MS", "50"))
+RESULT_CACHE_BYTES = int(os.getenv("SQLITE_MCP_RESULT_CACHE_BYTES", str(32 * 1024 * 1024)))
+result_cache = QueryResultCache(max_bytes=RESULT_CACHE_BYTES)
+
+# execute_query calls slower than this are remembered for advise_indexes
+SLOW_QUERY_MS = float(os.getenv("SQLITE_MCP_SLOW_QUERY_MS", "200"))
+slow_query_log = SlowQueryLog()
+
+# Every execute_query call, by SQL fingerprint, for query_stats; optionally
+# appended to a JSON-lines file so the history survives restarts
+QUERY_STATS_SIZE = int(os.getenv("SQLITE_MCP_QUERY_STATS_SIZE", "5000"))
+QUERY_STATS_FILE = os.getenv("SQLITE_MCP_QUERY_STATS_FILE") or None
+query_log = QueryStatsLog(max_records=QUERY_STATS_SIZE, path=QUERY_STATS_FILE)
+
+@dataclass
+class _PagedCursor:
+    """Server-side state for a paged query between fetch_page calls"""
+    conn: aiosqlite.Connection
+    cursor: aiosqlite.Cursor
+    columns: list[str]
+    max_rows: int
+    timeout_ms: Optional[int]
+    result_format: str
+    expires_at: float
+    lookahead: list[Any] = field(default_factory=list)
+    rows_returned: int = 0
+
+
+@dataclass
+class Database:
+    """
+    One database served by this process and everything the tools keep for it
+
+    A single-database server has one, built from the module settings; a
+    shared server has one per distinct open_database request, used by every
+    session bound to it.
+    """
+    path: str
+    read_only: bool = False
+    attachments: dict[str, str] = field(default_factory=dict)
+    attach_dir: Optional[str] = None
+    export_dir: Optional[str] = None
+    export_url: Optional[str] = None
+    slow_query_log: SlowQueryLog = field(default_factory=SlowQueryLog)
+    query_log: QueryStatsLog = field(default_factory=lambda: QueryStatsLog(max_records=QUERY_STATS_SIZE))
+    pool: Optional[SQLitePool] = None
+    pool_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    cursors: dict[str, _PagedCursor] = field(default_factory=dict)
+    cursors_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # get_schema catalog, rebuilt whenever PRAGMA schema_version changes
+    schema_cache: Optional[tuple[int, dict]] = None
+    # profile_table results by table: (data_version they are valid at, profile)
+    profiles: dict[str, tuple[int, dict]] = field(default_factory=dict)
+    # Distinct-count sketches by (table, column): (data_version they are valid at, sketch)
+    sketches: dict[tuple[str, str], tuple[int, HyperLogLog]] = field(default_factory=dict)
+    # Profiles and sketches persisted next to the database file (opened lazily)
+    stats: Optional[StatsStore] = None
+    # Prefix for this database's entries in the process-wide caches
+    cache_prefix: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    # Shared server: sessions bound to it
+    sessions: int = 0
+
+    async def get_pool(self) -> SQLitePool:
+        """Return the connection pool, opening it on first use"""
+        async with self.pool_lock:
+            if self.pool is None:
+                pool = SQLitePool(
+                    self.path,
+                    readers=POOL_READERS,
+                    cache_size_kb=POOL_CACHE_SIZE_KB,
+                    mmap_size=POOL_MMAP_SIZE,
+                    temp_store=POOL_TEMP_STORE,
+                    read_only=self.read_only,
+                    attachments=self.attachments,
+                    mirror_max_bytes=MEMORY_MIRROR_MAX_BYTES,
+                    version_check_interval_ms=VERSION_CHECK_MS,
+                )
+                await pool.open()
+                pool.add_write_listener(self.forget_stats)
+                self.pool = pool
+        return self.pool
+
+    def stats_store(self) -> StatsStore:
+        if self.stats is None:
+            self.stats = StatsStore(self.path)
+        return self.stats
+
+    async def forget_stats(self, tables: set[str]) -> None:
+        """Write listener: drop the profiles and sketches of the tables just written"""
+        for table in tables:
+            self.profiles.pop(table, None)
+        for key in [key for key in self.sketches if key[0] in tables]:
+            del self.sketches[key]
+        await self.stats_store().drop_tables(tables)
+
+    async def drop_cursor(self, token: str) -> None:
+        """Close a paged cursor's dedicated connection (caller holds cursors_lock)"""
+        state = self.cursors.pop(token, None)
+        if state is not None:
+            try:
+                await state.conn.close()
+            except Exception as e:
+                print(f"Error closing paged cursor {token}: {e}", file=sys.stderr)
+
+    async def expire_cursors(self) -> None:
+        """Drop cursors past their TTL (caller holds cursors_lock)"""
+        now = time.monotonic()
+        for token, state in list(self.cursors.items()):
+            if state.expires_at <= now:
+                await self.drop_cursor(token)
+
+    async def close(self) -> None:
+        """Close the connection pool and any open paged cursors"""
+        async with self.cursors_lock:
+            for token in list(self.cursors):
+                await self.drop_cursor(token)
+        async with self.pool_lock:
+            if self.pool is not None:
+                await self.pool.close()
+                self.pool = None
+        if self.stats is not None:
+            await self.stats.close()
+            self.stats = None
+
+
+# The database of a single-database server (None until first used)
+_default_db: Optional[Database] = None
+
+# Shared server: open databases by their open_database arguments
+_shared_databases: dict[tuple, Database] = {}
+_shared_lock = asyncio.Lock()
+
+# Tables the server keeps for itself inside the user's database; hidden from
+# list_tables, get_schema and get_database_info
+SIDECAR_GLOB = "_mcp_*"
+
+# export_query: deadline for the whole export, rows per write, and how long
+# finished exports are kept before the next export deletes them
+EXPORT_TIMEOUT_MS = int(os.getenv("SQLITE_MCP_EXPORT_TIMEOUT_MS", "600000"))
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_TTL_HOURS = float(os.getenv("SQLITE_MCP_EXPORT_TTL_HOURS", "24"))
+
+# Rows per executemany() call in insert_rows (all chunks share one transaction)
+INSERT_CHUNK_ROWS = 5000
+
+# Column arrays loaded by analyze_columns, kept until the data version changes
+ANALYTICS_CACHE_BYTES = int(os.getenv("SQLITE_MCP_ANALYTICS_CACHE_BYTES", str(128 * 1024 * 1024)))
+column_arrays = ColumnArrayCache(max_bytes=ANALYTICS_CACHE_BYTES)
+
+# Rows per chunk handed to the column profiler
+PROFILE_CHUNK_ROWS = 10000
+
+APPROX_AGGREGATES = ("count", "sum", "avg", "count_distinct")
+
+# search_text indexes the text columns averaging at least this many characters
+# the first time a table without a full-text index is searched
+FTS_AUTO_MIN_CHARS = int(os.getenv("SQLITE_MCP_FTS_AUTO_MIN_CHARS", "30"))
+
+
+def _session_database() -> Database:
+    """The database open_database bound the calling session to (shared server)"""
+    try:
+        binding = mcp.get_context().request_context.lifespan_context
+    except ValueError:
+        binding = None
+    if binding is None or binding.database is None:
+        raise RuntimeError("No database is open for this session; call open_database first")
+    return binding.database
+
+
+def _db() -> Database:
+    """The database the current tool call works on"""
+    global _default_db
+    if SHARED:
+        return _session_database()
+    if _default_db is None:
+        _default_db = Database(
+            DB_FILE,
+            read_only=READ_ONLY,
+            attachments=ATTACHMENTS,
+            attach_dir=ATTACH_DIR,
+            export_dir=EXPORT_DIR,
+            export_url=EXPORT_URL,
+            slow_query_log=slow_query_log,
+            query_log=query_log,
+        )
+    return _default_db
+
+
+async def get_pool() -> SQLitePool:
+    """Return the current database's connection pool, opening it on first use"""
+    return await _db().get_pool()
+
+
+async def close_pool():
+    """
+    Close the connection pool (and any open paged cursors) if it was opened
+
+    A single-database server re-reads DB_FILE and the other settings on the
+    next call.
+    """
+    global _default_db
+    if SHARED:
+        await _db().close()
+    elif _default_db is not None:
+        db, _default_db = _default_db, None
+        await db.close()
+
+
+# Words, parentheses, "=" and "." of a statement; comments and quoted
+# literals/identifiers are matched too so their contents are never read as keywords
+_SQL_SCAN_RE = re.compile(
+    r"""--[^\n]*|/\*.*?(?:\*/|$)|'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|[A-Za-z_]\w*|[().=]""",
+    re.DOTALL,
+)
+
+# PRAGMAs that take an argument and only report; PRAGMA name(value) on any
+# other one sets it
+_READ_PRAGMAS_WITH_ARG = {
+    "foreign_key_check", "foreign_key_list", "index_info", "index_list", "index_xinfo",
+    "integrity_check", "quick_check", "table_info", "table_list", "table_xinfo",
+}
+
+# PRAGMAs that write to the database even without an argument
+_WRITE_PRAGMAS = {"incremental_vacuum", "optimize", "wal_checkpoint"}
+
+
+def _sql_tokens(query: str) -> list[str]:
+    return [token for token in _SQL_SCAN_RE.findall(query) if not token.startswith(("--", "/*"))]
+
 
-# Database file path (from command line or default)
-DB_FILE = sys.argv[1] if len(sys.argv) > 1 else "example.db"
+def _is_read_query(query: str) -> bool:
+    """True for statements that can run on a read-only pooled connection"""
+    tokens = _sql_tokens(query)
+    if not tokens:
+        return False
+    head = tokens[0].upper()
+    if head == "PRAGMA":
+        # PRAGMA [schema.]name, then "= value" or "(value)" if it has an argument
+        rest = tokens[3:] if tokens[2:3] == ["."] else tokens[1:]
+        name = rest[0].lower() if rest else ""
+        if len(rest) < 2:
+            return name not in _WRITE_PRAGMAS
+        if rest[1] == "=":
+            return False
+        return rest[1] != "(" or name in _READ_PRAGMAS_WITH_ARG
+    if head == "WITH":
+        # The statement the common table expressions belong to decides: the
+        # first keyword outside their parentheses that starts a statement
+        depth = 0
+        for token in tokens[1:]:
+            if token == "(":
+                depth += 1
+            elif token == ")":
+                depth -= 1
+            elif depth == 0 and token.upper() in ("SELECT", "VALUES", "INSERT", "REPLACE", "UPDATE", "DELETE"):
+                head = token.upper()
+                break
+    return head in ("SELECT", "EXPLAIN", "VALUES")
+
+
+def _quote_ident(name: str) -> str:
+    """Quote an SQL identifier (table or column name)"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _dumps(payload: Any, result_format: str) -> str:
+    """Serialize a payload: indented for "json", no whitespace otherwise"""
+    if result_format == "json":
+        return json.dumps(payload, indent=2, default=str)
+    return json.dumps(payload, separators=(",", ":"), default=str)
+
+
+def _rows_to_csv(columns: list[str], rows: list) -> str:
+    """CSV text with a header line; NULL becomes an empty field"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def _rows_payload(columns: list[str], rows: list, result_format: str) -> dict:
+    """Rows in the requested encoding, as fields to merge into a response object"""
+    if result_format == "compact":
+        return {"columns": columns, "rows": [list(row) for row in rows]}
+    if result_format == "csv":
+        return {"csv": _rows_to_csv(columns, rows)}
+    return {"rows": [dict(zip(columns, row)) for row in rows]}
+
+
+def _encode_rows(columns: list[str], rows: list, result_format: str) -> str:
+    """Encode a complete result set as returned by execute_query"""
+    if result_format == "csv":
+        return _rows_to_csv(columns, rows)
+    if result_format == "compact":
+        return _dumps(_rows_payload(columns, rows, result_format), result_format)
+    return _dumps([dict(zip(columns, row)) for row in rows], result_format)
+
+
+def _timeout_error(e: QueryTimeoutError, rows_fetched: int) -> dict:
+    """Structured error payload for a query stopped by its deadline"""
+    return {
+        "status": "error",
+        "error": "timeout",
+        "message": f"Query timed out after {e.timeout_ms} ms; {rows_fetched} rows fetched so far",
+        "timeout_ms": e.timeout_ms,
+        "elapsed_ms": round(e.elapsed_ms, 1),
+        "rows_fetched": rows_fetched,
+        "vm_steps": e.vm_steps,
+    }
+
+
+async def _fetch_into(cursor: aiosqlite.Cursor, rows: list) -> None:
+    """Append the cursor's remaining rows to rows, FETCH_CHUNK_ROWS per round trip"""
+    while chunk := await cursor.fetchmany(FETCH_CHUNK_ROWS):
+        rows.extend(chunk)
+        # A short chunk is the last one; asking again would only return nothing
+        if len(chunk) < FETCH_CHUNK_ROWS:
+            break
+
+
+async def _read_page(pool: SQLitePool, token: str, state: _PagedCursor) -> dict:
+    """
+    Fetch the next page from a paged cursor (caller holds the cursors lock)
+
+    One row beyond the page is read ahead so the response can say whether
+    more rows exist; only max_rows + 1 rows are ever held in memory.
+    """
+    async with pool.deadline(state.conn, state.timeout_ms):
+        fetched = await state.cursor.fetchmany(state.max_rows + 1 - len(state.lookahead))
+    rows = state.lookahead + list(fetched)
+    page, state.lookahead = rows[:state.max_rows], rows[state.max_rows:]
+    state.rows_returned += len(page)
+    has_more = bool(state.lookahead)
+
+    if has_more:
+        state.expires_at = time.monotonic() + CURSOR_TTL_SECONDS
+    else:
+        await _db().drop_cursor(token)
+
+    return {
+        **_rows_payload(state.columns, page, state.result_format),
+        "row_count": len(page),
+        "rows_returned_total": state.rows_returned,
+        "has_more": has_more,
+        "page_token": token if has_more else None,
+    }
 
 
 async def init_db():
     """Initialize the SQLite database with required tables"""
-    async with aiosqlite.connect(DB_FILE) as db:
+    pool = await get_pool()
+    async with pool.writer() as db:
         # Create users table if it doesn't exist
         await db.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -39,19 +486,41 @@ async def init_db():
             )
         """)
         
-        await db.commit()
-        print(f"Database initialized: {Path(DB_FILE).resolve()}", file=sys.stderr)
+    print(f"Database initialized: {Path(_db().path).resolve()}", file=sys.stderr)
+
+
+async def _table_names(db: aiosqlite.Connection, schema: str = "main") -> list[str]:
+    """User tables of one schema (main or an attached alias), sidecars excluded"""
+    cursor = await db.execute(
+        f"SELECT name FROM {_quote_ident(schema)}.sqlite_master "
+        "WHERE type='table' AND name NOT GLOB ? ORDER BY name",
+        (SIDECAR_GLOB,)
+    )
+    return [row[0] for row in await cursor.fetchall()]
+
+
+def _split_table_name(pool: SQLitePool, table_name: str) -> tuple[str, str]:
+    """Split "alias.table" into (alias, table) when alias is attached, else ("main", table_name)"""
+    schema, dot, table = table_name.partition(".")
+    if dot and schema in pool.attachments:
+        return schema, table
+    return "main", table_name
 
 
 @mcp.tool()
 async def list_tables() -> list[str]:
-    """List all tables in the SQLite database"""
-    async with aiosqlite.connect(DB_FILE) as db:
-        cursor = await db.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
-        )
-        rows = await cursor.fetchall()
-    return [row[0] for row in rows]
+    """
+    List all tables in the SQLite database
+
+    Tables of attached databases are listed as alias.table and can be used
+    in execute_query under that name (including joins with main tables).
+    """
+    pool = await get_pool()
+    async with pool.reader() as db:
+        tables = await _table_names(db)
+        for alias in pool.attachments:
+            tables.extend(f"{alias}.{name}" for name in await _table_names(db, alias))
+    return tables
 
 
 @mcp.tool()
@@ -62,8 +531,10 @@ async def describe_table(table_name: str) -> list[dict]:
     Args:
         table_name: Name of the table to describe
     """
-    async with aiosqlite.connect(DB_FILE) as db:
-        cursor = await db.execute(f"PRAGMA table_info({table_name})")
+    pool = await get_pool()
+    schema, table = _split_table_name(pool, table_name)
+    async with pool.reader() as db:
+        cursor = await db.execute(f"PRAGMA {_quote_ident(schema)}.table_info({_quote_ident(table)})")
         rows = await cursor.fetchall()
     
     return [
@@ -80,44 +551,1580 @@ async def describe_table(table_name: str) -> list[dict]:
 
 
 @mcp.tool()
-async def execute_query(query: str) -> str:
+async def execute_query(
+    query: str,
+    max_rows: Optional[int] = None,
+    timeout_ms: Optional[int] = None,
+    result_format: str = "json"
+) -> str:
     """
     Execute a SQL query (SELECT, INSERT, UPDATE, DELETE)
     
     Args:
         query: The SQL query to execute
-    
+        max_rows: Optional page size for SELECT results. When set, at most this
+            many rows are returned along with has_more and a page_token; pass the
+            token to fetch_page to get the next rows without re-running the query.
+        timeout_ms: Optional deadline for this query in milliseconds, overriding
+            the server default. Queries past their deadline are interrupted.
+        result_format: "json" (list of row objects, default), "compact"
+            ({"columns": [...], "rows": [[...], ...]} without whitespace) or "csv"
+            (header line plus one line per row). Prefer "compact" or "csv" for
+            larger results; they are several times smaller.
+
+    Besides the SQLite built-ins, queries can use the aggregate (and window)
+    functions median(x), percentile(x, p) with p in 0-100, stddev(x),
+    stddev_pop(x), variance(x), var_pop(x) and corr(y, x), and the
+    X REGEXP 'pattern' operator (Python regular expressions).
+
     Returns:
         JSON string with query results or status message
     """
-    import json
+    start = time.perf_counter()
+    if result_format not in RESULT_FORMATS:
+        return _log_query(query, start, json.dumps({
+            "status": "error",
+            "message": f"Unknown result_format '{result_format}'. Use one of: {', '.join(RESULT_FORMATS)}"
+        }, indent=2), status="error")
+    
+    if _db().read_only and not _is_read_query(query):
+        return _log_query(query, start, json.dumps({
+            "status": "error",
+            "message": "Database is open in read-only mode; only SELECT, WITH, EXPLAIN and PRAGMA reads are allowed"
+        }, indent=2), status="error")
     
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.cursor()
+    pool = await get_pool()
+    timeout_ms = timeout_ms if timeout_ms and timeout_ms > 0 else QUERY_TIMEOUT_MS
+    rows = []
+    
+    try:
+        if max_rows is not None and _is_read_query(query):
+            page = await _open_paged_query(pool, query, max_rows, timeout_ms, result_format)
+            return _log_query(query, start, _dumps(page, result_format), rows=page["row_count"])
         
+        # Check if it's a SELECT query
+        if _is_read_query(query):
+            cache_key = (
+                f"{_db().cache_prefix}:{result_format}:{normalize_sql(query)}"
+                if result_cache.max_bytes > 0 and is_cacheable_sql(query) else None
+            )
+            if cache_key is not None:
+                version = await pool.data_version()
+                cached = result_cache.get_entry(cache_key, version)
+                if cached is not None:
+                    return _log_query(query, start, cached.value, rows=cached.rows, cache_hit=True)
+            
+            async with pool.reader() as db:
+                async with pool.deadline(db, timeout_ms):
+                    cursor = await db.execute(query)
+                    await _fetch_into(cursor, rows)
+                columns = [col[0] for col in cursor.description or []]
+            _record_duration(query, start)
+            output = _encode_rows(columns, rows, result_format)
+            
+            if cache_key is not None:
+                result_cache.put(cache_key, output, version, rows=len(rows))
+            return _log_query(query, start, output, rows=len(rows))
+        else:
+            # For INSERT, UPDATE, DELETE
+            async with pool.writer() as db:
+                changes_before = db.total_changes
+                async with pool.deadline(db, timeout_ms):
+                    cursor = await db.execute(query)
+                # rowcount is -1 for writes behind a WITH clause
+                affected_rows = cursor.rowcount if cursor.rowcount >= 0 else db.total_changes - changes_before
+            _record_duration(query, start)
+            return _log_query(query, start, json.dumps({
+                "status": "success",
+                "affected_rows": affected_rows,
+                "message": "Query executed successfully"
+            }, indent=2), rows=max(affected_rows, 0))
+            
+    except QueryTimeoutError as e:
+        _record_duration(query, start)
+        return _log_query(query, start, json.dumps(_timeout_error(e, len(rows)), indent=2), rows=len(rows), status="timeout")
+    except Exception as e:
+        return _log_query(query, start, json.dumps({
+            "status": "error",
+            "message": str(e)
+        }, indent=2), status="error")
+
+
+@mcp.tool()
+async def execute_batch(
+    queries: list[str],
+    parallel: bool = False,
+    timeout_ms: Optional[int] = None,
+    result_format: str = "json"
+) -> str:
+    """
+    Run several read queries (SELECT, WITH, EXPLAIN, PRAGMA) in one call, all
+    against the same snapshot of the database. Use this instead of several
+    execute_query calls when you need multiple aggregates or lookups at once.
+    
+    Args:
+        queries: List of read-only SQL queries
+        parallel: Run the queries concurrently on several read connections
+            (faster for independent heavy queries)
+        timeout_ms: Optional deadline per query in milliseconds
+        result_format: "json", "compact" or "csv" (see execute_query)
+    
+    Returns:
+        JSON string with one result per query, in input order, each with its
+        own status, rows and elapsed_ms
+    """
+    if result_format not in RESULT_FORMATS:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown result_format '{result_format}'. Use one of: {', '.join(RESULT_FORMATS)}"
+        }, indent=2)
+    if not queries:
+        return json.dumps({"status": "error", "message": "queries must not be empty"}, indent=2)
+    
+    pool = await get_pool()
+    timeout_ms = timeout_ms if timeout_ms and timeout_ms > 0 else QUERY_TIMEOUT_MS
+    results: list[Optional[dict]] = [None] * len(queries)
+    pending = iter(range(len(queries)))
+    
+    async def _run_one(db: aiosqlite.Connection, index: int) -> dict:
+        query = queries[index]
+        if not _is_read_query(query):
+            return {
+                "index": index,
+                "status": "error",
+                "message": "Only read queries are allowed in execute_batch",
+            }
+        rows = []
+        start = time.perf_counter()
         try:
-            await cursor.execute(query)
+            async with pool.deadline(db, timeout_ms):
+                cursor = await db.execute(query)
+                await _fetch_into(cursor, rows)
+        except QueryTimeoutError as e:
+            return {"index": index, **_timeout_error(e, len(rows))}
+        except Exception as e:
+            return {
+                "index": index,
+                "status": "error",
+                "message": str(e),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+        _record_duration(query, start)
+        columns = [col[0] for col in cursor.description or []]
+        return {
+            "index": index,
+            "status": "success",
+            "row_count": len(rows),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            **_rows_payload(columns, rows, result_format),
+        }
+    
+    async def _worker(db: aiosqlite.Connection) -> None:
+        # Workers share one iterator, so each query runs exactly once
+        for index in pending:
+            results[index] = await _run_one(db, index)
+    
+    start = time.perf_counter()
+    async with pool.snapshot(len(queries) if parallel else 1) as conns:
+        await asyncio.gather(*(_worker(db) for db in conns))
+    
+    return _dumps({
+        "status": "success",
+        "query_count": len(queries),
+        "connections": len(conns),
+        "total_ms": round((time.perf_counter() - start) * 1000, 2),
+        "results": results,
+    }, result_format)
+
+
+def _validate_insert(table: dict, columns: list[str], rows: list) -> Optional[str]:
+    """Check an insert_rows request against the table schema; returns an error message or None"""
+    by_name = {c["name"].lower(): c for c in table["columns"]}
+    
+    unknown = [c for c in columns if c.lower() not in by_name]
+    if unknown:
+        return f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(c['name'] for c in table['columns'])}"
+    if len({c.lower() for c in columns}) != len(columns):
+        return "Duplicate column names in columns"
+    
+    given = {c.lower() for c in columns}
+    # An INTEGER PRIMARY KEY is the rowid and gets a value automatically
+    pk_columns = [c for c in table["columns"] if c["pk"]]
+    rowid_alias = pk_columns[0]["name"].lower() if len(pk_columns) == 1 and pk_columns[0]["type"].upper() == "INTEGER" else None
+    missing = [
+        c["name"] for c in table["columns"]
+        if c["not_null"] and c["default"] is None and c["name"].lower() not in given and c["name"].lower() != rowid_alias
+    ]
+    if missing:
+        return f"Missing values for NOT NULL columns: {', '.join(missing)}"
+    
+    not_null = [i for i, c in enumerate(columns) if by_name[c.lower()]["not_null"]]
+    for row_index, row in enumerate(rows):
+        if not isinstance(row, (list, tuple)) or len(row) != len(columns):
+            return f"Row {row_index} must be an array of {len(columns)} values"
+        for value in row:
+            if value is not None and not isinstance(value, (str, int, float)):
+                return f"Row {row_index} contains a {type(value).__name__}; only strings, numbers, booleans and null are allowed"
+        for i in not_null:
+            if row[i] is None:
+                return f"Row {row_index}: column {columns[i]} is NOT NULL"
+    return None
+
+
+@mcp.tool()
+async def insert_rows(table_name: str, columns: list[str], rows: list[list[Any]]) -> str:
+    """
+    Insert many rows into a table in one transaction. Use this instead of
+    create_user in a loop or building a multi-row INSERT string for
+    execute_query; tens of thousands of rows per call are fine.
+    
+    Args:
+        table_name: Table to insert into
+        columns: Column names, in the order values appear in each row
+        rows: Array of rows, each an array of values aligned with columns
+    
+    Returns:
+        JSON string with the number of inserted rows and the throughput
+    """
+    if _db().read_only:
+        return json.dumps({
+            "status": "error",
+            "message": "Database is open in read-only mode; writes are disabled"
+        }, indent=2)
+    if not columns or not rows:
+        return json.dumps({"status": "error", "message": "columns and rows must not be empty"}, indent=2)
+    
+    pool = await get_pool()
+    async with pool.reader() as db:
+        _, catalog = await _get_schema_catalog(db)
+    if table_name not in catalog:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown table '{table_name}'. Use list_tables to see the available tables."
+        }, indent=2)
+    
+    error = _validate_insert(catalog[table_name], columns, rows)
+    if error:
+        return json.dumps({"status": "error", "message": error}, indent=2)
+    
+    column_sql = ", ".join(_quote_ident(c) for c in columns)
+    placeholders = ", ".join("?" * len(columns))
+    statement = f"INSERT INTO {_quote_ident(table_name)} ({column_sql}) VALUES ({placeholders})"
+    
+    start = time.perf_counter()
+    inserted = 0
+    try:
+        async with pool.writer() as db:
+            async with pool.deadline(db, QUERY_TIMEOUT_MS):
+                for offset in range(0, len(rows), INSERT_CHUNK_ROWS):
+                    chunk = rows[offset:offset + INSERT_CHUNK_ROWS]
+                    await db.executemany(statement, chunk)
+                    inserted += len(chunk)
+    except QueryTimeoutError as e:
+        return json.dumps({
+            "status": "error",
+            "error": "timeout",
+            "message": f"Insert timed out after {e.timeout_ms} ms; no rows were inserted",
+            "timeout_ms": e.timeout_ms,
+        }, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "status": "error",
+            "message": f"{e}; no rows were inserted"
+        }, indent=2)
+    
+    elapsed = time.perf_counter() - start
+    return json.dumps({
+        "status": "success",
+        "table": table_name,
+        "inserted_rows": inserted,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_second": round(inserted / elapsed) if elapsed > 0 else None,
+    }, indent=2)
+
+
+def _record_duration(query: str, start: float) -> None:
+    """Remember the query in the slow query log if it took SLOW_QUERY_MS or longer"""
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms >= SLOW_QUERY_MS:
+        _db().slow_query_log.record(sql_fingerprint(query), query, duration_ms)
+
+
+def _log_query(
+    query: str,
+    start: float,
+    output: str,
+    rows: int = 0,
+    cache_hit: bool = False,
+    status: str = "success"
+) -> str:
+    """Add an execute_query call to the query statistics and return its output"""
+    _db().query_log.record(
+        query,
+        (time.perf_counter() - start) * 1000,
+        rows=rows,
+        size=len(output.encode("utf-8")),
+        cache_hit=cache_hit,
+        status=status,
+    )
+    return output
+
+
+async def _open_paged_query(
+    pool: SQLitePool,
+    query: str,
+    max_rows: int,
+    timeout_ms: Optional[int],
+    result_format: str
+) -> dict:
+    """Run a read query on a dedicated connection and return its first page"""
+    max_rows = max(1, min(int(max_rows), MAX_PAGE_ROWS))
+    conn = await pool.open_reader()
+    try:
+        async with pool.deadline(conn, timeout_ms):
+            cursor = await conn.execute(query)
+    except BaseException:
+        with anyio.CancelScope(shield=True):
+            await conn.close()
+        raise
+    
+    state = _PagedCursor(
+        conn=conn,
+        cursor=cursor,
+        columns=[col[0] for col in cursor.description or []],
+        max_rows=max_rows,
+        timeout_ms=timeout_ms,
+        result_format=result_format,
+        expires_at=time.monotonic() + CURSOR_TTL_SECONDS,
+    )
+    token = uuid.uuid4().hex
+    
+    db = _db()
+    async with db.cursors_lock:
+        await db.expire_cursors()
+        # Keep the number of open cursors bounded: evict the ones closest to expiry
+        while len(db.cursors) >= MAX_OPEN_CURSORS:
+            oldest = min(db.cursors, key=lambda t: db.cursors[t].expires_at)
+            await db.drop_cursor(oldest)
+        db.cursors[token] = state
+        try:
+            return await _read_page(pool, token, state)
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await db.drop_cursor(token)
+            raise
+
+
+def _export_dir() -> Path:
+    db = _db()
+    return Path(db.export_dir) if db.export_dir else Path(db.path).resolve().parent / "exports"
+
+
+@mcp.tool()
+async def export_query(
+    query: str,
+    file_format: str = "csv",
+    compress: bool = False,
+    file_name: Optional[str] = None,
+    timeout_ms: Optional[int] = None
+) -> str:
+    """
+    Export the full result of a SELECT query to a downloadable file instead of
+    returning the rows. Use this when the user asks to export, download or
+    save data, or when a result is too large to show (thousands of rows).
+    Only the file name, row count and size come back; give the user the
+    download_url.
+
+    Args:
+        query: SELECT (or WITH) query whose rows to export
+        file_format: "csv" (default) or "ndjson" (one JSON object per line)
+        compress: Gzip the file (.gz); much smaller for large exports
+        file_name: Optional name for the file (e.g. "orders_2024"); a unique
+            suffix and the extension are added
+        timeout_ms: Optional deadline for the whole export in milliseconds
+
+    Returns:
+        JSON string with file_name, download_url, row_count and bytes
+    """
+    if file_format not in EXPORT_FORMATS:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown file_format '{file_format}'. Use one of: {', '.join(EXPORT_FORMATS)}"
+        }, indent=2)
+    if not _is_read_query(query):
+        return json.dumps({"status": "error", "message": "export_query only runs read queries (SELECT, WITH)"}, indent=2)
+
+    directory = _export_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    remove_expired_exports(directory, EXPORT_TTL_HOURS * 3600)
+    name = export_file_name(file_name, uuid.uuid4().hex[:16], file_format, compress)
+
+    pool = await get_pool()
+    timeout_ms = timeout_ms if timeout_ms and timeout_ms > 0 else EXPORT_TIMEOUT_MS
+    start = time.perf_counter()
+    # A dedicated connection, so a long export does not hold a pooled reader
+    conn = await pool.open_reader()
+    try:
+        async with pool.deadline(conn, timeout_ms):
+            cursor = await conn.execute(query)
+            result = await export_cursor(cursor, directory / name, file_format, compress, EXPORT_CHUNK_ROWS)
+    except QueryTimeoutError as e:
+        return json.dumps(_timeout_error(e, 0), indent=2)
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    finally:
+        with anyio.CancelScope(shield=True):
+            await conn.close()
+
+    payload = {
+        "status": "success",
+        "file_name": name,
+        "format": file_format,
+        "compressed": compress,
+        "row_count": result["rows"],
+        "bytes": result["bytes"],
+        "columns": result["columns"],
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        "expires_in_hours": EXPORT_TTL_HOURS,
+    }
+    if _db().export_url:
+        payload["download_url"] = f"{_db().export_url.rstrip('/')}/{name}"
+    else:
+        payload["path"] = str(directory / name)
+    return json.dumps(payload, indent=2)
+
+
+@mcp.tool()
+async def fetch_page(page_token: str) -> str:
+    """
+    Fetch the next page of a paged execute_query result
+    
+    Args:
+        page_token: The page_token returned by execute_query or a previous fetch_page
+    
+    Returns:
+        JSON string with the next rows, has_more and the token for the following page
+    """
+    pool = await get_pool()
+    
+    db = _db()
+    async with db.cursors_lock:
+        await db.expire_cursors()
+        state = db.cursors.get(page_token)
+        if state is None:
+            return json.dumps({
+                "status": "error",
+                "message": "Unknown or expired page_token; re-run the query with execute_query"
+            }, indent=2)
+        try:
+            page = await _read_page(pool, page_token, state)
+        except QueryTimeoutError as e:
+            await db.drop_cursor(page_token)
+            return json.dumps(_timeout_error(e, state.rows_returned), indent=2)
+        except Exception as e:
+            await db.drop_cursor(page_token)
+            return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    
+    return _dumps(page, state.result_format)
+
+
+async def _build_schema_catalog(db: aiosqlite.Connection) -> dict:
+    """Read every table's columns, indexes, foreign keys and approximate row count"""
+    cursor = await db.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name NOT GLOB ? ORDER BY name",
+        (SIDECAR_GLOB,)
+    )
+    tables = await cursor.fetchall()
+    
+    # ANALYZE statistics give row counts for free when present
+    stat_rows = {}
+    cursor = await db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+    )
+    if await cursor.fetchone():
+        cursor = await db.execute("SELECT tbl, stat FROM sqlite_stat1")
+        for tbl, stat in await cursor.fetchall():
+            if stat:
+                stat_rows.setdefault(tbl, int(stat.split()[0]))
+    
+    catalog = {}
+    for name, create_sql in tables:
+        cursor = await db.execute(
+            "SELECT name, type, \"notnull\", dflt_value, pk FROM pragma_table_info(?)", (name,)
+        )
+        columns = [
+            {"name": c[0], "type": c[1], "not_null": bool(c[2]), "default": c[3], "pk": c[4]}
+            for c in await cursor.fetchall()
+        ]
+        
+        cursor = await db.execute('SELECT name, "unique", origin FROM pragma_index_list(?)', (name,))
+        indexes = []
+        for index_name, unique, origin in await cursor.fetchall():
+            col_cursor = await db.execute("SELECT name FROM pragma_index_info(?) ORDER BY seqno", (index_name,))
+            indexes.append({
+                "name": index_name,
+                "columns": [c[0] for c in await col_cursor.fetchall()],
+                "unique": bool(unique),
+                "origin": origin,
+            })
+        
+        cursor = await db.execute('SELECT "from", "table", "to" FROM pragma_foreign_key_list(?)', (name,))
+        foreign_keys = [
+            {"column": fk[0], "references_table": fk[1], "references_column": fk[2]}
+            for fk in await cursor.fetchall()
+        ]
+        
+        # Approximate row count: sqlite_stat1, else MAX(rowid) which is an
+        # index seek instead of a full COUNT(*) scan
+        if name in stat_rows:
+            row_count, row_count_source = stat_rows[name], "sqlite_stat1"
+        elif "WITHOUT ROWID" in (create_sql or "").upper():
+            row_count, row_count_source = None, "unknown"
+        else:
+            cursor = await db.execute(f"SELECT MAX(rowid) FROM {_quote_ident(name)}")
+            row_count, row_count_source = (await cursor.fetchone())[0] or 0, "max_rowid"
+        
+        catalog[name] = {
+            "columns": columns,
+            "indexes": indexes,
+            "foreign_keys": foreign_keys,
+            "approx_row_count": row_count,
+            "row_count_source": row_count_source,
+        }
+    return catalog
+
+
+async def _get_schema_catalog(db: aiosqlite.Connection) -> tuple[int, dict]:
+    """Return (schema_version, catalog), rebuilding the catalog if the schema changed"""
+    state = _db()
+    cursor = await db.execute("PRAGMA schema_version")
+    schema_version = (await cursor.fetchone())[0]
+    if state.schema_cache is None or state.schema_cache[0] != schema_version:
+        state.schema_cache = (schema_version, await _build_schema_catalog(db))
+    return state.schema_cache
+
+
+@mcp.tool()
+async def get_schema(tables: Optional[list[str]] = None, max_columns: Optional[int] = None) -> str:
+    """
+    Get the whole database schema in one call: every table with its columns,
+    types, indexes, foreign keys and approximate row count. Use this instead of
+    list_tables + describe_table + COUNT(*) per table.
+    
+    Args:
+        tables: Optional list of table names to include (default: all tables)
+        max_columns: Optional limit on columns listed per table; wider tables
+            are truncated and report how many columns were omitted
+    
+    Returns:
+        Compact JSON object keyed by table name
+    """
+    pool = await get_pool()
+    async with pool.reader() as db:
+        schema_version, catalog = await _get_schema_catalog(db)
+    
+    selected = catalog
+    if tables:
+        selected = {name: catalog[name] for name in tables if name in catalog}
+        missing = [name for name in tables if name not in catalog]
+    else:
+        missing = []
+    
+    output = {}
+    for name, info in selected.items():
+        info = dict(info)
+        if max_columns is not None and len(info["columns"]) > max_columns > 0:
+            info["columns_omitted"] = len(info["columns"]) - max_columns
+            info["columns"] = info["columns"][:max_columns]
+        output[name] = info
+    
+    payload = {"schema_version": schema_version, "tables": output}
+    if missing:
+        payload["unknown_tables"] = missing
+    return _dumps(payload, "compact")
+
+
+def _is_covered(candidate: IndexCandidate, catalog: dict) -> bool:
+    """True if an existing index already starts with the candidate's columns"""
+    wanted = [c.lower() for c in candidate.columns]
+    for index in catalog.get(candidate.table, {}).get("indexes", []):
+        existing = [(c or "").lower() for c in index["columns"]]
+        if existing[:len(wanted)] == wanted:
+            return True
+    return False
+
+
+def _widest_index(table: str, columns: list[str], others: list[tuple[str, list[str]]]) -> Optional[int]:
+    """Position of a longer (table, columns) in others whose leading columns are these, if any"""
+    wanted = [c.lower() for c in columns]
+    for i, (other_table, other_columns) in enumerate(others):
+        other = [c.lower() for c in other_columns]
+        if other_table == table and len(other) > len(wanted) and other[:len(wanted)] == wanted:
+            return i
+    return None
+
+
+async def _plan_and_candidates(db: aiosqlite.Connection, query: str, catalog: dict) -> tuple[dict, list[IndexCandidate]]:
+    """Run EXPLAIN QUERY PLAN and propose indexes not already covered by the schema"""
+    cursor = await db.execute(f"EXPLAIN QUERY PLAN {query.strip().rstrip(';')}")
+    plan = analyze_plan(await cursor.fetchall())
+    table_columns = {
+        name: {c["name"].lower() for c in info["columns"]}
+        for name, info in catalog.items()
+    }
+    candidates = [
+        c for c in propose_indexes(query, plan, table_columns)
+        if not _is_covered(c, catalog)
+    ]
+    # An index on (a, b) also serves lookups on a alone
+    keys = [(c.table, c.columns) for c in candidates]
+    merged = []
+    for candidate in candidates:
+        wider = _widest_index(candidate.table, candidate.columns, keys)
+        if wider is None:
+            merged.append(candidate)
+        else:
+            for reason in candidate.reasons:
+                if reason not in candidates[wider].reasons:
+                    candidates[wider].reasons.append(reason)
+    return plan, merged
+
+
+@mcp.tool()
+async def explain_query(query: str) -> str:
+    """
+    Show how SQLite will run a query (EXPLAIN QUERY PLAN) without running it.
+    Flags full table scans, temporary B-tree sorts and automatic indexes, and
+    suggests CREATE INDEX statements that would avoid them.
+    
+    Args:
+        query: The SQL query to inspect
+    
+    Returns:
+        JSON string with the plan steps, the problems found and suggested indexes
+    """
+    pool = await get_pool()
+    try:
+        async with pool.reader() as db:
+            _, catalog = await _get_schema_catalog(db)
+            plan, candidates = await _plan_and_candidates(db, query, catalog)
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    
+    plan["suggested_indexes"] = [
+        {"create_sql": c.create_sql(), "reasons": c.reasons} for c in candidates
+    ]
+    return json.dumps(plan, indent=2)
+
+
+@mcp.tool()
+async def advise_indexes(apply: bool = False, max_indexes: int = 5) -> str:
+    """
+    Recommend indexes for the slow queries seen by execute_query, ranked by
+    estimated benefit (total time spent in the queries each index would help).
+    
+    Args:
+        apply: If true, create the recommended indexes and run ANALYZE
+        max_indexes: Maximum number of indexes to recommend (and apply)
+    
+    Returns:
+        JSON string with the ranked CREATE INDEX recommendations
+    """
+    if apply and _db().read_only:
+        return json.dumps({
+            "status": "error",
+            "message": "Database is open in read-only mode; indexes cannot be created"
+        }, indent=2)
+    
+    pool = await get_pool()
+    slow_queries = _db().slow_query_log.entries()
+    recommendations: dict[str, dict] = {}
+    
+    async with pool.reader() as db:
+        _, catalog = await _get_schema_catalog(db)
+        for entry in slow_queries:
+            try:
+                _, candidates = await _plan_and_candidates(db, entry["query"], catalog)
+            except Exception:
+                # The table may have been dropped since the query was logged
+                continue
+            for candidate in candidates:
+                rec = recommendations.setdefault(candidate.create_sql(), {
+                    "table": candidate.table,
+                    "columns": candidate.columns,
+                    "create_sql": candidate.create_sql(),
+                    "reasons": [],
+                    "queries_helped": 0,
+                    "estimated_benefit_ms": 0.0,
+                    "approx_row_count": catalog[candidate.table]["approx_row_count"],
+                    "example_query": entry["query"],
+                })
+                rec["reasons"] = sorted(set(rec["reasons"]) | set(candidate.reasons))
+                rec["queries_helped"] += entry["count"]
+                rec["estimated_benefit_ms"] += entry["total_ms"]
+    
+    # Fold each recommendation into a wider one on the same leading columns
+    recs = list(recommendations.values())
+    keys = [(r["table"], r["columns"]) for r in recs]
+    kept = []
+    for rec in recs:
+        wider = _widest_index(rec["table"], rec["columns"], keys)
+        if wider is None:
+            kept.append(rec)
+            continue
+        target = recs[wider]
+        target["reasons"] = sorted(set(target["reasons"]) | set(rec["reasons"]))
+        target["queries_helped"] += rec["queries_helped"]
+        target["estimated_benefit_ms"] += rec["estimated_benefit_ms"]
+    
+    ranked = sorted(
+        kept,
+        key=lambda r: (r["estimated_benefit_ms"], r["approx_row_count"] or 0),
+        reverse=True,
+    )[:max(0, max_indexes)]
+    for rec in ranked:
+        rec["estimated_benefit_ms"] = round(rec["estimated_benefit_ms"], 1)
+    
+    result = {
+        "status": "success",
+        "slow_query_ms": SLOW_QUERY_MS,
+        "slow_queries_analyzed": len(slow_queries),
+        # Upper bound: the time spent in those queries, not a prediction of the saving
+        "recommendations": ranked,
+    }
+    
+    if apply and ranked:
+        try:
+            async with pool.writer() as db:
+                for rec in ranked:
+                    await db.execute(rec["create_sql"])
+                await db.execute("ANALYZE")
+        except Exception as e:
+            return json.dumps({"status": "error", "message": str(e)}, indent=2)
+        # Timings recorded before the new indexes no longer describe these queries
+        _db().slow_query_log.clear()
+        result["applied"] = [rec["create_sql"] for rec in ranked]
+    
+    return json.dumps(result, indent=2)
+
+
+async def _table_fingerprint(db: aiosqlite.Connection, table_name: str) -> str:
+    """
+    Identify the current contents of a table across server restarts
+
+    data_version is only meaningful within one connection, so persisted
+    profiles are matched on the table definition and highest rowid, which
+    costs one B-tree seek rather than a scan. Writes made through this server
+    drop the stored statistics of the tables they touch; UPDATEs and DELETEs
+    by other programs that leave the highest rowid alone (and any change to
+    a WITHOUT ROWID table) are only noticed with refresh=True.
+    """
+    cursor = await db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    definition = (await cursor.fetchone())[0] or ""
+    try:
+        cursor = await db.execute(f"SELECT MAX(rowid) FROM {_quote_ident(table_name)}")
+        max_rowid = (await cursor.fetchone())[0]
+    except aiosqlite.OperationalError:
+        max_rowid = None  # WITHOUT ROWID table
+    return f"{zlib.crc32(definition.encode('utf-8')):08x}:{max_rowid}"
+
+
+@mcp.tool()
+async def profile_table(table_name: str, top_k: int = 10, bins: int = 10, refresh: bool = False) -> str:
+    """
+    Profile every column of a table in one pass: count, null count, distinct
+    count, min/max, mean/std/quartiles and a histogram for numeric columns,
+    and the most frequent values for categorical ones. Use this instead of
+    running separate MIN/MAX/COUNT(DISTINCT)/GROUP BY queries per column.
+    
+    Profiles are stored in a file next to the database and reused until the
+    table changes. Quartiles and histograms of large tables come from a
+    uniform sample (quantiles_exact is false then).
+    
+    Args:
+        table_name: Name of the table to profile
+        top_k: Number of most frequent values to report per column
+        bins: Number of histogram buckets for numeric columns
+        refresh: Recompute even if a stored profile is still valid
+    
+    Returns:
+        Compact JSON object with one entry per column
+    """
+    pool = await get_pool()
+    top_k = max(1, int(top_k))
+    bins = max(1, int(bins))
+    
+    async with pool.reader() as db:
+        _, catalog = await _get_schema_catalog(db)
+    if table_name not in catalog:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown table '{table_name}'. Use list_tables to see the available tables."
+        }, indent=2)
+    
+    def _matches(profile: dict) -> bool:
+        return profile["top_k"] == top_k and profile["bins"] == bins
+    
+    version = await pool.data_version()
+    if not refresh:
+        cached = _db().profiles.get(table_name)
+        if cached is not None and cached[0] == version and _matches(cached[1]):
+            return _dumps({**cached[1], "source": "memory"}, "compact")
+    
+    rows_read = 0
+    try:
+        async with pool.reader() as db:
+            # One snapshot for the fingerprint and the scan
+            await db.execute("BEGIN")
+            fingerprint = await _table_fingerprint(db, table_name)
             
-            # Check if it's a SELECT query
-            if query.strip().upper().startswith(('SELECT', 'PRAGMA', 'EXPLAIN')):
-                rows = await cursor.fetchall()
-                results = [dict(row) for row in rows]
-                return json.dumps(results, indent=2, default=str)
+            if not refresh:
+                stored = await _db().stats_store().get_profile(table_name, fingerprint)
+                if stored is not None and _matches(stored):
+                    _db().profiles[table_name] = (version, stored)
+                    return _dumps({**stored, "source": "stored"}, "compact")
+            
+            columns = catalog[table_name]["columns"]
+            profiler = TableProfiler([c["name"] for c in columns], [c["type"] for c in columns])
+            select_list = ", ".join(_quote_ident(c["name"]) for c in columns)
+            async with pool.deadline(db, QUERY_TIMEOUT_MS):
+                cursor = await db.execute(f"SELECT {select_list} FROM {_quote_ident(table_name)}")
+                while chunk := await cursor.fetchmany(PROFILE_CHUNK_ROWS):
+                    rows_read += len(chunk)
+                    profiler.update(chunk)
+    except QueryTimeoutError as e:
+        return json.dumps(_timeout_error(e, rows_read), indent=2)
+    
+    profile = {
+        "table": table_name,
+        "top_k": top_k,
+        "bins": bins,
+        "computed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **profiler.result(top_k=top_k, bins=bins),
+    }
+    _db().profiles[table_name] = (version, profile)
+    # Stored beside the database, so saving it leaves data_version alone
+    await _db().stats_store().put_profile(table_name, fingerprint, profile)
+    
+    return _dumps({**profile, "source": "computed"}, "compact")
+
+
+@mcp.tool()
+async def sample_rows(
+    table_name: str,
+    k: int = 10,
+    where: Optional[str] = None,
+    seed: Optional[int] = None,
+    result_format: str = "json"
+) -> str:
+    """
+    Get k uniformly random rows from a table. Use this instead of
+    ORDER BY RANDOM() LIMIT k, which sorts the entire table.
+    
+    Args:
+        table_name: Table (or view) to sample from
+        k: Number of rows to return
+        where: Optional SQL filter expression, e.g. "region = 'EU' AND amount > 10"
+        seed: Optional random seed; the same seed on unchanged data returns
+            the same rows. The seed used is always included in the response.
+        result_format: "json", "compact" or "csv" (see execute_query)
+    
+    Returns:
+        JSON string with the sampled rows and the sampling method used
+    """
+    if result_format not in RESULT_FORMATS:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown result_format '{result_format}'. Use one of: {', '.join(RESULT_FORMATS)}"
+        }, indent=2)
+    
+    k = max(1, min(int(k), MAX_PAGE_ROWS))
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 31)
+    rng = random.Random(seed)
+    table_sql = _quote_ident(table_name)
+    pool = await get_pool()
+    
+    try:
+        async with pool.reader() as db:
+            cursor = await db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (table_name,)
+            )
+            if not await cursor.fetchone():
+                return json.dumps({
+                    "status": "error",
+                    "message": f"Unknown table '{table_name}'. Use list_tables to see the available tables."
+                }, indent=2)
+            
+            async with pool.deadline(db, QUERY_TIMEOUT_MS):
+                # One snapshot, so a fallback pass sees the same rows as the probes
+                await db.execute("BEGIN")
+                sample = await sample_by_rowid(db, table_sql, k, rng, where)
+                if sample is not None:
+                    method, (columns, rows, rows_read) = "rowid_probe", sample
+                else:
+                    method = "reservoir"
+                    columns, rows, rows_read = await reservoir_sample(
+                        db, table_sql, k, rng, where, chunk_rows=FETCH_CHUNK_ROWS
+                    )
+    except QueryTimeoutError as e:
+        return json.dumps(_timeout_error(e, 0), indent=2)
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    
+    return _dumps({
+        **_rows_payload(columns, rows, result_format),
+        "row_count": len(rows),
+        "method": method,
+        "rows_read": rows_read,
+        "seed": seed,
+    }, result_format)
+
+
+async def _load_column_arrays(
+    pool: SQLitePool,
+    table_name: str,
+    numeric: list[str],
+    labels: list[str],
+) -> tuple[dict, dict, str]:
+    """
+    Return NumPy arrays for the given columns, reading only the ones not cached
+
+    Returns:
+        (numeric arrays by column, group label arrays by column, "hit"/"partial"/"miss")
+    """
+    version = await pool.data_version()
+    wanted = [("num", c) for c in numeric] + [("label", c) for c in labels]
+    arrays = {key: column_arrays.get(f"{_db().cache_prefix}:{table_name}", f"{key[0]}:{key[1]}", version) for key in wanted}
+    missing = [key for key, values in arrays.items() if values is None]
+    
+    if missing:
+        select_list = ", ".join(_quote_ident(c) for _, c in missing)
+        chunks: dict[tuple[str, str], list] = {key: [] for key in missing}
+        async with pool.reader() as db:
+            async with pool.deadline(db, QUERY_TIMEOUT_MS):
+                cursor = await db.execute(f"SELECT {select_list} FROM {_quote_ident(table_name)}")
+                while rows := await cursor.fetchmany(PROFILE_CHUNK_ROWS):
+                    matrix = np.empty((len(rows), len(missing)), dtype=object)
+                    matrix[:] = rows
+                    for j, key in enumerate(missing):
+                        convert = column_analytics.to_numeric if key[0] == "num" else column_analytics.group_labels
+                        chunks[key].append(convert(matrix[:, j]))
+        for key, parts in chunks.items():
+            empty = np.empty(0) if key[0] == "num" else np.empty(0, dtype=str)
+            arrays[key] = np.concatenate(parts) if parts else empty
+            column_arrays.put(f"{_db().cache_prefix}:{table_name}", f"{key[0]}:{key[1]}", version, arrays[key])
+    
+    status = "hit" if not missing else ("miss" if len(missing) == len(wanted) else "partial")
+    return (
+        {c: arrays[("num", c)] for c in numeric},
+        {c: arrays[("label", c)] for c in labels},
+        status,
+    )
+
+
+@mcp.tool()
+async def analyze_columns(
+    table_name: str,
+    columns: list[str],
+    group_by: Optional[str] = None,
+    quantiles: Optional[list[float]] = None,
+    target: Optional[str] = None,
+    max_groups: int = 50
+) -> str:
+    """
+    Statistics SQLite cannot compute: median and other quantiles, standard
+    deviation, correlation matrix, linear regression and per-group summaries
+    of numeric columns. Returns compact numeric summaries only, never rows.
+    Use this instead of pulling raw rows with execute_query to do math.
+    
+    Args:
+        table_name: Table to analyze
+        columns: Numeric columns to analyze (NULL and non-numeric text are skipped)
+        group_by: Optional column to group by; adds count/mean/sum/min/max/std per group
+        quantiles: Optional quantiles between 0 and 1 (default 0.05, 0.25, 0.5, 0.75, 0.95)
+        target: Optional column from columns to regress on the other columns
+        max_groups: Largest groups to report when group_by is set
+    
+    Returns:
+        Compact JSON object with per-column stats, correlation matrix (2+ columns),
+        regression (when target is set) and grouped aggregates (when group_by is set)
+    """
+    pool = await get_pool()
+    async with pool.reader() as db:
+        _, catalog = await _get_schema_catalog(db)
+    if table_name not in catalog:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown table '{table_name}'. Use list_tables to see the available tables."
+        }, indent=2)
+    
+    # Resolve names case-insensitively to the declared spelling
+    known = {c["name"].lower(): c["name"] for c in catalog[table_name]["columns"]}
+    requested = list(columns or []) + ([group_by] if group_by else []) + ([target] if target else [])
+    unknown = [c for c in requested if c.lower() not in known]
+    if unknown or not columns:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown or missing columns: {', '.join(unknown) or '(none given)'}. "
+                       f"Available: {', '.join(known.values())}"
+        }, indent=2)
+    columns = list(dict.fromkeys(known[c.lower()] for c in columns))
+    group_by = known[group_by.lower()] if group_by else None
+    target = known[target.lower()] if target else None
+    if target and target not in columns:
+        columns.append(target)
+    
+    quantiles = quantiles or list(column_analytics.DEFAULT_QUANTILES)
+    if any(not 0 <= q <= 1 for q in quantiles):
+        return json.dumps({"status": "error", "message": "quantiles must be between 0 and 1"}, indent=2)
+    
+    start = time.perf_counter()
+    try:
+        arrays, labels, cache_status = await _load_column_arrays(
+            pool, table_name, columns, [group_by] if group_by else []
+        )
+    except QueryTimeoutError as e:
+        return json.dumps(_timeout_error(e, 0), indent=2)
+    
+    result: dict[str, Any] = {
+        "table": table_name,
+        "rows": len(next(iter(arrays.values()))),
+        "columns": {name: column_analytics.describe(values, quantiles) for name, values in arrays.items()},
+    }
+    if len(arrays) > 1:
+        result["correlation"] = column_analytics.correlation(arrays)
+    if target and len(arrays) > 1:
+        result["regression"] = column_analytics.linear_regression(target, arrays)
+    if group_by:
+        result["grouped"] = {
+            "by": group_by,
+            **column_analytics.grouped(labels[group_by], arrays, max(1, max_groups)),
+        }
+    result["cache"] = cache_status
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return _dumps(result, "compact")
+
+
+async def _scan_sketch(pool: SQLitePool, table_name: str, column: str) -> HyperLogLog:
+    """Build a distinct-count sketch from one pass over the column"""
+    sketch = HyperLogLog()
+    async with pool.reader() as db:
+        async with pool.deadline(db, QUERY_TIMEOUT_MS):
+            cursor = await db.execute(f"SELECT {_quote_ident(column)} FROM {_quote_ident(table_name)}")
+            while rows := await cursor.fetchmany(PROFILE_CHUNK_ROWS):
+                sketch.add(np.array([row[0] for row in rows], dtype=object))
+    return sketch
+
+
+async def _column_sketch(pool: SQLitePool, table_name: str, column: str) -> tuple[HyperLogLog, str]:
+    """
+    Distinct-count sketch of a whole column, reused while the data is unchanged
+
+    Returns:
+        (sketch, "memory" | "stored" | "computed")
+    """
+    version = await pool.data_version()
+    cached = _db().sketches.get((table_name, column))
+    if cached is not None and cached[0] == version:
+        return cached[1], "memory"
+
+    async with pool.reader() as db:
+        fingerprint = await _table_fingerprint(db, table_name)
+    registers = await _db().stats_store().get_sketch(table_name, column, fingerprint)
+    if registers is not None:
+        sketch = HyperLogLog.from_bytes(registers)
+        _db().sketches[(table_name, column)] = (version, sketch)
+        return sketch, "stored"
+
+    sketch = await _scan_sketch(pool, table_name, column)
+    _db().sketches[(table_name, column)] = (version, sketch)
+    await _db().stats_store().put_sketch(table_name, column, fingerprint, sketch.to_bytes())
+    return sketch, "computed"
+
+
+@mcp.tool()
+async def approximate_aggregate(
+    table_name: str,
+    column: Optional[str] = None,
+    aggregates: Optional[list[str]] = None,
+    where: Optional[str] = None,
+    sample_size: int = 20000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None
+) -> str:
+    """
+    Fast approximate COUNT, SUM, AVG and COUNT(DISTINCT) with confidence
+    intervals, for large tables where exact aggregates take seconds. Results
+    are estimates: report them as approximate (e.g. "about 1.2 million").
+
+    COUNT/SUM/AVG come from a uniform random sample of rows; COUNT(DISTINCT)
+    comes from a HyperLogLog sketch (about 0.8% error), which is stored and
+    reused until the table changes. With a where filter COUNT(DISTINCT) is
+    counted exactly by SQLite instead.
+
+    Args:
+        table_name: Table to aggregate
+        column: Column for sum, avg and count_distinct (not needed for count)
+        aggregates: Any of "count", "sum", "avg", "count_distinct"
+            (default: all that apply)
+        where: Optional SQL filter expression
+        sample_size: Rows to sample for count/sum/avg; larger is tighter and slower
+        confidence: Confidence level of the intervals (e.g. 0.95)
+        seed: Optional random seed for reproducible estimates
+
+    Returns:
+        JSON string with an estimate and ci_low/ci_high per aggregate
+    """
+    pool = await get_pool()
+    async with pool.reader() as db:
+        _, catalog = await _get_schema_catalog(db)
+    if table_name not in catalog:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown table '{table_name}'. Use list_tables to see the available tables."
+        }, indent=2)
+
+    known = {c["name"].lower(): c["name"] for c in catalog[table_name]["columns"]}
+    if column is not None:
+        if column.lower() not in known:
+            return json.dumps({
+                "status": "error",
+                "message": f"Unknown column '{column}'. Available: {', '.join(known.values())}"
+            }, indent=2)
+        column = known[column.lower()]
+
+    aggregates = aggregates or (list(APPROX_AGGREGATES) if column else ["count"])
+    invalid = [a for a in aggregates if a not in APPROX_AGGREGATES]
+    if invalid:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown aggregates: {', '.join(invalid)}. Use: {', '.join(APPROX_AGGREGATES)}"
+        }, indent=2)
+    if column is None and any(a != "count" for a in aggregates):
+        return json.dumps({"status": "error", "message": "sum, avg and count_distinct need a column"}, indent=2)
+    if not 0 < confidence < 1:
+        return json.dumps({"status": "error", "message": "confidence must be between 0 and 1"}, indent=2)
+
+    z = z_score(confidence)
+    rng = random.Random(seed)
+    table_sql = _quote_ident(table_name)
+    start = time.perf_counter()
+    results: dict[str, Any] = {}
+    payload: dict[str, Any] = {
+        "table": table_name,
+        "column": column,
+        "where": where,
+        "approximate": True,
+        "confidence": confidence,
+    }
+
+    try:
+        sampled = [a for a in aggregates if a in ("count", "sum", "avg")]
+        if sampled:
+            async with pool.reader() as db:
+                async with pool.deadline(db, QUERY_TIMEOUT_MS):
+                    select_sql = _quote_ident(column) if column else "1"
+                    probe = await probe_rows(db, table_sql, select_sql, max(100, int(sample_size)), rng, where)
+            if probe is None:
+                return json.dumps({
+                    "status": "error",
+                    "message": f"'{table_name}' has no rowid to sample by; use execute_query for exact aggregates"
+                }, indent=2)
+            rows, probes, span = probe
+            if probes == 0:
+                estimates = {"count": interval(0, 0)}
             else:
-                # For INSERT, UPDATE, DELETE
-                await db.commit()
+                values = None
+                if column and ("sum" in sampled or "avg" in sampled):
+                    values = column_analytics.to_numeric(np.array([row[0] for row in rows], dtype=object))
+                estimates = sampled_aggregates(values, len(rows), probes, span, z)
+            results.update({a: estimates[a] for a in sampled if a in estimates})
+            payload["sample"] = {"rowids_probed": probes, "rows_matched": len(rows), "rowid_span": span}
+            if probes == span:
+                # Every rowid was looked at, so these numbers are exact
+                payload["approximate"] = False
+
+        if "count_distinct" in aggregates and where:
+            # A sketch of a filtered column cannot be reused, so let SQLite
+            # count it exactly instead of streaming every value into Python
+            async with pool.reader() as db:
+                async with pool.deadline(db, QUERY_TIMEOUT_MS):
+                    cursor = await db.execute(
+                        f"SELECT COUNT(DISTINCT {_quote_ident(column)}) FROM {table_sql} WHERE ({where})"
+                    )
+                    distinct = (await cursor.fetchone())[0]
+            results["count_distinct"] = {**interval(distinct, 0), "exact": True}
+            if not sampled:
+                payload["approximate"] = False
+        elif "count_distinct" in aggregates:
+            sketch, source = await _column_sketch(pool, table_name, column)
+            estimate = sketch.estimate()
+            results["count_distinct"] = {
+                **interval(estimate, z * sketch.relative_error * estimate),
+                "relative_std_error": round_sig(sketch.relative_error, 2),
+                "sketch": source,
+            }
+            payload["approximate"] = True
+    except QueryTimeoutError as e:
+        return json.dumps(_timeout_error(e, 0), indent=2)
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+
+    payload["results"] = results
+    payload["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return json.dumps(payload, indent=2)
+
+
+async def _text_index_columns(db: aiosqlite.Connection, table_name: str) -> Optional[list[str]]:
+    """Columns covered by the table's full-text index, or None if it has none"""
+    cursor = await db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (text_search.index_name(table_name),)
+    )
+    if not await cursor.fetchone():
+        return None
+    cursor = await db.execute("SELECT name FROM pragma_table_info(?)", (text_search.index_name(table_name),))
+    return [row[0] for row in await cursor.fetchall()]
+
+
+async def _text_columns(db: aiosqlite.Connection, table_name: str, table: dict) -> tuple[list[str], list[str]]:
+    """
+    Text columns of a table and the subset holding long text
+
+    Average length is measured on the first 1000 rows, which is enough to
+    tell free text (descriptions, comments) from codes and names.
+
+    Returns:
+        (all text columns, columns averaging at least FTS_AUTO_MIN_CHARS)
+    """
+    text_columns, long_columns = [], []
+    for column in table["columns"]:
+        declared = column["type"].upper()
+        if declared and not any(t in declared for t in ("CHAR", "CLOB", "TEXT")):
+            continue
+        cursor = await db.execute(
+            f"SELECT SUM(typeof(c) = 'text'), AVG(CASE WHEN typeof(c) = 'text' THEN length(c) END) "
+            f"FROM (SELECT {_quote_ident(column['name'])} AS c FROM {_quote_ident(table_name)} LIMIT 1000)"
+        )
+        text_rows, avg_length = await cursor.fetchone()
+        if not text_rows:
+            continue
+        text_columns.append(column["name"])
+        if (avg_length or 0) >= FTS_AUTO_MIN_CHARS:
+            long_columns.append(column["name"])
+    return text_columns, long_columns
+
+
+async def _has_rowid(db: aiosqlite.Connection, table_name: str) -> bool:
+    """False for WITHOUT ROWID tables, which an external-content FTS5 index cannot point into"""
+    cursor = await db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    row = await cursor.fetchone()
+    return "WITHOUT ROWID" not in ((row[0] if row else None) or "").upper()
+
+
+async def _build_text_index(pool: SQLitePool, table_name: str, columns: list[str]) -> float:
+    """(Re)create the full-text index and its triggers; returns elapsed milliseconds"""
+    start = time.perf_counter()
+    async with pool.writer() as db:
+        async with pool.deadline(db, QUERY_TIMEOUT_MS):
+            for statement in text_search.drop_index_sql(table_name) + text_search.create_index_sql(table_name, columns):
+                await db.execute(statement)
+    return (time.perf_counter() - start) * 1000
+
+
+@mcp.tool()
+async def create_text_index(table_name: str, columns: Optional[list[str]] = None) -> str:
+    """
+    Build a full-text (FTS5) index on text columns of a table for search_text.
+    The index is kept up to date automatically when rows change.
+    
+    Args:
+        table_name: Table to index
+        columns: Text columns to index (default: every text column)
+    
+    Returns:
+        JSON string with the indexed columns and build time
+    """
+    if _db().read_only:
+        return json.dumps({
+            "status": "error",
+            "message": "Database is open in read-only mode; indexes cannot be created"
+        }, indent=2)
+    
+    pool = await get_pool()
+    async with pool.reader() as db:
+        _, catalog = await _get_schema_catalog(db)
+        if table_name not in catalog:
+            return json.dumps({
+                "status": "error",
+                "message": f"Unknown table '{table_name}'. Use list_tables to see the available tables."
+            }, indent=2)
+        if not await _has_rowid(db, table_name):
+            return json.dumps({
+                "status": "error",
+                "message": f"'{table_name}' is a WITHOUT ROWID table and cannot have a full-text index"
+            }, indent=2)
+        if columns:
+            known = {c["name"].lower(): c["name"] for c in catalog[table_name]["columns"]}
+            unknown = [c for c in columns if c.lower() not in known]
+            if unknown:
                 return json.dumps({
-                    "status": "success",
-                    "affected_rows": cursor.rowcount,
-                    "message": "Query executed successfully"
+                    "status": "error",
+                    "message": f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(known.values())}"
                 }, indent=2)
-                
-        except Exception as e:
+            columns = [known[c.lower()] for c in columns]
+        else:
+            columns, _ = await _text_columns(db, table_name, catalog[table_name])
+    if not columns:
+        return json.dumps({"status": "error", "message": f"'{table_name}' has no text columns to index"}, indent=2)
+    
+    try:
+        elapsed_ms = await _build_text_index(pool, table_name, columns)
+    except QueryTimeoutError as e:
+        return json.dumps(_timeout_error(e, 0), indent=2)
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    
+    return json.dumps({
+        "status": "success",
+        "table": table_name,
+        "columns": columns,
+        "elapsed_ms": round(elapsed_ms, 2),
+    }, indent=2)
+
+
+async def _search_text_like(
+    pool: SQLitePool,
+    table_name: str,
+    columns: list[str],
+    query: str,
+    mode: str,
+    limit: int,
+    result_format: str,
+    index_error: Optional[str] = None
+) -> str:
+    """
+    search_text for a table without a full-text index: a LIKE scan over its text columns
+
+    index_error is the reason an index could not be built, reported with the rows.
+    """
+    try:
+        condition, params = text_search.build_like_filter(columns, query, mode)
+    except ValueError as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    limit = max(1, min(int(limit), MAX_PAGE_ROWS))
+    
+    try:
+        async with pool.reader() as db:
+            async with pool.deadline(db, QUERY_TIMEOUT_MS):
+                cursor = await db.execute(
+                    f"SELECT * FROM {_quote_ident(table_name)} WHERE {condition} LIMIT ?", (*params, limit)
+                )
+                rows = await cursor.fetchall()
+                result_columns = [col[0] for col in cursor.description]
+    except QueryTimeoutError as e:
+        return json.dumps(_timeout_error(e, 0), indent=2)
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    
+    payload = {
+        **_rows_payload(result_columns, rows, result_format),
+        "row_count": len(rows),
+        "method": "like",
+        "searched_columns": columns,
+        "hint": "No full-text index: rows are unranked and words are not stemmed. "
+                "Call create_text_index for ranked search.",
+    }
+    if index_error is not None:
+        payload["index_error"] = index_error
+    return _dumps(payload, result_format)
+
+
+@mcp.tool()
+async def search_text(
+    table_name: str,
+    query: str,
+    mode: str = "all",
+    limit: int = 10,
+    result_format: str = "json",
+    build_index: bool = True
+) -> str:
+    """
+    Keyword search over the text columns of a table. With a full-text index
+    (see create_text_index) rows are ranked by relevance (BM25), come with
+    highlighted snippets, and words are matched by stem, so "refund" also
+    finds "refunds" and "refunded". A table without one gets one on its long
+    text columns (descriptions, comments) the first time it is searched;
+    tables with only short text, read-only databases and WITHOUT ROWID
+    tables are matched with LIKE over every text column, which reads the
+    whole table.
+    
+    Args:
+        table_name: Table to search
+        query: Keywords to search for
+        mode: "all" (rows containing every word, default), "any" (at least one
+            word), "phrase" (the words in this order) or "raw" (FTS5 query
+            syntax; needs an index)
+        limit: Maximum number of rows to return
+        result_format: "json", "compact" or "csv" (see execute_query)
+        build_index: Index the long text columns first if the table has no
+            full-text index (adds an FTS5 table and triggers to the
+            database); false searches such a table with LIKE instead
+    
+    Returns:
+        JSON string with matching rows; with an index, best first, each with a
+        score (lower is better) and a snippet with matches wrapped in **
+    """
+    if result_format not in RESULT_FORMATS:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown result_format '{result_format}'. Use one of: {', '.join(RESULT_FORMATS)}"
+        }, indent=2)
+    if mode not in text_search.MATCH_MODES:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown mode '{mode}'. Use one of: {', '.join(text_search.MATCH_MODES)}"
+        }, indent=2)
+    try:
+        match = text_search.build_match_query(query, mode)
+    except ValueError as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    
+    pool = await get_pool()
+    index_built_ms = None
+    async with pool.reader() as db:
+        _, catalog = await _get_schema_catalog(db)
+        if table_name not in catalog:
             return json.dumps({
                 "status": "error",
-                "message": str(e)
+                "message": f"Unknown table '{table_name}'. Use list_tables to see the available tables."
             }, indent=2)
+        indexed = await _text_index_columns(db, table_name)
+        if indexed is None:
+            text_columns, long_columns = await _text_columns(db, table_name, catalog[table_name])
+            can_index = not _db().read_only and await _has_rowid(db, table_name)
+    
+    if indexed is None:
+        if not text_columns:
+            return json.dumps({"status": "error", "message": f"'{table_name}' has no text columns to search"}, indent=2)
+        if not (build_index and can_index and long_columns):
+            return await _search_text_like(pool, table_name, text_columns, query, mode, limit, result_format)
+        indexed = long_columns
+        try:
+            index_built_ms = await _build_text_index(pool, table_name, indexed)
+        except QueryTimeoutError as e:
+            return json.dumps(_timeout_error(e, 0), indent=2)
+        except Exception as e:
+            # e.g. SQLite built without FTS5, or the table changed meanwhile
+            print(f"Could not build the full-text index of {table_name}: {e}", file=sys.stderr)
+            return await _search_text_like(
+                pool, table_name, text_columns, query, mode, limit, result_format, index_error=str(e)
+            )
+    
+    fts = _quote_ident(text_search.index_name(table_name))
+    other_columns = [c["name"] for c in catalog[table_name]["columns"] if c["name"] not in indexed]
+    select_others = "".join(f", t.{_quote_ident(c)}" for c in other_columns)
+    limit = max(1, min(int(limit), MAX_PAGE_ROWS))
+    
+    try:
+        async with pool.reader() as db:
+            async with pool.deadline(db, QUERY_TIMEOUT_MS):
+                cursor = await db.execute(
+                    f"SELECT f.rowid, round(f.rank, 4), snippet({fts}, -1, '**', '**', '…', 16){select_others} "
+                    f"FROM {fts} AS f JOIN {_quote_ident(table_name)} AS t ON t.rowid = f.rowid "
+                    f"WHERE {fts} MATCH ? ORDER BY f.rank LIMIT ?",
+                    (match, limit)
+                )
+                rows = await cursor.fetchall()
+    except QueryTimeoutError as e:
+        return json.dumps(_timeout_error(e, 0), indent=2)
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    
+    payload = {
+        **_rows_payload(["rowid", "score", "snippet", *other_columns], rows, result_format),
+        "row_count": len(rows),
+        "method": "fts",
+        "match": match,
+        "indexed_columns": indexed,
+    }
+    if index_built_ms is not None:
+        payload["index_built_ms"] = round(index_built_ms, 2)
+    return _dumps(payload, result_format)
+
+
+@mcp.tool()
+async def query_stats(top_n: int = 10, order_by: str = "total_ms", reset: bool = False) -> str:
+    """
+    Report which execute_query statements are expensive. Calls are grouped by
+    fingerprint (the SQL with literal values replaced by ?) with call counts,
+    total/mean/p50/p95/max duration, rows, response bytes and cache hit rate.
+
+    Args:
+        top_n: Number of fingerprints to return
+        order_by: "total_ms" (default), "calls", "mean_ms", "p95_ms", "max_ms" or "bytes"
+        reset: Clear the in-memory statistics after reporting them
+
+    Returns:
+        JSON string with the most expensive fingerprints first
+    """
+    if order_by not in SUMMARY_ORDERS:
+        return json.dumps({
+            "status": "error",
+            "message": f"Unknown order_by '{order_by}'. Use one of: {', '.join(SUMMARY_ORDERS)}"
+        }, indent=2)
+    log = _db().query_log
+    summary = log.summary(top_n=max(1, top_n), order_by=order_by)
+    summary["persisted_to"] = str(log.path) if log.path else None
+    if reset:
+        log.clear()
+    return json.dumps(summary, indent=2)
+
+
+@mcp.tool()
+async def cache_stats() -> str:
+    """Get hit/miss counters and memory usage of the execute_query result cache"""
+    return json.dumps(result_cache.stats(), indent=2)
+
+
+def _process_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, where the platform exposes it"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current RSS; KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@mcp.tool()
+async def memory_usage() -> str:
+    """
+    Report the server's memory use: the in-memory database mirror (if enabled),
+    the SQLite page cache budget, the result and column caches, and the
+    process resident set size
+    """
+    db = _db()
+    pool = await db.get_pool()
+    usage = {
+        "pool": await pool.memory_stats(),
+        "result_cache_bytes": result_cache.current_bytes,
+        "column_arrays_bytes": column_arrays.current_bytes,
+        "distinct_sketch_bytes": sum(sketch.m for _, sketch in db.sketches.values()),
+        "cached_profiles": len(db.profiles),
+        "open_cursors": len(db.cursors),
+        "process_rss_bytes": _process_rss_bytes(),
+    }
+    if SHARED:
+        usage["open_databases"] = len(_shared_databases)
+    return json.dumps(usage, indent=2)
 
 
 # render_chart tool REMOVED - inline charts work better
@@ -127,12 +2134,10 @@ async def execute_query(query: str) -> str:
 @mcp.tool()
 async def get_database_info() -> str:
     """Get information about the database (file size, tables, SQLite version)"""
-    import json
-    
     info = {}
     
     # File information
-    db_path = Path(DB_FILE)
+    db_path = Path(_db().path)
     if db_path.exists():
         stat = db_path.stat()
         info["database_file"] = str(db_path.resolve())
@@ -141,29 +2146,111 @@ async def get_database_info() -> str:
     else:
         info["database_file"] = "Not found"
     
-    async with aiosqlite.connect(DB_FILE) as db:
+    pool = await get_pool()
+    async with pool.reader() as db:
         # Get SQLite version
         cursor = await db.execute("SELECT sqlite_version()")
         version = await cursor.fetchone()
         info["sqlite_version"] = version[0]
+        info["read_only"] = _db().read_only
+        info["journal_mode"] = pool.journal_mode
+        info["memory_mirror"] = pool.mirrored
         
-        # Get table count
-        cursor = await db.execute(
-            "SELECT COUNT(*) FROM sqlite_master WHERE type='table'"
-        )
-        count = await cursor.fetchone()
-        info["table_count"] = count[0]
+        # Get table names and count
+        tables = await _table_names(db)
+        info["table_count"] = len(tables)
+        info["tables"] = tables
         
-        # Get table names
-        cursor = await db.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
-        )
-        tables = await cursor.fetchall()
-        info["tables"] = [table[0] for table in tables]
+        # Attached databases, queried as alias.table
+        info["attached_databases"] = []
+        for alias, path in pool.attachments.items():
+            attached_tables = await _table_names(db, alias)
+            info["attached_databases"].append({
+                "alias": alias,
+                "database_file": path,
+                "file_size_bytes": Path(path).stat().st_size if Path(path).exists() else None,
+                "table_count": len(attached_tables),
+                "tables": [f"{alias}.{name}" for name in attached_tables],
+            })
     
     return json.dumps(info, indent=2)
 
 
+def _attach_root() -> Path:
+    db = _db()
+    return Path(db.attach_dir or Path(db.path).resolve().parent).resolve()
+
+
+@mcp.tool()
+async def attach_database(database: str, alias: Optional[str] = None) -> str:
+    """
+    Attach another database file so its tables can be queried (and joined
+    with this database's tables) as alias.table, without switching databases.
+    Attached databases are read-only.
+
+    Args:
+        database: Database file name (or path) inside the server's database directory
+        alias: Name to query it by; defaults to the file name without extension
+
+    Returns:
+        JSON string with the alias and the attached tables
+    """
+    root = _attach_root()
+    path = (root / database).resolve()
+    current = _db()
+    if root not in path.parents or not path.is_file() or (SHARED and not _in_shared_roots(path)):
+        # The pool's attachments include those made at runtime
+        attached = (current.pool.attachments if current.pool else current.attachments).values()
+        available = sorted(
+            p.name for p in root.glob("*.db")
+            if p.resolve() != Path(current.path).resolve()
+            and str(p.resolve()) not in attached
+            and (not SHARED or _in_shared_roots(p.resolve()))
+        )
+        return json.dumps({
+            "status": "error",
+            "message": f"Database '{database}' not found in {root}. Available: {', '.join(available) or 'none'}"
+        }, indent=2)
+
+    alias = alias or "".join(c if c.isalnum() else "_" for c in path.stem).strip("_")
+    if alias and alias[0].isdigit():
+        alias = f"db_{alias}"
+
+    pool = await get_pool()
+    try:
+        await pool.attach(alias, str(path))
+    except Exception as e:
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+    # Cached results may have been computed with a different file under this alias
+    result_cache.clear(prefix=f"{current.cache_prefix}:")
+
+    async with pool.reader() as db:
+        tables = await _table_names(db, alias)
+    return json.dumps({
+        "status": "success",
+        "alias": alias,
+        "database_file": str(path),
+        "tables": [f"{alias}.{name}" for name in tables],
+    }, indent=2)
+
+
+@mcp.tool()
+async def detach_database(alias: str) -> str:
+    """
+    Detach a database attached with attach_database
+
+    Args:
+        alias: Alias the database was attached under
+    """
+    pool = await get_pool()
+    if alias not in pool.attachments:
+        attached = ", ".join(pool.attachments) or "none"
+        return json.dumps({"status": "error", "message": f"'{alias}' is not attached. Attached: {attached}"}, indent=2)
+    await pool.detach(alias)
+    result_cache.clear(prefix=f"{_db().cache_prefix}:")
+    return json.dumps({"status": "success", "detached": alias}, indent=2)
+
+
 @mcp.tool()
 async def create_user(name: str, email: str = None) -> str:
     """
@@ -173,27 +2260,33 @@ async def create_user(name: str, email: str = None) -> str:
         name: User's name (required)
         email: User's email address (optional)
     """
-    async with aiosqlite.connect(DB_FILE) as db:
+    pool = await get_pool()
+    async with pool.writer() as db:
         cursor = await db.execute(
             "INSERT INTO users (name, email) VALUES (?, ?)",
             (name, email)
         )
-        await db.commit()
-        return f"User created with ID: {cursor.lastrowid}"
+    return f"User created with ID: {cursor.lastrowid}"
 
 
 @mcp.tool()
-async def list_users() -> str:
-    """List all users from the database"""
-    import json
+async def list_users(result_format: str = "json") -> str:
+    """
+    List all users from the database
+    
+    Args:
+        result_format: "json" (default), "compact" or "csv"; see execute_query
+    """
+    if result_format not in RESULT_FORMATS:
+        return f"Error: result_format must be one of: {', '.join(RESULT_FORMATS)}"
     
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
+    pool = await get_pool()
+    async with pool.reader() as db:
         cursor = await db.execute("SELECT * FROM users ORDER BY id")
         rows = await cursor.fetchall()
+        columns = [col[0] for col in cursor.description]
     
-    users = [dict(row) for row in rows]
-    return json.dumps(users, indent=2, default=str)
+    return _encode_rows(columns, rows, result_format)
 
 
 @mcp.tool()
@@ -221,15 +2314,15 @@ async def update_user(user_id: int, name: str = None, email: str = None) -> str:
     
     params.append(user_id)
     
-    async with aiosqlite.connect(DB_FILE) as db:
+    pool = await get_pool()
+    async with pool.writer() as db:
         query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
         cursor = await db.execute(query, params)
-        await db.commit()
         
-        if cursor.rowcount > 0:
-            return f"User {user_id} updated successfully"
-        else:
-            return f"No user found with ID {user_id}"
+    if cursor.rowcount > 0:
+        return f"User {user_id} updated successfully"
+    else:
+        return f"No user found with ID {user_id}"
 
 
 @mcp.tool()
@@ -240,28 +2333,313 @@ async def delete_user(user_id: int) -> str:
     Args:
         user_id: ID of the user to delete
     """
-    async with aiosqlite.connect(DB_FILE) as db:
+    pool = await get_pool()
+    async with pool.writer() as db:
         cursor = await db.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        await db.commit()
         
-        if cursor.rowcount > 0:
-            return f"User {user_id} deleted successfully"
-        else:
-            return f"No user found with ID {user_id}"
+    if cursor.rowcount > 0:
+        return f"User {user_id} deleted successfully"
+    else:
+        return f"No user found with ID {user_id}"
+
+
+async def _open_database():
+    """Initialize the current database's tables (read-only databases are served as they are)"""
+    if _db().read_only:
+        print("Read-only mode: immutable open, writes disabled", file=sys.stderr)
+        await get_pool()
+    else:
+        await init_db()
+
+
+def _in_shared_roots(path: Path) -> bool:
+    """True if a resolved path is one of SHARED_ROOTS or inside one of them"""
+    return any(path == root or root in path.parents for root in SHARED_ROOTS)
+
+
+async def _bind_session(
+    db_path: str,
+    read_only: bool,
+    attachments: dict[str, str],
+    attach_dir: Optional[str],
+    export_dir: Optional[str],
+    export_url: Optional[str]
+) -> str:
+    """Bind the calling session of a shared server to a database, opening it if needed"""
+    binding: _SessionBinding = mcp.get_context().request_context.lifespan_context
+    if binding.database is not None:
+        return json.dumps({"status": "error", "message": "This session already has a database open"}, indent=2)
+
+    path = Path(db_path).resolve()
+    attachments = {alias: str(Path(p).resolve()) for alias, p in attachments.items()}
+    outside = [
+        str(p) for p in [path, *map(Path, attachments.values()), *(Path(d).resolve() for d in (attach_dir, export_dir) if d)]
+        if not _in_shared_roots(p)
+    ]
+    if outside:
+        return json.dumps({
+            "status": "error",
+            "message": f"Outside the server's allowed directories: {', '.join(outside)}"
+        }, indent=2)
+
+    # Sessions asking for the same database with the same options share its pool and caches
+    key = (str(path), read_only, tuple(sorted(attachments.items())), attach_dir, export_dir, export_url)
+    async with _shared_lock:
+        db = _shared_databases.get(key)
+        if db is None:
+            db = Database(
+                str(path),
+                read_only=read_only,
+                attachments=attachments,
+                attach_dir=attach_dir,
+                export_dir=export_dir,
+                export_url=export_url,
+            )
+            binding.database = db
+            try:
+                await _open_database()
+            except Exception as e:
+                binding.database = None
+                await db.close()
+                return json.dumps({"status": "error", "message": str(e)}, indent=2)
+            _shared_databases[key] = db
+        db.sessions += 1
+        binding.database = db
+
+    pool = await db.get_pool()
+    return json.dumps({
+        "status": "success",
+        "database": db.path,
+        "read_only": db.read_only,
+        "attached_databases": sorted(pool.attachments),
+    }, indent=2)
+
+
+async def _release_database(db: Database) -> None:
+    """A session bound to db ended: close it when no other session uses it"""
+    async with _shared_lock:
+        db.sessions -= 1
+        if db.sessions > 0:
+            return
+        for key, open_db in list(_shared_databases.items()):
+            if open_db is db:
+                del _shared_databases[key]
+    await db.close()
+
+
+async def open_database(
+    db_path: str,
+    read_only: bool = False,
+    attachments: Optional[dict[str, str]] = None,
+    attach_dir: Optional[str] = None,
+    export_dir: Optional[str] = None,
+    export_url: Optional[str] = None
+) -> str:
+    """
+    Open the database of a server started with --standby or --shared
+
+    A standby server offers this only until it succeeds. A shared server
+    binds the calling session to the database, once; the session's other
+    tool calls then work on it. The arguments match the command line.
+
+    Args:
+        db_path: SQLite database file
+        read_only: Open the database immutable and read-only
+        attachments: Other database files to attach read-only, alias -> path
+        attach_dir: Directory attach_database may open files from
+        export_dir: Directory export_query writes files to
+        export_url: URL prefix the export directory is served from
+    """
+    global STANDBY, DB_FILE, READ_ONLY, ATTACHMENTS, ATTACH_DIR, EXPORT_DIR, EXPORT_URL
+    if SHARED:
+        return await _bind_session(db_path, read_only, attachments or {}, attach_dir, export_dir, export_url)
+    if not STANDBY:
+        return json.dumps({"status": "error", "message": "A database is already open"}, indent=2)
+
+    await close_pool()
+    DB_FILE, READ_ONLY = db_path, read_only
+    ATTACHMENTS = dict(attachments or {})
+    ATTACH_DIR, EXPORT_DIR, EXPORT_URL = attach_dir, export_dir, export_url
+    print(f"Database: {Path(DB_FILE).resolve()}", file=sys.stderr)
+    try:
+        await _open_database()
+    except Exception as e:
+        await close_pool()
+        return json.dumps({"status": "error", "message": str(e)}, indent=2)
+
+    STANDBY = False
+    mcp.remove_tool("open_database")
+    # Clients cache the tool list; tell them it changed. The database is open
+    # either way, so a client that cannot be notified only keeps a stale list
+    try:
+        await mcp.get_context().session.send_tool_list_changed()
+    except Exception as e:
+        print(f"Could not send tools/list_changed: {e}", file=sys.stderr)
+    pool = await get_pool()
+    return json.dumps({
+        "status": "success",
+        "database": str(Path(DB_FILE).resolve()),
+        "read_only": READ_ONLY,
+        "attached_databases": sorted(pool.attachments),
+    }, indent=2)
+
+
+class _BearerTokenMiddleware:
+    """ASGI middleware rejecting HTTP requests without the shared server's token"""
+
+    def __init__(self, app, token: str):
+        self.app = app
+        self.expected = f"Bearer {token}".encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            supplied = dict(scope["headers"]).get(b"authorization", b"")
+            if not hmac.compare_digest(supplied, self.expected):
+                from starlette.responses import PlainTextResponse
+                await PlainTextResponse("Unauthorized", status_code=401)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def enable_shared_mode(roots: list[str]) -> None:
+    """
+    Serve many databases, one per MCP session, from files under roots
+
+    Used by --shared and by hosts running this server in their own process
+    (mcp_inprocess.py); sessions then start with open_database.
+    """
+    global SHARED, SHARED_ROOTS
+    SHARED_ROOTS = [Path(root).resolve() for root in roots]
+    if not SHARED:
+        SHARED = True
+        mcp.add_tool(open_database)
+
+
+async def serve_session(read_stream, write_stream) -> None:
+    """Serve one MCP session over an already connected stream pair until it closes"""
+    server = mcp._mcp_server
+    await server.run(read_stream, write_stream, server.create_initialization_options())
+
+
+async def close_shared_databases() -> None:
+    """Close every database a shared server has open"""
+    async with _shared_lock:
+        databases = list(_shared_databases.values())
+        _shared_databases.clear()
+    for db in databases:
+        await db.close()
+
+
+async def _serve_shared():
+    """Serve streamable HTTP on mcp.settings.host/port until shut down"""
+    import uvicorn
+
+    app = _BearerTokenMiddleware(mcp.streamable_http_app(), SHARED_TOKEN)
+    config = uvicorn.Config(app, host=mcp.settings.host, port=mcp.settings.port, log_level="warning")
+    try:
+        await uvicorn.Server(config).serve()
+    finally:
+        await close_shared_databases()
 
 
 async def run():
     """Main entry point - initialize database and start MCP server"""
-    print(f"Starting SQLite MCP Server...", file=sys.stderr)
-    print(f"Database: {Path(DB_FILE).resolve()}", file=sys.stderr)
-    
-    # Initialize database tables
-    await init_db()
+    print("Starting SQLite MCP Server...", file=sys.stderr)
+    if SHARED:
+        roots = ", ".join(str(root) for root in SHARED_ROOTS)
+        print(f"Shared mode: databases under {roots}", file=sys.stderr)
+        print(f"Server ready on http://{mcp.settings.host}:{mcp.settings.port}{mcp.settings.streamable_http_path}", file=sys.stderr)
+        try:
+            await _serve_shared()
+        finally:
+            query_log.close()
+        return
+    if STANDBY:
+        # Pre-started by a server pool: imports and MCP setup are done now,
+        # the database is chosen later through open_database
+        print("Standby: waiting for open_database", file=sys.stderr)
+        mcp.add_tool(open_database)
+    else:
+        print(f"Database: {Path(DB_FILE).resolve()}", file=sys.stderr)
+        await _open_database()
     
     # Start MCP server using stdio transport
     print("Server ready and listening on stdio", file=sys.stderr)
-    await mcp.run_stdio_async()
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        await close_pool()
+        query_log.close()
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    """Parse the server's command line"""
+    parser = argparse.ArgumentParser(description="SQLite MCP server (stdio, or streamable HTTP with --shared)")
+    parser.add_argument("db_path", nargs="?", default="example.db", help="SQLite database file")
+    parser.add_argument(
+        "--read-only",
+        action="store_true",
+        help="Open the database immutable and read-only (for files nothing else writes to)",
+    )
+    parser.add_argument(
+        "--attach",
+        action="append",
+        default=[],
+        metavar="ALIAS=PATH",
+        help="Attach another database file read-only as ALIAS (repeatable)",
+    )
+    parser.add_argument(
+        "--attach-dir",
+        help="Directory attach_database may open files from (default: the database's directory)",
+    )
+    parser.add_argument(
+        "--export-dir",
+        help="Directory export_query writes files to (default: exports/ next to the database)",
+    )
+    parser.add_argument(
+        "--export-url",
+        help="URL prefix the export directory is served from, returned as download_url",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--standby",
+        action="store_true",
+        help="Start without opening a database and wait for the open_database tool",
+    )
+    mode.add_argument(
+        "--shared",
+        action="store_true",
+        help="Serve many databases over streamable HTTP, one per MCP session (needs SQLITE_MCP_SHARED_TOKEN)",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Shared mode: address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Shared mode: port to listen on")
+    parser.add_argument(
+        "--shared-root",
+        action="append",
+        default=[],
+        metavar="PATH",
+        help="Shared mode: directory (or file) sessions may open databases from (repeatable; default: current directory)",
+    )
+    args = parser.parse_args(argv)
+    for spec in args.attach:
+        alias, sep, path = spec.partition("=")
+        if not sep or not alias or not path:
+            parser.error(f"--attach expects ALIAS=PATH, got '{spec}'")
+    if args.shared and not SHARED_TOKEN:
+        parser.error("--shared needs the SQLITE_MCP_SHARED_TOKEN environment variable")
+    return args
 
 
 if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    DB_FILE = args.db_path
+    READ_ONLY = args.read_only
+    ATTACHMENTS = dict(spec.split("=", 1) for spec in args.attach)
+    ATTACH_DIR = args.attach_dir
+    EXPORT_DIR = args.export_dir
+    EXPORT_URL = args.export_url
+    STANDBY = args.standby
+    if args.shared:
+        enable_shared_mode(args.shared_root or ["."])
+    mcp.settings.host, mcp.settings.port = args.host, args.port
     anyio.run(run)
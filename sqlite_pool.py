@@ -0,0 +1,682 @@
+"""
+SQLite Connection Pool
+Long-lived reader/writer connections shared by the SQLite MCP server tools
+"""
+import asyncio
+import functools
+import logging
+import sqlite3
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+import aiosqlite
+import anyio
+
+import sql_functions
+
+logger = logging.getLogger(__name__)
+
+# SQLite VM instructions between two deadline checks
+PROGRESS_INTERVAL = 1000
+
+# SQLite's default SQLITE_MAX_ATTACHED
+MAX_ATTACHED = 10
+
+# data_version() result: a plain int, or one int per schema once databases are attached
+DataVersion = Union[int, Tuple[int, ...]]
+
+
+class QueryTimeoutError(Exception):
+    """Raised when a statement is interrupted because its deadline passed"""
+
+    def __init__(self, timeout_ms: int, elapsed_ms: float, vm_steps: int):
+        self.timeout_ms = timeout_ms
+        self.elapsed_ms = elapsed_ms
+        self.vm_steps = vm_steps
+        super().__init__(f"Query timed out after {timeout_ms} ms")
+
+
+class _QueryGuard:
+    """
+    Progress handler installed on every pooled connection
+
+    SQLite calls it every PROGRESS_INTERVAL VM instructions from the
+    connection's worker thread; returning non-zero aborts the statement.
+    """
+
+    def __init__(self):
+        self.deadline: Optional[float] = None
+        self.cancelled = False
+        self.expired = False
+        self.ticks = 0
+
+    def arm(self, timeout_ms: Optional[int]) -> None:
+        self.deadline = time.monotonic() + timeout_ms / 1000 if timeout_ms else None
+        self.cancelled = False
+        self.expired = False
+        self.ticks = 0
+
+    def disarm(self) -> None:
+        self.deadline = None
+
+    def __call__(self) -> int:
+        self.ticks += 1
+        if self.cancelled:
+            return 1
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.expired = True
+            return 1
+        return 0
+
+
+# Authorizer actions that change a table's rows or definition: (action, argument holding the table)
+_TABLE_WRITE_ACTIONS = {
+    sqlite3.SQLITE_INSERT: 0,
+    sqlite3.SQLITE_UPDATE: 0,
+    sqlite3.SQLITE_DELETE: 0,
+    sqlite3.SQLITE_CREATE_TABLE: 0,
+    sqlite3.SQLITE_DROP_TABLE: 0,
+    sqlite3.SQLITE_ALTER_TABLE: 1,
+}
+
+
+class _WriterConnection(sql_functions.FunctionsConnection):
+    """
+    sqlite3 connection for the pool's writer that records the main-schema
+    tables its statements write to, including writes made by triggers
+
+    The authorizer runs when a statement is prepared, so the writer is
+    opened without a statement cache (cached_statements=0).
+    """
+
+    def __init__(self, *args, written: Set[str], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.written = written
+        self.set_authorizer(self._authorize)
+
+    def _authorize(self, action: int, arg1: Optional[str], arg2: Optional[str], schema: Optional[str], source: Optional[str]) -> int:
+        position = _TABLE_WRITE_ACTIONS.get(action)
+        if position is not None:
+            table = (arg1, arg2)[position]
+            # ALTER TABLE passes the schema as its first argument
+            if action == sqlite3.SQLITE_ALTER_TABLE:
+                schema = arg1
+            if schema == "main" and table and not table.startswith("sqlite_"):
+                self.written.add(table)
+        return sqlite3.SQLITE_OK
+
+
+# Called after every writer() block with the tables it wrote to
+WriteListener = Callable[[Set[str]], Awaitable[None]]
+
+
+class SQLitePool:
+    """
+    Pool of persistent aiosqlite connections for one database file
+
+    Several read connections are handed out concurrently while all writes go
+    through a single serialized writer connection. Pragmas are applied once
+    per connection when the pool is opened, so every tool call starts with a
+    warm page cache and an already-parsed schema.
+
+    In read-only mode the file is opened as an immutable URI: SQLite skips
+    locking and journal checks entirely and no writer connection exists.
+    Only use it for files that nothing writes to while the pool is open.
+
+    Other database files can be attached under an alias; every connection
+    (including ones opened later) sees them, so queries can join across
+    files. Attached files are always opened read-only.
+
+    With a memory mirror, a database no larger than mirror_max_bytes is
+    copied into an in-memory database (memdb VFS, shared by all of the pool's
+    connections) when the pool opens, and every query runs against that copy.
+    Each committed write is copied back to the file with the backup API, so
+    the file stays current but writes cost a full copy. Changes made to the
+    file by other processes are not seen while the pool is open.
+
+    data_version() probes the database at most once per
+    version_check_interval_ms and again after every write through this
+    pool, so cached results see the pool's own writes at once and other
+    processes' commits within the interval.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        readers: int = 4,
+        cache_size_kb: int = 65536,
+        mmap_size: int = 268435456,
+        temp_store: str = "MEMORY",
+        busy_timeout_ms: int = 5000,
+        read_only: bool = False,
+        attachments: Optional[Dict[str, str]] = None,
+        mirror_max_bytes: int = 0,
+        version_check_interval_ms: int = 50,
+    ):
+        """
+        Initialize pool settings (connections are opened by open())
+
+        Args:
+            db_path: Path to the SQLite database file
+            readers: Number of read-only connections to keep open
+            cache_size_kb: Page cache size per connection in KiB
+            mmap_size: Bytes of the database file to memory-map (0 disables)
+            temp_store: Where temp tables and indices live (DEFAULT, FILE, MEMORY)
+            busy_timeout_ms: How long a connection waits on a locked database
+            read_only: Open the file with mode=ro&immutable=1 and refuse writes
+            attachments: Databases to attach when the pool opens, alias -> path
+                (see attach(); ones that fail are logged and skipped)
+            mirror_max_bytes: Serve databases up to this size from an in-memory
+                mirror (0 disables the mirror)
+            version_check_interval_ms: How long data_version() may reuse its
+                last probe when this pool has not written since (0 probes every call)
+        """
+        self.db_path = db_path
+        self.reader_count = max(1, readers)
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.temp_store = temp_store
+        self.busy_timeout_ms = busy_timeout_ms
+        self.read_only = read_only
+        self.attachments: Dict[str, str] = {}
+        self._initial_attachments = dict(attachments or {})
+        self.mirror_max_bytes = mirror_max_bytes
+        self.version_check_interval_ms = version_check_interval_ms
+
+        self._readers: List[aiosqlite.Connection] = []
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._probe: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._snapshot_lock = asyncio.Lock()
+        self._guards: "weakref.WeakKeyDictionary[aiosqlite.Connection, _QueryGuard]" = weakref.WeakKeyDictionary()
+        # Tables written by the current writer() block, filled by the writer's authorizer
+        self._written_tables: Set[str] = set()
+        self._write_listeners: List[WriteListener] = []
+        # What each connection currently has attached; synced lazily when it is handed out
+        self._attached: "weakref.WeakKeyDictionary[aiosqlite.Connection, Dict[str, str]]" = weakref.WeakKeyDictionary()
+        self.journal_mode: Optional[str] = None
+
+        # Last data_version() probe and when it was taken; every write or
+        # attachment change bumps _version_generation and drops it
+        self._version: Optional[DataVersion] = None
+        self._version_checked_at = 0.0
+        self._version_generation = 0
+        self._version_lock = asyncio.Lock()
+
+        # Memory mirror state: the URI every connection opens instead of the
+        # file, a plain sqlite3 connection that keeps the memdb alive (and is
+        # the backup source), and the file connection writes are copied to
+        self._mirror_uri: Optional[str] = None
+        self._mirror_keeper: Optional[sqlite3.Connection] = None
+        self._mirror_target: Optional[sqlite3.Connection] = None
+        self._mirror_version: Optional[int] = None
+        self.mirror_load_ms: Optional[float] = None
+        self.mirror_writebacks = 0
+        self.mirror_writeback_ms = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self._probe is not None
+
+    @property
+    def mirrored(self) -> bool:
+        return self._mirror_uri is not None
+
+    def _file_uri(self) -> str:
+        uri = Path(self.db_path).resolve().as_uri()
+        return uri + "?mode=ro&immutable=1" if self.read_only else uri
+
+    async def _connect(self, query_only: bool) -> aiosqlite.Connection:
+        """Open one connection, apply the pool pragmas and register the SQL functions"""
+        if query_only:
+            options = {"factory": sql_functions.FunctionsConnection}
+        else:
+            options = {"factory": functools.partial(_WriterConnection, written=self._written_tables), "cached_statements": 0}
+        # Always a URI connection so ATTACH accepts mode=ro URIs as well
+        conn = await aiosqlite.connect(self._mirror_uri or self._file_uri(), uri=True, **options)
+        await conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        await conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        await conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        await conn.execute(f"PRAGMA temp_store = {self.temp_store}")
+        if query_only:
+            await conn.execute("PRAGMA query_only = ON")
+
+        guard = _QueryGuard()
+        await conn.set_progress_handler(guard, PROGRESS_INTERVAL)
+        self._guards[conn] = guard
+        self._attached[conn] = {}
+        await self._sync_attachments(conn)
+        return conn
+
+    def _attach_uri(self, path: str) -> str:
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        # Attachments of an immutable pool are assumed to be just as static
+        return uri + "&immutable=1" if self.read_only else uri
+
+    async def _sync_attachments(self, conn: aiosqlite.Connection) -> None:
+        """Bring a connection's attached databases in line with self.attachments"""
+        current = self._attached[conn]
+        if current == self.attachments:
+            return
+        for alias, path in list(current.items()):
+            if self.attachments.get(alias) != path:
+                await conn.execute(f'DETACH DATABASE "{alias}"')
+                del current[alias]
+        for alias, path in self.attachments.items():
+            if alias not in current:
+                await conn.execute(f'ATTACH DATABASE ? AS "{alias}"', (self._attach_uri(path),))
+                current[alias] = path
+
+    async def attach(self, alias: str, path: str) -> None:
+        """
+        Attach a database file under alias on every pooled connection
+
+        The probe connection attaches it right away, so a missing or corrupt
+        file is reported here; other connections pick it up the next time
+        they are handed out.
+
+        Args:
+            alias: Schema name to query it by (alias.table); a plain identifier
+            path: Database file to attach (opened read-only)
+        """
+        if not self.is_open:
+            raise RuntimeError("Pool is not open. Call open() first.")
+        if not alias.isidentifier() or alias.lower() in ("main", "temp"):
+            raise ValueError(f"Invalid alias '{alias}': use a plain identifier other than main/temp")
+        if alias in self.attachments:
+            raise ValueError(f"Alias '{alias}' is already attached")
+        if len(self.attachments) >= MAX_ATTACHED:
+            raise ValueError(f"At most {MAX_ATTACHED} databases can be attached")
+        if not Path(path).is_file():
+            raise FileNotFoundError(f"Database file not found: {path}")
+
+        self.attachments[alias] = str(Path(path).resolve())
+        self._invalidate_version()
+        try:
+            await self._sync_attachments(self._probe)
+            # ATTACH is lazy: read the schema now so a non-database file fails here
+            await self._probe.execute(f'SELECT COUNT(*) FROM "{alias}".sqlite_master')
+        except Exception:
+            del self.attachments[alias]
+            await self._sync_attachments(self._probe)
+            raise
+        logger.info(f"Attached {path} as {alias}")
+
+    async def detach(self, alias: str) -> None:
+        """Detach a database attached with attach() (or at construction)"""
+        if alias not in self.attachments:
+            raise KeyError(alias)
+        del self.attachments[alias]
+        self._invalidate_version()
+        await self._sync_attachments(self._probe)
+        logger.info(f"Detached {alias}")
+
+    def _load_mirror(self, uri: str) -> None:
+        """Copy the database file into the memdb at uri (runs in a worker thread)"""
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        source = sqlite3.connect(self._file_uri(), uri=True)
+        try:
+            with open(self.db_path, "rb") as f:
+                header = f.read(20)
+            if header[18:19] == b"\x02":
+                # WAL database: a page copy keeps the WAL flag in the header,
+                # which memdb cannot open, so rebuild it instead
+                source.execute("VACUUM INTO ?", (uri,))
+            else:
+                source.backup(keeper)
+        finally:
+            source.close()
+        self._mirror_keeper = keeper
+        self._mirror_version = keeper.execute("PRAGMA data_version").fetchone()[0]
+        if not self.read_only:
+            self._mirror_target = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._mirror_target.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+
+    def _write_back(self) -> bool:
+        """Copy the mirror to the file if it changed since the last copy (worker thread)"""
+        version = self._mirror_keeper.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._mirror_version:
+            return False
+        self._mirror_keeper.backup(self._mirror_target)
+        self._mirror_version = version
+        return True
+
+    async def _open_mirror(self) -> None:
+        """Load the memory mirror if the database is small enough"""
+        path = Path(self.db_path)
+        if not path.is_file():
+            return
+        wal = path.with_name(path.name + "-wal")
+        size = path.stat().st_size + (wal.stat().st_size if wal.exists() else 0)
+        if size > self.mirror_max_bytes:
+            logger.info(
+                f"{self.db_path} is {size:,} bytes, above the memory mirror limit "
+                f"of {self.mirror_max_bytes:,}; serving it from the file"
+            )
+            return
+
+        uri = f"file:/sqlite-mcp-mirror-{uuid.uuid4().hex}?vfs=memdb"
+        start = time.perf_counter()
+        await asyncio.to_thread(self._load_mirror, uri)
+        self.mirror_load_ms = (time.perf_counter() - start) * 1000
+        self._mirror_uri = uri
+        logger.info(f"Loaded {size:,} bytes of {self.db_path} into memory in {self.mirror_load_ms:.1f} ms")
+
+    async def open(self) -> None:
+        """Open the writer and reader connections"""
+        if self.is_open:
+            return
+
+        if self.mirror_max_bytes > 0:
+            await self._open_mirror()
+
+        if self.read_only:
+            self.journal_mode = "immutable"
+        else:
+            self._writer = await self._connect(query_only=False)
+            if self.mirrored:
+                # memdb has no WAL; its rollback journal lives in memory
+                self.journal_mode = "memory"
+            else:
+                try:
+                    # WAL lets readers proceed while the writer commits; the mode is
+                    # persistent in the file so it only has to be set once.
+                    cursor = await self._writer.execute("PRAGMA journal_mode = WAL")
+                    row = await cursor.fetchone()
+                    self.journal_mode = row[0] if row else None
+                    await self._writer.execute("PRAGMA synchronous = NORMAL")
+                except Exception as e:
+                    logger.warning(f"Could not enable WAL for {self.db_path}: {e}")
+
+        # Never used for queries, so its data_version moves on every commit
+        # made by any connection (the pool's writer or another process)
+        self._probe = await self._connect(query_only=True)
+        for alias, path in self._initial_attachments.items():
+            try:
+                await self.attach(alias, path)
+            except Exception as e:
+                logger.warning(f"Could not attach {path} as {alias}: {e}")
+
+        self._idle_readers = asyncio.Queue()
+        for _ in range(self.reader_count):
+            conn = await self._connect(query_only=True)
+            self._readers.append(conn)
+            self._idle_readers.put_nowait(conn)
+
+        logger.info(
+            f"SQLite pool opened: {self.db_path} "
+            f"({self.reader_count} readers, journal_mode={self.journal_mode}, "
+            f"{'memory mirror' if self.mirrored else 'file'})"
+        )
+
+    async def open_reader(self) -> aiosqlite.Connection:
+        """
+        Open an extra read-only connection outside the pool
+
+        Used for long-lived cursors that must not hold a pooled reader. The
+        caller owns the connection and must close it.
+        """
+        return await self._connect(query_only=True)
+
+    def _invalidate_version(self) -> None:
+        """Make the next data_version() call probe the database"""
+        self._version = None
+        self._version_generation += 1
+
+    def _version_fresh(self) -> bool:
+        if self._version is None:
+            return False
+        # Nothing can change an immutable database, so its probe never expires
+        if self.read_only:
+            return True
+        return (time.monotonic() - self._version_checked_at) * 1000 < self.version_check_interval_ms
+
+    async def data_version(self) -> DataVersion:
+        """
+        Current database version as seen by this pool
+
+        The value changes whenever anyone commits to the database, which makes
+        it a cheap validity check for cached results. With databases attached
+        it is a tuple holding the version of every schema; compare with ==.
+
+        A probe younger than version_check_interval_ms is reused unless this
+        pool has written since, so concurrent readers do not queue on the
+        probe connection.
+        """
+        if not self.is_open:
+            raise RuntimeError("Pool is not open. Call open() first.")
+        if self._version_fresh():
+            return self._version
+
+        async with self._version_lock:
+            if self._version_fresh():
+                return self._version
+            generation = self._version_generation
+            version = await self._probe_version()
+            # A write that landed while probing may not be in this value
+            if generation == self._version_generation:
+                self._version, self._version_checked_at = version, time.monotonic()
+            return version
+
+    async def _probe_version(self) -> DataVersion:
+        await self._sync_attachments(self._probe)
+        cursor = await self._probe.execute("PRAGMA data_version")
+        row = await cursor.fetchone()
+        if not self.attachments:
+            return row[0]
+        versions = [row[0]]
+        for alias in self.attachments:
+            cursor = await self._probe.execute(f'PRAGMA "{alias}".data_version')
+            versions.append((await cursor.fetchone())[0])
+        return tuple(versions)
+
+    async def memory_stats(self) -> Dict[str, Any]:
+        """Size of the memory mirror and the page cache budget of the pool's connections"""
+        if not self.is_open:
+            raise RuntimeError("Pool is not open. Call open() first.")
+
+        connections = len(self._readers) + 1 + (self._writer is not None)
+        stats: Dict[str, Any] = {
+            "memory_mirror": self.mirrored,
+            "connections": connections,
+            "page_cache_limit_bytes": connections * self.cache_size_kb * 1024,
+        }
+        if self.mirrored:
+            cursor = await self._probe.execute("PRAGMA page_count")
+            page_count = (await cursor.fetchone())[0]
+            cursor = await self._probe.execute("PRAGMA page_size")
+            page_size = (await cursor.fetchone())[0]
+            stats.update({
+                "mirror_bytes": page_count * page_size,
+                "mirror_max_bytes": self.mirror_max_bytes,
+                "mirror_load_ms": round(self.mirror_load_ms, 2),
+                "writebacks": self.mirror_writebacks,
+                "writeback_ms_total": round(self.mirror_writeback_ms, 2),
+            })
+        return stats
+
+    async def close(self) -> None:
+        """Close every pooled connection"""
+        for conn in [*self._readers, self._probe]:
+            if conn is None:
+                continue
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.warning(f"Error closing reader connection: {e}")
+        self._readers = []
+        self._probe = None
+        self._idle_readers = None
+        self.attachments = {}
+        self._invalidate_version()
+
+        if self._writer is not None:
+            try:
+                await self._writer.close()
+            except Exception as e:
+                logger.warning(f"Error closing writer connection: {e}")
+            self._writer = None
+
+        # Last connection to the memdb: closing it frees the mirror
+        for conn in (self._mirror_target, self._mirror_keeper):
+            if conn is not None:
+                await asyncio.to_thread(conn.close)
+        self._mirror_uri = None
+        self._mirror_keeper = None
+        self._mirror_target = None
+
+        logger.info(f"SQLite pool closed: {self.db_path}")
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection for the duration of the block"""
+        if not self.is_open:
+            raise RuntimeError("Pool is not open. Call open() first.")
+
+        conn = await self._idle_readers.get()
+        try:
+            await self._sync_attachments(conn)
+            yield conn
+        finally:
+            # Shielded so a cancelled caller still hands the connection back
+            with anyio.CancelScope(shield=True):
+                if conn.in_transaction:
+                    await conn.rollback()
+                self._idle_readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def snapshot(self, count: int = 1) -> AsyncIterator[List[aiosqlite.Connection]]:
+        """
+        Borrow up to count readers that all see the same committed state
+
+        Each reader starts a read transaction while the write lock is held, so
+        no commit from this pool's writer can land between them. A commit by
+        another process in that short window is not excluded; use count=1 when
+        a strict single snapshot matters. The transactions end (and the
+        readers are returned) when the block exits.
+
+        Args:
+            count: Readers wanted; capped so at least one stays free for others
+        """
+        if not self.is_open:
+            raise RuntimeError("Pool is not open. Call open() first.")
+
+        count = max(1, min(count, self.reader_count - 1))
+        conns: List[aiosqlite.Connection] = []
+        try:
+            # Serialized so two batches cannot each hold half of the readers
+            async with self._snapshot_lock:
+                for _ in range(count):
+                    conns.append(await self._idle_readers.get())
+            for conn in conns:
+                await self._sync_attachments(conn)
+            async with self._write_lock:
+                for conn in conns:
+                    await conn.execute("BEGIN")
+                    # BEGIN is deferred: the first read pins the snapshot
+                    await conn.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+            yield conns
+        finally:
+            with anyio.CancelScope(shield=True):
+                for conn in conns:
+                    if conn.in_transaction:
+                        await conn.rollback()
+                    self._idle_readers.put_nowait(conn)
+
+    def add_write_listener(self, listener: WriteListener) -> None:
+        """
+        Call listener after every writer() block that wrote to a table
+
+        It receives the names of the main-schema tables written (by the
+        block's statements or their triggers) and runs while the write lock
+        is still held, so it finishes before the next write starts.
+        """
+        self._write_listeners.append(listener)
+
+    async def _notify_write(self, tables: Set[str]) -> None:
+        for listener in self._write_listeners:
+            try:
+                await listener(tables)
+            except Exception as e:
+                logger.warning(f"Write listener failed for {sorted(tables)}: {e}")
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Hold the writer connection exclusively
+
+        The block's changes are committed on success and rolled back if the
+        block raises. With a memory mirror the committed state is then copied
+        to the database file before the lock is released. Write listeners
+        are told which tables the block wrote to, also before the lock is
+        released.
+        """
+        if not self.is_open:
+            raise RuntimeError("Pool is not open. Call open() first.")
+        if self.read_only:
+            raise PermissionError("Database is open in read-only mode; writes are disabled")
+
+        async with self._write_lock:
+            await self._sync_attachments(self._writer)
+            self._written_tables.clear()
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                with anyio.CancelScope(shield=True):
+                    await self._writer.rollback()
+                raise
+            finally:
+                # Also after a rollback: DDL outside a transaction is already committed
+                self._invalidate_version()
+                if self._written_tables:
+                    with anyio.CancelScope(shield=True):
+                        await self._notify_write(set(self._written_tables))
+            if self._mirror_target is not None:
+                start = time.perf_counter()
+                with anyio.CancelScope(shield=True):
+                    copied = await asyncio.to_thread(self._write_back)
+                if copied:
+                    self.mirror_writebacks += 1
+                    self.mirror_writeback_ms += (time.perf_counter() - start) * 1000
+
+    @asynccontextmanager
+    async def deadline(self, conn: aiosqlite.Connection, timeout_ms: Optional[int]) -> AsyncIterator[None]:
+        """
+        Enforce a deadline on the statements run inside the block
+
+        Statements still running after timeout_ms are interrupted by the
+        connection's progress handler and surface as QueryTimeoutError. If the
+        awaiting task is cancelled (e.g. the MCP request was cancelled), the
+        running statement is interrupted as well instead of being left to
+        finish in the background.
+
+        Args:
+            conn: A connection obtained from this pool
+            timeout_ms: Deadline in milliseconds (None or 0 disables it)
+        """
+        guard = self._guards[conn]
+        guard.arm(timeout_ms)
+        start = time.monotonic()
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if guard.expired:
+                elapsed_ms = (time.monotonic() - start) * 1000
+                raise QueryTimeoutError(timeout_ms, elapsed_ms, guard.ticks * PROGRESS_INTERVAL) from e
+            raise
+        except anyio.get_cancelled_exc_class():
+            guard.cancelled = True
+            await conn.interrupt()
+            # Wait for the interrupted statement to unwind before the
+            # connection can be reused by someone else
+            with anyio.CancelScope(shield=True):
+                await conn.rollback()
+            raise
+        finally:
+            guard.disarm()
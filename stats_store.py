@@ -0,0 +1,130 @@
+"""
+Stats Store
+Column profiles and distinct-count sketches persisted beside a database file
+"""
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# Appended to the database file name, like SQLite's own -wal and -shm files
+STATS_SUFFIX = "-mcp-stats"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS profiles ("
+    "table_name TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+    "profile TEXT NOT NULL, computed_at TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS sketches ("
+    "table_name TEXT NOT NULL, column_name TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+    "registers BLOB NOT NULL, computed_at TEXT NOT NULL, "
+    "PRIMARY KEY (table_name, column_name))",
+)
+
+
+def stats_path(db_path: str) -> Path:
+    """The stats file kept for the database at db_path"""
+    path = Path(db_path).resolve()
+    return path.with_name(path.name + STATS_SUFFIX)
+
+
+class StatsStore:
+    """
+    Profiles and sketches kept in their own SQLite file next to the database
+
+    Saving them never writes to the user's database, so it does not move the
+    data_version the result and column caches are keyed on, and it works for
+    immutable uploads as well. Entries are matched on a table fingerprint and
+    dropped per table when the server writes to that table. A store that
+    cannot be opened or written (e.g. a read-only directory) behaves as empty.
+    """
+
+    def __init__(self, db_path: str):
+        self.path = stats_path(db_path)
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+        self._failed = False
+
+    async def _connection(self, create: bool) -> Optional[aiosqlite.Connection]:
+        """The store's connection; opened on first use, and only created when create is set"""
+        async with self._lock:
+            if self._conn is None and not self._failed and (create or self.path.exists()):
+                try:
+                    conn = await aiosqlite.connect(self.path)
+                    for statement in _SCHEMA:
+                        await conn.execute(statement)
+                    await conn.commit()
+                    self._conn = conn
+                except Exception as e:
+                    self._failed = True
+                    logger.warning(f"Column statistics will not be persisted for {self.path}: {e}")
+            return self._conn
+
+    async def _fetch(self, sql: str, params: tuple) -> Optional[tuple]:
+        conn = await self._connection(create=False)
+        if conn is None:
+            return None
+        try:
+            cursor = await conn.execute(sql, params)
+            return await cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"Could not read {self.path}: {e}")
+            return None
+
+    async def _write(self, sql: str, params: tuple, create: bool = True) -> None:
+        conn = await self._connection(create=create)
+        if conn is None:
+            return
+        try:
+            await conn.execute(sql, params)
+            await conn.commit()
+        except Exception as e:
+            logger.warning(f"Could not write {self.path}: {e}")
+
+    async def get_profile(self, table_name: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """The stored profile of a table if it was computed at fingerprint"""
+        row = await self._fetch(
+            "SELECT profile FROM profiles WHERE table_name = ? AND fingerprint = ?", (table_name, fingerprint)
+        )
+        return json.loads(row[0]) if row else None
+
+    async def put_profile(self, table_name: str, fingerprint: str, profile: Dict[str, Any]) -> None:
+        await self._write(
+            "INSERT OR REPLACE INTO profiles (table_name, fingerprint, profile, computed_at) VALUES (?, ?, ?, ?)",
+            (table_name, fingerprint, json.dumps(profile), time.strftime("%Y-%m-%dT%H:%M:%S")),
+        )
+
+    async def get_sketch(self, table_name: str, column: str, fingerprint: str) -> Optional[bytes]:
+        """The stored sketch registers of a column if computed at fingerprint"""
+        row = await self._fetch(
+            "SELECT registers FROM sketches WHERE table_name = ? AND column_name = ? AND fingerprint = ?",
+            (table_name, column, fingerprint),
+        )
+        return row[0] if row else None
+
+    async def put_sketch(self, table_name: str, column: str, fingerprint: str, registers: bytes) -> None:
+        await self._write(
+            "INSERT OR REPLACE INTO sketches (table_name, column_name, fingerprint, registers, computed_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (table_name, column, fingerprint, registers, time.strftime("%Y-%m-%dT%H:%M:%S")),
+        )
+
+    async def drop_tables(self, tables: Iterable[str]) -> None:
+        """Forget everything stored for these tables"""
+        names = sorted(set(tables))
+        if not names:
+            return
+        placeholders = ", ".join("?" * len(names))
+        for sidecar in ("profiles", "sketches"):
+            await self._write(f"DELETE FROM {sidecar} WHERE table_name IN ({placeholders})", tuple(names), create=False)
+
+    async def close(self) -> None:
+        async with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            await conn.close()
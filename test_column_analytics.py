@@ -0,0 +1,54 @@
+"""
+Tests for the NumPy column statistics
+Run with: python -m pytest -q test_column_analytics.py
+"""
+import numpy as np
+
+import column_analytics
+from column_analytics import ColumnArrayCache
+
+
+def test_to_numeric_turns_nulls_and_text_into_nan():
+    values = column_analytics.to_numeric(np.array([1, "2.5", None, "n/a"], dtype=object))
+    assert values[:2].tolist() == [1.0, 2.5]
+    assert np.isnan(values[2:]).all()
+
+
+def test_describe_skips_missing_values():
+    stats = column_analytics.describe(np.array([1.0, 2.0, 3.0, 4.0, np.nan]), quantiles=[0.5])
+    assert stats["count"] == 4
+    assert stats["missing"] == 1
+    assert stats["mean"] == 2.5
+    assert stats["quantiles"] == {"p50": 2.5}
+
+
+def test_regression_recovers_a_linear_relationship():
+    x = np.arange(10, dtype=float)
+    fit = column_analytics.linear_regression("y", {"x": x, "y": 3 * x + 2})
+    assert fit["intercept"] == 2
+    assert fit["coefficients"] == {"x": 3}
+    assert fit["r_squared"] == 1
+
+
+def test_grouped_reports_the_largest_groups_first():
+    labels = np.array(["a", "b", "b", "c", "b", "a"])
+    result = column_analytics.grouped(labels, {"v": np.array([1.0, 2.0, 4.0, 5.0, np.nan, 3.0])}, max_groups=2)
+    assert result["group_count"] == 3
+    assert result["groups_omitted"] == 1
+    assert [g["group"] for g in result["groups"]] == ["b", "a"]
+    assert result["groups"][0]["v"] == {"count": 2, "mean": 3, "sum": 6, "min": 2, "max": 4, "std": 1.41421}
+
+
+def test_array_cache_drops_stale_versions_and_evicts_to_fit():
+    cache = ColumnArrayCache(max_bytes=160)
+    cache.put("t", "a", 1, np.zeros(10))
+    cache.put("t", "b", 1, np.zeros(10))
+
+    assert cache.get("t", "a", 2) is None
+    assert cache.get("t", "a", 1) is None
+    cache.put("t", "c", 1, np.zeros(10))
+    cache.get("t", "b", 1)
+    cache.put("t", "d", 1, np.zeros(10))
+    assert cache.get("t", "c", 1) is None
+    assert cache.get("t", "b", 1) is not None
+    assert cache.current_bytes == 160
@@ -0,0 +1,55 @@
+"""
+Tests for the single-pass column profiler
+Run with: python -m pytest -q test_column_profiler.py
+"""
+import column_profiler
+from column_profiler import TableProfiler
+
+
+def profile(rows, columns=("x",)):
+    profiler = TableProfiler(list(columns))
+    profiler.update(rows)
+    return profiler.result(top_k=3, bins=4)
+
+
+def test_small_columns_are_profiled_exactly():
+    result = profile([(1, "a"), (2, "b"), (3, "a"), (None, "a")], columns=("n", "s"))
+    numbers, text = result["columns"]
+
+    assert result["row_count"] == 4
+    assert numbers["kind"] == "numeric"
+    assert numbers["null_count"] == 1
+    assert (numbers["min"], numbers["max"], numbers["mean"]) == (1, 3, 2.0)
+    assert numbers["quantiles_exact"] and numbers["distinct_exact"]
+    assert text["top_values"][0] == {"value": "a", "count": 3}
+    assert text["distinct_count"] == 2
+    assert not text["counts_truncated"]
+
+
+def test_numeric_quantiles_come_from_a_bounded_sample(monkeypatch):
+    monkeypatch.setattr(column_profiler, "SAMPLE_SIZE", 100)
+    profiler = TableProfiler(["x"])
+    for start in range(0, 10_000, 1000):
+        profiler.update((float(i),) for i in range(start, start + 1000))
+    column = profiler.result()["columns"][0]
+
+    assert len(profiler.columns[0].sample) == 100
+    assert not column["quantiles_exact"]
+    # Moments and range stay exact
+    assert (column["min"], column["max"], column["mean"]) == (0, 9999, 4999.5)
+    assert sum(column["histogram"]["counts"]) == 10_000
+    assert 2000 < column["quartiles"][1] < 8000
+
+
+def test_value_counts_past_the_limit_are_reported_as_truncated(monkeypatch):
+    monkeypatch.setattr(column_profiler, "MAX_TRACKED_VALUES", 50)
+    profiler = TableProfiler(["s"])
+    for start in range(0, 1000, 100):
+        profiler.update([("common",)] * 10 + [(f"v{i}",) for i in range(start, start + 100)])
+    column = profiler.result(top_k=1)["columns"][0]
+
+    assert len(profiler.columns[0].text_counts.counts) <= 50
+    assert column["counts_truncated"]
+    assert not column["distinct_exact"]
+    assert 900 < column["distinct_count"] < 1100
+    assert column["top_values"][0]["value"] == "common"
@@ -0,0 +1,38 @@
+"""
+Tests for the upload pipeline's database bookkeeping
+Run with: python -m pytest -q test_data_pipeline.py
+"""
+import json
+import sqlite3
+
+from data_pipeline import DataPipeline
+
+
+def register(pipeline, names):
+    databases = []
+    for i, name in enumerate(names):
+        path = pipeline.db_dir / f"{i}.db"
+        sqlite3.connect(path).close()
+        databases.append({"name": name, "db_path": str(path), "uploaded_at": f"2026-01-0{i + 1}T00:00:00"})
+    pipeline.metadata_file.write_text(json.dumps({"databases": databases}))
+    return databases
+
+
+def test_attachment_aliases_are_always_plain_identifiers(tmp_path):
+    pipeline = DataPipeline(str(tmp_path / "uploads"))
+    register(pipeline, ["Sales 2024.xlsx", "2023.csv", "order.csv", "données.csv", "!!!.csv", "sales-2024.csv"])
+
+    aliases = pipeline.attachment_aliases()
+    assert list(aliases) == ["db_sales_2024", "db_2023", "db_order", "db_donn_es", "db", "db_sales_2024_2"]
+    for alias in aliases:
+        conn = sqlite3.connect(":memory:")
+        conn.execute(f"ATTACH DATABASE ':memory:' AS {alias}")
+        conn.close()
+
+
+def test_attachment_aliases_keep_the_most_recent_uploads_and_skip_the_main_database(tmp_path):
+    pipeline = DataPipeline(str(tmp_path / "uploads"))
+    databases = register(pipeline, ["a.csv", "b.csv", "c.csv"])
+
+    assert pipeline.attachment_aliases(exclude_path=databases[2]["db_path"], limit=1) == {"db_b": databases[1]["db_path"]}
+    assert pipeline.attachment_aliases(limit=0) == {}
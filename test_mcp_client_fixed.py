@@ -0,0 +1,90 @@
+"""
+Tests for MCPClient against the bundled SQLite MCP server (stdio subprocess)
+Run with: python -m pytest -q test_mcp_client_fixed.py
+"""
+import asyncio
+import sqlite3
+
+import config
+from mcp import types
+from mcp_client_fixed import MCPClient, MCPServerConfig
+
+# Counts to a billion; only a deadline stops it
+SLOW_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000) SELECT COUNT(*) FROM n"
+
+
+def make_db(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.close()
+    return path
+
+
+def test_tool_timeout_defaults_to_the_configured_value(tmp_path):
+    client = MCPClient(MCPServerConfig.sqlite_server_params(str(make_db(tmp_path / "t.db"))))
+    assert client.tool_timeout_seconds == config.MCP_TOOL_TIMEOUT_SECONDS
+
+
+def test_tool_call_past_its_timeout_returns_an_error(tmp_path):
+    async def scenario():
+        client = MCPClient(MCPServerConfig.sqlite_server_params(str(make_db(tmp_path / "t.db"))), tool_timeout_seconds=0.5)
+        await client.connect()
+        try:
+            slow = await client.call_tool("execute_query", {"query": SLOW_QUERY, "timeout_ms": 60000})
+            # The session is still usable after a timed-out call
+            fast = await client.call_tool("execute_query", {"query": "SELECT 1 AS one"})
+        finally:
+            await client.close()
+        return slow, fast
+
+    slow, fast = asyncio.run(scenario())
+    assert "error" in slow.json()
+    assert slow.duration_ms < 10000
+    assert fast.json() == [{"one": 1}]
+
+
+def test_tool_list_is_cached_until_the_server_reports_a_change(tmp_path):
+    db = str(make_db(tmp_path / "t.db"))
+
+    async def scenario():
+        client = MCPClient(MCPServerConfig.sqlite_standby_params())
+        await client.connect()
+        try:
+            requests = 0
+            list_tools = client.session.list_tools
+
+            async def counting_list_tools():
+                nonlocal requests
+                requests += 1
+                return await list_tools()
+
+            client.session.list_tools = counting_list_tools
+            standby = {t.name for t in await client.list_tools()}
+            schemas = await client.openrouter_tools("sqlite")
+            cached_requests = requests
+            # open_database removes itself and sends tools/list_changed
+            await client.call_tool("open_database", MCPServerConfig.sqlite_open_arguments(db))
+            opened = {t.name for t in await client.list_tools()}
+        finally:
+            await client.close()
+        return standby, schemas, cached_requests, opened, requests
+
+    standby, schemas, cached_requests, opened, requests = asyncio.run(scenario())
+    assert "open_database" in standby
+    assert {s["function"]["name"] for s in schemas} == standby
+    assert cached_requests == 1
+    assert "open_database" not in opened and "execute_query" in opened
+    assert requests == 2
+
+
+def test_tools_without_a_description_name_their_server():
+    client = MCPClient(MCPServerConfig.sqlite_standby_params())
+    client.session = object()  # list_tools only checks that there is a session
+    client._tools = [types.Tool(name="lookup", inputSchema={"type": "object"})]
+
+    async def scenario():
+        return await client.openrouter_tools("warehouse"), await client.openrouter_tools()
+
+    named, unnamed = asyncio.run(scenario())
+    assert named[0]["function"]["description"] == "Tool from warehouse"
+    assert unnamed[0]["function"]["description"] == "Tool: lookup"
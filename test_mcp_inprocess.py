@@ -0,0 +1,77 @@
+"""
+Tests for the SQLite MCP server hosted in this process
+Run with: python -m pytest -q test_mcp_inprocess.py
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+import sqlite_mcp_fastmcp as server
+from mcp_server_pool import InProcessSQLiteServer
+
+
+def make_db(path, value):
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (?)", (value,))
+    conn.close()
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def restore_server_mode(monkeypatch):
+    """The host switches the server module to shared mode; undo it for later tests"""
+    monkeypatch.setattr(server, "SHARED", server.SHARED)
+    monkeypatch.setattr(server, "SHARED_ROOTS", list(server.SHARED_ROOTS))
+    was_shared = server.SHARED
+    yield
+    if not was_shared:
+        server.mcp.remove_tool("open_database")
+
+
+def test_sessions_run_in_process_on_their_own_databases(tmp_path):
+    first, second = make_db(tmp_path / "a.db", 1), make_db(tmp_path / "b.db", 2)
+
+    async def scenario():
+        hosted = InProcessSQLiteServer(roots=[str(tmp_path)])
+        clients = []
+        try:
+            clients = [await hosted.acquire(first), await hosted.acquire(second), await hosted.acquire(first)]
+            results = [(await c.call_tool("execute_query", {"query": "SELECT x FROM t"})).json() for c in clients]
+            open_databases = len(server._shared_databases)
+            for client in clients:
+                await client.close()
+            clients = []
+            # Give the host loop a moment to release the databases
+            for _ in range(100):
+                if not server._shared_databases:
+                    break
+                await asyncio.sleep(0.01)
+            released = not server._shared_databases
+        finally:
+            for client in clients:
+                await client.close()
+            await hosted.close()
+        return results, open_databases, released
+
+    results, open_databases, released = asyncio.run(scenario())
+    assert results == [[{"x": 1}], [{"x": 2}], [{"x": 1}]]
+    assert open_databases == 2
+    assert released
+
+
+def test_databases_outside_the_roots_are_refused(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    outside = make_db(tmp_path / "outside.db", 1)
+
+    async def scenario():
+        hosted = InProcessSQLiteServer(roots=[str(root)])
+        try:
+            with pytest.raises(ConnectionError):
+                await hosted.acquire(outside)
+        finally:
+            await hosted.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,156 @@
+"""
+Tests for the pre-started and shared SQLite MCP server pools (subprocesses)
+Run with: python -m pytest -q test_mcp_server_pool.py
+"""
+import asyncio
+import sqlite3
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+from mcp import StdioServerParameters
+
+import mcp_server_pool
+from mcp_server_pool import SharedSQLiteServer, SQLiteServerPool
+
+
+def make_db(path, value):
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (?)", (value,))
+    conn.close()
+    return str(path)
+
+
+async def wait_idle(pool, count, timeout=60):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while pool.idle < count:
+        assert asyncio.get_running_loop().time() < deadline, "standby servers did not start"
+        await asyncio.sleep(0.05)
+
+
+def test_acquire_hands_out_a_standby_server_and_refills(tmp_path):
+    first, second = make_db(tmp_path / "a.db", 1), make_db(tmp_path / "b.db", 2)
+
+    async def scenario():
+        pool = SQLiteServerPool(size=1)
+        pool.start()
+        clients = []
+        try:
+            await wait_idle(pool, 1)
+            clients.append(await pool.acquire(first))
+            await wait_idle(pool, 1)
+            clients.append(await pool.acquire(second))
+            results = [(await client.call_tool("execute_query", {"query": "SELECT x FROM t"})).json() for client in clients]
+        finally:
+            for client in clients:
+                await client.close()
+            await pool.close()
+        return pool, clients, results
+
+    pool, clients, results = asyncio.run(scenario())
+    assert results == [[{"x": 1}], [{"x": 2}]]
+    assert pool.stats["warm"] == 2
+    assert pool.stats["cold"] == 0
+    # Handed-out clients describe their database like a direct launch
+    assert first in clients[0].server_params.args
+    assert pool.idle == 0
+
+
+def test_acquire_without_standby_servers_launches_one(tmp_path):
+    path = make_db(tmp_path / "a.db", 1)
+
+    async def scenario():
+        pool = SQLiteServerPool(size=0)
+        pool.start()
+        client = await pool.acquire(path)
+        try:
+            result = (await client.call_tool("execute_query", {"query": "SELECT x FROM t"})).json()
+        finally:
+            await client.close()
+            await pool.close()
+        return pool, result
+
+    pool, result = asyncio.run(scenario())
+    assert result == [{"x": 1}]
+    assert pool.stats == {"warm": 0, "cold": 1, "failed_handoffs": 0, "failed_starts": 0}
+
+
+def test_shared_server_serves_sessions_on_one_database_pool(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    path = make_db(root / "a.db", 1)
+    outside = make_db(tmp_path / "outside.db", 3)
+
+    async def scenario():
+        shared = SharedSQLiteServer(roots=[str(root)])
+        clients = []
+        try:
+            clients.append(await shared.acquire(path))
+            clients.append(await shared.acquire(path))
+            await clients[0].call_tool("execute_query", {"query": "INSERT INTO t VALUES (2)"})
+            seen = (await clients[1].call_tool("execute_query", {"query": "SELECT COUNT(*) AS n FROM t"})).json()
+            usage = (await clients[1].call_tool("memory_usage", {})).json()
+            with pytest.raises(ConnectionError):
+                await shared.acquire(outside)
+            _, port = shared._servers[0]
+            status = await asyncio.to_thread(post_without_token, f"http://127.0.0.1:{port}/mcp")
+        finally:
+            for client in clients:
+                await client.close()
+            await shared.close()
+        return seen, usage, status
+
+    seen, usage, status = asyncio.run(scenario())
+    assert seen == [{"n": 2}]
+    assert usage["open_databases"] == 1
+    assert status == 401
+
+
+def fake_shared_params(code):
+    """sqlite_shared_params replaced by a Python process running code"""
+    return lambda roots, host, port: StdioServerParameters(command=sys.executable, args=["-c", code])
+
+
+def test_failed_background_start_is_counted_and_logged(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(mcp_server_pool.MCPServerConfig, "sqlite_shared_params", fake_shared_params("raise SystemExit(3)"))
+
+    async def scenario():
+        shared = SharedSQLiteServer(roots=[str(tmp_path)])
+        shared.start()
+        tasks = set(shared._tasks)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await shared.close()
+        return shared, tasks
+
+    shared, tasks = asyncio.run(scenario())
+    assert len(tasks) == 1 and not shared._tasks
+    assert shared.stats["failed_starts"] == 1
+    assert "exited with code 3" in caplog.text
+
+
+def test_close_stops_servers_that_are_still_starting(tmp_path, monkeypatch):
+    # Never listens, so the start waits out its timeout
+    monkeypatch.setattr(mcp_server_pool.MCPServerConfig, "sqlite_shared_params", fake_shared_params("import time; time.sleep(60)"))
+
+    async def scenario():
+        shared = SharedSQLiteServer(roots=[str(tmp_path)], startup_timeout_seconds=60)
+        shared.start()
+        await asyncio.sleep(0.5)
+        started = asyncio.get_running_loop().time()
+        await shared.close()
+        return shared, asyncio.get_running_loop().time() - started
+
+    shared, elapsed = asyncio.run(scenario())
+    assert elapsed < 10
+    assert not shared._tasks and shared.stats["failed_starts"] == 0
+
+
+def post_without_token(url):
+    request = urllib.request.Request(url, data=b"{}", headers={"Content-Type": "application/json"})
+    try:
+        urllib.request.urlopen(request, timeout=10)
+    except urllib.error.HTTPError as e:
+        return e.code
+    return 200
@@ -0,0 +1,60 @@
+"""
+Tests for the read-query result cache
+Run with: python -m pytest -q test_query_cache.py
+"""
+from query_cache import QueryResultCache, is_cacheable_sql, normalize_sql
+
+
+def test_normalize_sql_collapses_whitespace_outside_literals():
+    assert normalize_sql("SELECT  *\n  FROM t ;") == "SELECT * FROM t"
+    assert normalize_sql("SELECT 'a  b' FROM t") == "SELECT 'a  b' FROM t"
+
+
+def test_volatile_queries_are_not_cacheable():
+    assert is_cacheable_sql("SELECT * FROM t")
+    assert not is_cacheable_sql("SELECT random() FROM t")
+    assert not is_cacheable_sql("SELECT date('now')")
+    assert not is_cacheable_sql("SELECT CURRENT_TIMESTAMP")
+
+
+def test_entry_from_another_version_is_dropped():
+    cache = QueryResultCache(max_bytes=1000)
+    cache.put("q", "result", version=1, rows=3)
+
+    assert cache.get_entry("q", 1).rows == 3
+    assert cache.get("q", 2) is None
+    assert cache.get("q", 1) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_to_fit_the_budget():
+    cache = QueryResultCache(max_bytes=400)
+    for key in "abcd":
+        cache.put(key, "x" * 100, version=1)
+    cache.get("a", 1)
+    cache.put("e", "x" * 100, version=1)
+
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None
+    assert cache.current_bytes == 400
+
+
+def test_oversized_results_and_a_zero_budget_are_not_cached():
+    cache = QueryResultCache(max_bytes=400)
+    cache.put("big", "x" * 101, version=1)
+    disabled = QueryResultCache(max_bytes=0)
+    disabled.put("q", "x", version=1)
+
+    assert cache.get("big", 1) is None
+    assert disabled.get("q", 1) is None
+
+
+def test_clear_with_a_prefix_keeps_other_databases_entries():
+    cache = QueryResultCache(max_bytes=1000)
+    cache.put("db1:q", "one", version=1)
+    cache.put("db2:q", "two", version=1)
+    cache.clear(prefix="db1:")
+
+    assert cache.get("db1:q", 1) is None
+    assert cache.get("db2:q", 1) == "two"
+    assert cache.current_bytes == 3
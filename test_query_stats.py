@@ -0,0 +1,38 @@
+"""
+Tests for the per-query statistics log
+Run with: python -m pytest -q test_query_stats.py
+"""
+from query_stats import QueryStatsLog, fingerprint
+
+
+def test_fingerprint_drops_literals_comments_and_case():
+    assert fingerprint("SELECT * FROM t WHERE id = 7;") == fingerprint("select *\nfrom t where id=42 -- x")
+    assert fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3)") == "select * from t where id in (?+)"
+    assert fingerprint('SELECT "Name" FROM t WHERE s = \'a\'\'b\'') == 'select "Name" from t where s = ?'
+
+
+def test_summary_reports_percentiles_per_fingerprint():
+    log = QueryStatsLog(max_records=100)
+    for ms in range(1, 21):
+        log.record(f"SELECT * FROM t WHERE id = {ms}", float(ms), rows=1)
+    log.record("DELETE FROM t", 500.0, status="error")
+
+    summary = log.summary(order_by="calls")
+    top = summary["fingerprints"][0]
+    assert (top["calls"], top["p50_ms"], top["p95_ms"], top["max_ms"]) == (20, 10, 19, 20)
+    assert summary["fingerprints"][1]["errors"] == 1
+    assert log.summary(top_n=1, order_by="max_ms")["fingerprints"][0]["fingerprint"] == "delete from t"
+
+
+def test_persisted_log_is_compacted_while_running_and_reloaded(tmp_path):
+    path = tmp_path / "stats.jsonl"
+    log = QueryStatsLog(max_records=10, path=str(path))
+    for i in range(25):
+        log.record(f"SELECT {i}", float(i))
+
+    assert len(path.read_text().splitlines()) <= 20
+    log.close()
+    reloaded = QueryStatsLog(max_records=10, path=str(path))
+    assert len(reloaded) == 10
+    assert reloaded.summary(order_by="max_ms")["fingerprints"][0]["max_ms"] == 24
+    reloaded.close()
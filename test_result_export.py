@@ -0,0 +1,34 @@
+"""
+Tests for streaming query results to export files
+Run with: python -m pytest -q test_result_export.py
+"""
+import os
+import time
+
+from result_export import export_file_name, is_export_name, remove_expired_exports
+
+
+def test_export_file_names_are_sanitized_and_unique():
+    assert export_file_name("../orders 2024.csv", "abc123", "csv", compress=True) == "orders_2024-abc123.csv.gz"
+    assert export_file_name(None, "abc123", "ndjson", compress=False) == "export-abc123.ndjson"
+    assert is_export_name("orders_2024-abc123.csv.gz")
+    assert not is_export_name("../secret.db")
+    assert not is_export_name(".hidden")
+    assert not is_export_name("notes.txt")
+
+
+def test_only_expired_exports_are_removed(tmp_path):
+    old, new = tmp_path / "old-abc123.csv", tmp_path / "new-def456.csv"
+    partial = tmp_path / "old-0a1b2c.ndjson.gz.part"
+    foreign = [tmp_path / "notes.txt", tmp_path / "app.db", tmp_path / "report.csv"]
+    hour_ago = time.time() - 3600
+    for path in [old, new, partial, *foreign]:
+        path.write_text("a")
+        if path is not new:
+            os.utime(path, (hour_ago, hour_ago))
+
+    assert remove_expired_exports(tmp_path, max_age_seconds=60) == 2
+    assert not old.exists() and not partial.exists() and new.exists()
+    # Files export_query did not write survive, however old
+    assert all(path.exists() for path in foreign)
+    assert remove_expired_exports(tmp_path / "missing", 60) == 0
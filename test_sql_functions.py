@@ -0,0 +1,64 @@
+"""
+Tests for the SQL functions registered on pooled connections
+Run with: python -m pytest -q test_sql_functions.py
+"""
+import random
+import sqlite3
+import statistics
+
+import numpy as np
+import pytest
+
+from sql_functions import FunctionsConnection
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", factory=FunctionsConnection)
+    conn.execute("CREATE TABLE t (g TEXT, x REAL, y REAL)")
+    rng = random.Random(1)
+    conn.executemany("INSERT INTO t VALUES (?, ?, ?)", [
+        (f"g{i % 3}", rng.uniform(0, 100), i * 2.0) for i in range(200)
+    ] + [("g0", None, 1.0), ("g1", "text", 2.0)])
+    yield conn
+    conn.close()
+
+
+def numbers(conn, sql):
+    return [row[0] for row in conn.execute(sql)]
+
+
+def test_aggregates_match_numpy(conn):
+    xs = np.array(numbers(conn, "SELECT x FROM t WHERE typeof(x) = 'real' ORDER BY rowid"))
+    median, p90, std, var_pop = conn.execute(
+        "SELECT median(x), percentile(x, 90), stddev(x), var_pop(x) FROM t"
+    ).fetchone()
+
+    assert median == pytest.approx(np.median(xs))
+    assert p90 == pytest.approx(np.quantile(xs, 0.9))
+    assert std == pytest.approx(xs.std(ddof=1))
+    assert var_pop == pytest.approx(xs.var())
+    assert conn.execute("SELECT corr(y, y * 3 + 1) FROM t").fetchone()[0] == pytest.approx(1)
+
+
+def test_sliding_window_percentile_matches_each_frame(conn):
+    xs = numbers(conn, "SELECT x FROM t WHERE typeof(x) = 'real' ORDER BY rowid")
+    windowed = numbers(conn, (
+        "SELECT percentile(x, 25) OVER (ORDER BY rowid ROWS BETWEEN 9 PRECEDING AND 10 FOLLOWING) "
+        "FROM t WHERE typeof(x) = 'real' ORDER BY rowid"
+    ))
+    expected = [np.quantile(xs[max(0, i - 9):i + 11], 0.25) for i in range(len(xs))]
+    assert windowed == pytest.approx(expected)
+
+    running = numbers(conn, "SELECT median(x) OVER (ORDER BY rowid) FROM t WHERE typeof(x) = 'real' ORDER BY rowid")
+    assert running == pytest.approx([statistics.median(xs[:i + 1]) for i in range(len(xs))])
+
+
+def test_percentile_rejects_out_of_range_fractions(conn):
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("SELECT percentile(x, 150) FROM t").fetchone()
+
+
+def test_regexp_operator(conn):
+    assert conn.execute("SELECT COUNT(*) FROM t WHERE g REGEXP '^g[12]$'").fetchone()[0] == 134
+    assert conn.execute("SELECT NULL REGEXP 'a'").fetchone()[0] is None
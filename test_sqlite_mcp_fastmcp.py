@@ -0,0 +1,790 @@
+"""
+Tests for the SQLite MCP server tools
+Run with: python -m pytest -q test_sqlite_mcp_fastmcp.py
+"""
+import asyncio
+import gzip
+import json
+import sqlite3
+
+import pytest
+
+import sqlite_mcp_fastmcp as server
+
+
+def make_sales_db(path, rows: int = 100):
+    """A database with a sales table of `rows` rows"""
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE sales (id INTEGER PRIMARY KEY, region TEXT, amount REAL, note TEXT)")
+        conn.executemany(
+            "INSERT INTO sales (region, amount, note) VALUES (?, ?, ?)",
+            [(f"r{i % 5}", i * 1.5, f"note {i}") for i in range(rows)]
+        )
+    conn.close()
+    return path
+
+
+@pytest.fixture(autouse=True)
+def isolated_server(tmp_path, monkeypatch):
+    """Keep every test's files in tmp_path, never in the working tree"""
+    monkeypatch.setattr(server, "DB_FILE", str(tmp_path / "unused.db"))
+    monkeypatch.setattr(server, "EXPORT_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(server, "_default_db", None)
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """A sales database served by the module's single-database server"""
+    path = make_sales_db(tmp_path / "sales.db")
+    monkeypatch.setattr(server, "DB_FILE", str(path))
+    monkeypatch.setattr(server, "READ_ONLY", False)
+    return path
+
+
+def run(scenario):
+    """Run a coroutine function and close the server's pool afterwards"""
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await server.close_pool()
+    return asyncio.run(main())
+
+
+def test_is_read_query_classifies_the_statement_after_a_with_clause():
+    assert server._is_read_query("WITH x AS (SELECT 1) SELECT * FROM x")
+    assert server._is_read_query("with recursive n(i) as (select 1 union all select i + 1 from n) select i from n")
+    assert not server._is_read_query("WITH x AS (SELECT 1) DELETE FROM sales WHERE id IN (SELECT * FROM x)")
+    assert not server._is_read_query("WITH x AS (SELECT 'select') UPDATE sales SET note = 'x'")
+    assert not server._is_read_query("WITH x AS MATERIALIZED (SELECT 1) INSERT INTO sales (id) SELECT * FROM x")
+
+
+def test_is_read_query_treats_pragma_assignments_as_writes():
+    assert server._is_read_query("PRAGMA user_version")
+    assert server._is_read_query("PRAGMA table_info(sales)")
+    assert server._is_read_query("PRAGMA main.index_list('sales')")
+    assert not server._is_read_query("PRAGMA user_version = 5")
+    assert not server._is_read_query("PRAGMA user_version(5)")
+    assert not server._is_read_query("PRAGMA main.user_version(5)")
+    assert not server._is_read_query("PRAGMA optimize")
+
+
+def test_is_read_query_skips_comments():
+    assert server._is_read_query("-- totals\nSELECT 1")
+    assert not server._is_read_query("/* cleanup */ DELETE FROM sales")
+
+
+def test_cte_write_runs_on_the_writer(db_path):
+    async def scenario():
+        result = json.loads(await server.execute_query(
+            "WITH old AS (SELECT id FROM sales WHERE id <= 10) DELETE FROM sales WHERE id IN (SELECT id FROM old)"
+        ))
+        count = json.loads(await server.execute_query("SELECT COUNT(*) AS n FROM sales"))
+        return result, count
+
+    result, count = run(scenario)
+    assert result["status"] == "success"
+    assert result["affected_rows"] == 10
+    assert count == [{"n": 90}]
+
+
+def test_pragma_function_form_write_runs_on_the_writer(db_path):
+    async def scenario():
+        result = json.loads(await server.execute_query("PRAGMA user_version(5)"))
+        version = json.loads(await server.execute_query("PRAGMA user_version"))
+        return result, version
+
+    result, version = run(scenario)
+    assert result["status"] == "success"
+    assert version == [{"user_version": 5}]
+
+
+def test_cached_read_sees_the_servers_own_write_at_once(db_path, monkeypatch):
+    monkeypatch.setattr(server, "VERSION_CHECK_MS", 60_000)
+
+    async def scenario():
+        query = "SELECT COUNT(*) AS n FROM sales"
+        before = json.loads(await server.execute_query(query))
+        await server.execute_query("DELETE FROM sales WHERE id <= 10")
+        after = json.loads(await server.execute_query(query))
+        return before, after
+
+    before, after = run(scenario)
+    assert before == [{"n": 100}]
+    assert after == [{"n": 90}]
+
+
+def test_cached_read_sees_another_process_commit_after_the_check_interval(db_path, monkeypatch):
+    monkeypatch.setattr(server, "VERSION_CHECK_MS", 20)
+
+    async def scenario():
+        query = "SELECT COUNT(*) AS n FROM sales"
+        before = json.loads(await server.execute_query(query))
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("DELETE FROM sales WHERE id <= 10")
+        conn.close()
+        await asyncio.sleep(0.05)
+        after = json.loads(await server.execute_query(query))
+        return before, after
+
+    before, after = run(scenario)
+    assert before == [{"n": 100}]
+    assert after == [{"n": 90}]
+
+
+def test_paged_query_returns_every_row_once(db_path):
+    async def scenario():
+        pages = [json.loads(await server.execute_query("SELECT id FROM sales ORDER BY id", max_rows=30))]
+        while pages[-1]["has_more"]:
+            pages.append(json.loads(await server.fetch_page(pages[-1]["page_token"])))
+        return pages
+
+    pages = run(scenario)
+    assert [page["row_count"] for page in pages] == [30, 30, 30, 10]
+    assert [row["id"] for page in pages for row in page["rows"]] == list(range(1, 101))
+    assert pages[-1]["page_token"] is None
+    assert pages[-1]["rows_returned_total"] == 100
+
+
+def test_fetch_page_rejects_finished_and_unknown_tokens(db_path):
+    async def scenario():
+        page = json.loads(await server.execute_query("SELECT id FROM sales", max_rows=60))
+        last = json.loads(await server.fetch_page(page["page_token"]))
+        again = json.loads(await server.fetch_page(page["page_token"]))
+        unknown = json.loads(await server.fetch_page("nope"))
+        return last, again, unknown
+
+    last, again, unknown = run(scenario)
+    assert last["has_more"] is False
+    assert again["status"] == "error"
+    assert unknown["status"] == "error"
+
+
+def test_open_cursors_are_capped(db_path, monkeypatch):
+    monkeypatch.setattr(server, "MAX_OPEN_CURSORS", 2)
+
+    async def scenario():
+        tokens = [
+            json.loads(await server.execute_query("SELECT id FROM sales", max_rows=10))["page_token"]
+            for _ in range(3)
+        ]
+        return tokens, len(server._db().cursors), json.loads(await server.fetch_page(tokens[0]))
+
+    tokens, open_cursors, evicted = run(scenario)
+    assert open_cursors == 2
+    assert evicted["status"] == "error"
+
+
+def test_repeated_read_is_served_from_the_result_cache(db_path):
+    async def scenario():
+        hits = server.result_cache.hits
+        first = await server.execute_query("SELECT region, SUM(amount) FROM sales GROUP BY region")
+        second = await server.execute_query("SELECT region,  SUM(amount)\nFROM sales GROUP BY region;")
+        return first, second, server.result_cache.hits - hits
+
+    first, second, hits = run(scenario)
+    assert first == second
+    assert hits == 1
+
+
+def test_query_past_its_deadline_is_interrupted(db_path):
+    slow = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1000000000) SELECT COUNT(*) FROM n"
+
+    async def scenario():
+        result = json.loads(await server.execute_query(slow, timeout_ms=100))
+        after = json.loads(await server.execute_query("SELECT COUNT(*) AS n FROM sales"))
+        return result, after
+
+    result, after = run(scenario)
+    assert result["error"] == "timeout"
+    assert result["timeout_ms"] == 100
+    assert result["elapsed_ms"] < 5000
+    assert after == [{"n": 100}]
+
+
+def test_result_formats_encode_the_same_rows(db_path):
+    query = "SELECT id, region FROM sales WHERE id <= 2 ORDER BY id"
+
+    async def scenario():
+        return [await server.execute_query(query, result_format=f) for f in ("json", "compact", "csv", "xml")]
+
+    as_json, compact, csv_text, unknown = run(scenario)
+    assert json.loads(as_json) == [{"id": 1, "region": "r0"}, {"id": 2, "region": "r1"}]
+    assert json.loads(compact) == {"columns": ["id", "region"], "rows": [[1, "r0"], [2, "r1"]]}
+    assert " " not in compact
+    assert csv_text == "id,region\n1,r0\n2,r1\n"
+    assert json.loads(unknown)["status"] == "error"
+
+
+def test_paged_query_keeps_its_result_format(db_path):
+    async def scenario():
+        first = json.loads(await server.execute_query("SELECT id FROM sales ORDER BY id", max_rows=2, result_format="compact"))
+        second = json.loads(await server.fetch_page(first["page_token"]))
+        return first, second
+
+    first, second = run(scenario)
+    assert first["rows"] == [[1], [2]]
+    assert second["columns"] == ["id"]
+    assert second["rows"] == [[3], [4]]
+
+
+def test_get_schema_lists_columns_indexes_and_row_counts(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE INDEX idx_sales_region ON sales (region)")
+    conn.close()
+
+    async def scenario():
+        return json.loads(await server.get_schema(tables=["sales", "missing"], max_columns=2))
+
+    schema = run(scenario)
+    sales = schema["tables"]["sales"]
+    assert [c["name"] for c in sales["columns"]] == ["id", "region"]
+    assert sales["columns_omitted"] == 2
+    assert sales["indexes"] == [{"name": "idx_sales_region", "columns": ["region"], "unique": False, "origin": "c"}]
+    assert sales["approx_row_count"] == 100
+    assert schema["unknown_tables"] == ["missing"]
+
+
+def test_get_schema_is_rebuilt_after_a_schema_change(db_path):
+    async def scenario():
+        before = json.loads(await server.get_schema())
+        await server.execute_query("CREATE TABLE extra (x)")
+        after = json.loads(await server.get_schema())
+        return before, after
+
+    before, after = run(scenario)
+    assert list(before["tables"]) == ["sales"]
+    assert list(after["tables"]) == ["extra", "sales"]
+    assert after["schema_version"] != before["schema_version"]
+
+
+@pytest.fixture
+def read_only_db(db_path, monkeypatch):
+    """The sales database opened immutable and read-only"""
+    monkeypatch.setattr(server, "READ_ONLY", True)
+    return db_path
+
+
+def test_read_only_mode_rejects_writes_and_serves_reads(read_only_db):
+    async def scenario():
+        write = json.loads(await server.execute_query("DELETE FROM sales"))
+        with pytest.raises(PermissionError):
+            await server.create_user("ann")
+        count = json.loads(await server.execute_query("SELECT COUNT(*) AS n FROM sales"))
+        info = json.loads(await server.get_database_info())
+        return write, count, info
+
+    write, count, info = run(scenario)
+    assert write["status"] == "error"
+    assert count == [{"n": 100}]
+    assert info["read_only"] is True
+    with sqlite3.connect(read_only_db) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sales").fetchone() == (100,)
+    conn.close()
+
+
+def test_read_only_pool_refuses_writer_connections(read_only_db):
+    async def scenario():
+        pool = await server.get_pool()
+        with pytest.raises(PermissionError):
+            async with pool.writer():
+                pass
+        return pool.journal_mode
+
+    assert run(scenario) == "immutable"
+
+
+def test_explain_query_flags_a_full_scan_and_suggests_an_index(db_path):
+    async def scenario():
+        return json.loads(await server.explain_query("SELECT * FROM sales WHERE region = 'r1' ORDER BY amount"))
+
+    plan = run(scenario)
+    assert plan["needs_attention"]
+    assert [scan["table"] for scan in plan["full_scans"]] == ["sales"]
+    assert plan["suggested_indexes"][0]["create_sql"] == (
+        'CREATE INDEX IF NOT EXISTS "idx_sales_region_amount" ON "sales" ("region", "amount")'
+    )
+
+
+def test_advise_indexes_ranks_and_applies_indexes_for_slow_queries(db_path, monkeypatch):
+    monkeypatch.setattr(server, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(server, "slow_query_log", server.SlowQueryLog())
+
+    async def scenario():
+        for region in ("r1", "r2"):
+            await server.execute_query(f"SELECT * FROM sales WHERE region = '{region}'")
+        advice = json.loads(await server.advise_indexes(apply=True))
+        plan = json.loads(await server.explain_query("SELECT * FROM sales WHERE region = 'r3'"))
+        return advice, plan
+
+    advice, plan = run(scenario)
+    # Both queries share one fingerprint
+    assert advice["slow_queries_analyzed"] == 1
+    assert advice["recommendations"][0]["columns"] == ["region"]
+    assert advice["recommendations"][0]["queries_helped"] == 2
+    assert advice["applied"] == ['CREATE INDEX IF NOT EXISTS "idx_sales_region" ON "sales" ("region")']
+    assert not plan["needs_attention"]
+
+
+def test_profile_is_stored_beside_the_database_without_moving_its_data_version(db_path):
+    async def scenario():
+        pool = await server.get_pool()
+        before = await pool.data_version()
+        computed = json.loads(await server.profile_table("sales"))
+        after = await pool.data_version()
+        again = json.loads(await server.profile_table("sales"))
+        return before, after, computed, again
+
+    before, after, computed, again = run(scenario)
+    assert before == after
+    assert (computed["source"], again["source"]) == ("computed", "memory")
+    assert computed["row_count"] == 100
+    assert (db_path.parent / (db_path.name + "-mcp-stats")).exists()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%profile%'").fetchall() == []
+    conn.close()
+
+
+def test_stored_profile_is_reused_after_a_restart(db_path):
+    async def profile():
+        return json.loads(await server.profile_table("sales"))
+
+    assert run(profile)["source"] == "computed"
+    server._default_db = None
+    assert run(profile)["source"] == "stored"
+
+
+def test_writes_drop_the_statistics_of_the_tables_they_touch(db_path):
+    async def scenario():
+        await server.execute_query("CREATE TABLE other (x INTEGER)")
+        await server.profile_table("sales")
+        await server.profile_table("other")
+        await server.insert_rows("other", ["x"], [[1], [2]])
+        sales = json.loads(await server.profile_table("sales"))
+        other = json.loads(await server.profile_table("other"))
+        return sales, other
+
+    sales, other = run(scenario)
+    # Still valid: only other's stored profile was dropped
+    assert sales["source"] == "stored"
+    assert other["source"] == "computed"
+    assert other["row_count"] == 2
+
+
+def test_sample_rows_is_reproducible_with_a_seed_and_honours_where(db_path):
+    async def scenario():
+        first = json.loads(await server.sample_rows("sales", k=5, where="region = 'r1'", seed=7))
+        second = json.loads(await server.sample_rows("sales", k=5, where="region = 'r1'", seed=7))
+        return first, second
+
+    first, second = run(scenario)
+    assert first["method"] == "rowid_probe"
+    assert first["seed"] == 7
+    assert first["rows"] == second["rows"]
+    assert first["row_count"] == 5
+    assert len({row["id"] for row in first["rows"]}) == 5
+    assert {row["region"] for row in first["rows"]} == {"r1"}
+
+
+def test_sample_rows_falls_back_to_a_reservoir_pass_for_views(db_path):
+    async def scenario():
+        await server.execute_query("CREATE VIEW big_sales AS SELECT * FROM sales WHERE amount >= 75")
+        sample = json.loads(await server.sample_rows("big_sales", k=3, seed=1))
+        unknown = json.loads(await server.sample_rows("missing", k=3))
+        return sample, unknown
+
+    sample, unknown = run(scenario)
+    assert sample["method"] == "reservoir"
+    assert sample["rows_read"] == 50
+    assert all(row["amount"] >= 75 for row in sample["rows"])
+    assert unknown["status"] == "error"
+
+
+def test_execute_batch_returns_aligned_results_and_rejects_writes(db_path):
+    async def scenario():
+        return json.loads(await server.execute_batch([
+            "SELECT COUNT(*) AS n FROM sales",
+            "DELETE FROM sales",
+            "SELECT * FROM missing",
+            "SELECT MAX(amount) AS top FROM sales",
+        ], parallel=True))
+
+    batch = run(scenario)
+    results = batch["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert results[0]["rows"] == [{"n": 100}]
+    assert results[1]["status"] == "error"
+    assert results[2]["status"] == "error"
+    assert results[3]["rows"] == [{"top": 148.5}]
+    assert batch["connections"] > 1
+
+
+def test_execute_batch_reads_one_snapshot_while_another_process_commits(db_path):
+    slow = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000000) SELECT COUNT(*) AS c FROM n"
+
+    def insert_elsewhere():
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("INSERT INTO sales (region, amount, note) VALUES ('r9', 1, 'late')")
+        conn.close()
+
+    async def scenario():
+        await server.get_pool()
+
+        async def commit_during_batch():
+            await asyncio.sleep(0.05)
+            await asyncio.to_thread(insert_elsewhere)
+
+        batch, _ = await asyncio.gather(
+            server.execute_batch(["SELECT COUNT(*) AS n FROM sales", slow, "SELECT COUNT(*) AS n FROM sales"]),
+            commit_during_batch(),
+        )
+        after = json.loads(await server.execute_query("SELECT COUNT(*) AS n FROM sales"))
+        return json.loads(batch)["results"], after
+
+    results, after = run(scenario)
+    assert results[0]["rows"] == results[2]["rows"] == [{"n": 100}]
+    assert after == [{"n": 101}]
+
+
+def test_insert_rows_validates_against_the_schema_before_writing(db_path):
+    async def scenario():
+        await server.execute_query("CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT NOT NULL, age INTEGER)")
+        return [json.loads(await server.insert_rows("people", columns, rows)) for columns, rows in [
+            (["name", "height"], [["a", 1]]),
+            (["age"], [[30]]),
+            (["name", "age"], [["a", 1], ["b"]]),
+            (["name", "age"], [["a", {"x": 1}]]),
+            (["name", "age"], [["a", 1], [None, 2]]),
+            (["name", "name"], [["a", "b"]]),
+        ]]
+
+    errors = run(scenario)
+    assert all(e["status"] == "error" for e in errors)
+    assert "height" in errors[0]["message"]
+    assert "name" in errors[1]["message"]
+    assert errors[2]["message"].startswith("Row 1")
+    assert errors[3]["message"].startswith("Row 0")
+    assert "NOT NULL" in errors[4]["message"]
+    assert "Duplicate" in errors[5]["message"]
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM people").fetchone() == (0,)
+    conn.close()
+
+
+def test_insert_rows_writes_every_chunk_in_one_transaction(db_path, monkeypatch):
+    monkeypatch.setattr(server, "INSERT_CHUNK_ROWS", 1000)
+
+    async def scenario():
+        inserted = json.loads(await server.insert_rows(
+            "sales", ["region", "amount"], [["bulk", i] for i in range(5000)]
+        ))
+        # The primary key clash in the last chunk rolls back the earlier ones
+        failed = json.loads(await server.insert_rows(
+            "sales", ["id", "region"], [[10_000 + i, "dup"] for i in range(2500)] + [[1, "dup"]]
+        ))
+        return inserted, failed
+
+    inserted, failed = run(scenario)
+    assert inserted["inserted_rows"] == 5000
+    assert inserted["rows_per_second"] > 0
+    assert failed["status"] == "error"
+    assert "no rows were inserted" in failed["message"]
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sales WHERE region = 'bulk'").fetchone() == (5000,)
+        assert conn.execute("SELECT COUNT(*) FROM sales WHERE region = 'dup'").fetchone() == (0,)
+    conn.close()
+
+
+def test_analyze_columns_reuses_loaded_arrays_until_the_data_changes(db_path):
+    async def scenario():
+        first = json.loads(await server.analyze_columns("sales", ["amount", "id"], target="amount"))
+        grouped = json.loads(await server.analyze_columns("sales", ["AMOUNT"], group_by="region", max_groups=2))
+        await server.insert_rows("sales", ["region", "amount"], [["r0", 1000]])
+        changed = json.loads(await server.analyze_columns("sales", ["amount"]))
+        return first, grouped, changed
+
+    first, grouped, changed = run(scenario)
+    assert first["cache"] == "miss"
+    assert first["columns"]["amount"]["quantiles"]["p50"] == 74.25
+    assert first["regression"]["coefficients"] == {"id": 1.5}
+    assert first["correlation"]["matrix"][0][1] == 1
+    assert grouped["cache"] == "partial"
+    assert grouped["grouped"]["group_count"] == 5
+    assert len(grouped["grouped"]["groups"]) == 2
+    assert changed["cache"] == "miss"
+    assert changed["rows"] == 101
+
+
+def test_approximate_aggregate_labels_estimates_and_reuses_the_sketch(db_path):
+    async def scenario():
+        first = json.loads(await server.approximate_aggregate("sales", "region", seed=3, sample_size=100))
+        again = json.loads(await server.approximate_aggregate("sales", "region", ["count_distinct"]))
+        server._db().sketches.clear()
+        stored = json.loads(await server.approximate_aggregate("sales", "region", ["count_distinct"]))
+        return first, again, stored
+
+    first, again, stored = run(scenario)
+    assert first["approximate"]
+    assert round(first["results"]["count_distinct"]["estimate"]) == 5
+    assert first["results"]["count_distinct"]["sketch"] == "computed"
+    count = first["results"]["count"]
+    assert count["ci_low"] <= 100 <= count["ci_high"]
+    assert again["results"]["count_distinct"]["sketch"] == "memory"
+    assert stored["results"]["count_distinct"]["sketch"] == "stored"
+
+
+def test_filtered_count_distinct_is_counted_by_sqlite(db_path):
+    async def scenario():
+        return json.loads(await server.approximate_aggregate(
+            "sales", "note", ["count_distinct"], where="region IN ('r1', 'r2')"
+        ))
+
+    result = run(scenario)
+    assert not result["approximate"]
+    assert result["results"]["count_distinct"] == {"estimate": 40, "ci_low": 40, "ci_high": 40, "exact": True}
+
+
+def test_table_fingerprint_tracks_appends_without_counting_rows(db_path):
+    async def fingerprint():
+        pool = await server.get_pool()
+        async with pool.reader() as db:
+            return await server._table_fingerprint(db, "sales")
+
+    before = run(fingerprint)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO sales (region) VALUES ('r0')")
+    conn.close()
+    assert run(fingerprint) != before
+
+
+def make_reviews(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE reviews (id INTEGER PRIMARY KEY, body TEXT)")
+        conn.executemany("INSERT INTO reviews (body) VALUES (?)", [
+            ("The refund arrived late and support never answered my emails",),
+            ("Great product, fast delivery and friendly support staff",),
+            ("Still waiting for my refunds after three weeks of emails",),
+        ])
+        conn.execute("CREATE TABLE codes (code TEXT PRIMARY KEY, label TEXT) WITHOUT ROWID")
+        conn.execute("INSERT INTO codes VALUES ('r1', 'refund requested')")
+    conn.close()
+
+
+def test_search_text_indexes_long_text_columns_on_first_use(db_path):
+    make_reviews(db_path)
+
+    async def scenario():
+        first = json.loads(await server.search_text("reviews", "refund emails"))
+        second = json.loads(await server.search_text("reviews", "refund emails"))
+        return first, second
+
+    first, second = run(scenario)
+    assert first["method"] == second["method"] == "fts"
+    assert first["indexed_columns"] == ["body"]
+    assert "index_built_ms" in first and "index_built_ms" not in second
+    assert sorted(row["rowid"] for row in first["rows"]) == [1, 3]
+
+
+def test_search_text_scans_short_text_and_opted_out_tables_with_like(db_path):
+    make_reviews(db_path)
+
+    async def scenario():
+        short = json.loads(await server.search_text("sales", "note 7", mode="phrase"))
+        opted_out = json.loads(await server.search_text("reviews", "refund emails", build_index=False))
+        return short, opted_out
+
+    short, opted_out = run(scenario)
+    assert short["method"] == opted_out["method"] == "like"
+    assert [row["id"] for row in short["rows"]] == [8, 71, 72, 73, 74, 75, 76, 77, 78, 79]
+    assert sorted(row["id"] for row in opted_out["rows"]) == [1, 3]
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '_mcp_fts_%'").fetchone() == (0,)
+    conn.close()
+
+
+def test_search_text_falls_back_to_like_when_the_index_cannot_be_built(db_path, monkeypatch):
+    make_reviews(db_path)
+
+    async def no_fts5(pool, table_name, columns):
+        raise sqlite3.OperationalError("no such module: fts5")
+
+    monkeypatch.setattr(server, "_build_text_index", no_fts5)
+
+    async def scenario():
+        return json.loads(await server.search_text("reviews", "refund emails"))
+
+    result = run(scenario)
+    assert result["method"] == "like"
+    assert result["index_error"] == "no such module: fts5"
+    assert sorted(row["id"] for row in result["rows"]) == [1, 3]
+
+
+def test_search_text_uses_the_index_once_it_is_built(db_path):
+    make_reviews(db_path)
+
+    async def scenario():
+        created = json.loads(await server.create_text_index("reviews"))
+        await server.insert_rows("reviews", ["body"], [["Refunded quickly, no emails needed"]])
+        found = json.loads(await server.search_text("reviews", "refund emails"))
+        return created, found
+
+    created, found = run(scenario)
+    assert created["columns"] == ["body"]
+    assert found["method"] == "fts"
+    # Stemming finds "refunds" and "Refunded"; the trigger indexed the new row
+    assert sorted(row["rowid"] for row in found["rows"]) == [1, 3, 4]
+    assert "**" in found["rows"][0]["snippet"]
+
+
+def test_without_rowid_tables_are_searched_with_like_and_cannot_be_indexed(db_path):
+    make_reviews(db_path)
+
+    async def scenario():
+        created = json.loads(await server.create_text_index("codes"))
+        found = json.loads(await server.search_text("codes", "refund"))
+        return created, found
+
+    created, found = run(scenario)
+    assert created["status"] == "error"
+    assert "WITHOUT ROWID" in created["message"]
+    assert found["method"] == "like"
+    assert found["rows"] == [{"code": "r1", "label": "refund requested"}]
+
+
+def test_attached_database_can_be_joined_and_detached(db_path, monkeypatch):
+    with sqlite3.connect(db_path.parent / "targets.db") as conn:
+        conn.execute("CREATE TABLE goals (region TEXT, goal REAL)")
+        conn.execute("INSERT INTO goals VALUES ('r1', 500)")
+    conn.close()
+    other = server.Database(str(db_path.parent / "other.db"))
+    monkeypatch.setattr(server.result_cache, "_entries", server.result_cache._entries.copy())
+    server.result_cache.put(f"{other.cache_prefix}:json:SELECT 1", "cached", version=1)
+
+    async def scenario():
+        attached = json.loads(await server.attach_database("targets.db"))
+        joined = json.loads(await server.execute_query(
+            "SELECT s.region, COUNT(*) AS n, g.goal FROM sales s JOIN targets.goals g USING (region) GROUP BY s.region"
+        ))
+        missing = json.loads(await server.attach_database("nope.db"))
+        detached = json.loads(await server.detach_database("targets"))
+        after = json.loads(await server.execute_query("SELECT * FROM targets.goals"))
+        return attached, joined, missing, detached, after
+
+    attached, joined, missing, detached, after = run(scenario)
+    assert attached["tables"] == ["targets.goals"]
+    assert joined == [{"region": "r1", "n": 20, "goal": 500.0}]
+    assert "targets.db" not in missing["message"]
+    assert detached["status"] == "success"
+    assert after["status"] == "error"
+    # Another database's cached results survive the attach and detach
+    assert server.result_cache.get(f"{other.cache_prefix}:json:SELECT 1", 1) == "cached"
+
+
+def test_memory_mirror_serves_reads_and_copies_writes_back_to_the_file(db_path, monkeypatch):
+    monkeypatch.setattr(server, "MEMORY_MIRROR_MAX_BYTES", 10 * 1024 * 1024)
+
+    async def scenario():
+        await server.execute_query("UPDATE sales SET note = 'mirrored' WHERE id = 1")
+        read = json.loads(await server.execute_query("SELECT note FROM sales WHERE id = 1"))
+        return read, json.loads(await server.memory_usage())
+
+    read, usage = run(scenario)
+    assert read == [{"note": "mirrored"}]
+    assert usage["pool"]["memory_mirror"]
+    assert usage["pool"]["mirror_bytes"] > 0
+    assert usage["pool"]["writebacks"] == 1
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT note FROM sales WHERE id = 1").fetchone() == ("mirrored",)
+    conn.close()
+
+
+def test_database_above_the_mirror_limit_is_served_from_the_file(db_path, monkeypatch):
+    monkeypatch.setattr(server, "MEMORY_MIRROR_MAX_BYTES", 1024)
+
+    async def scenario():
+        return json.loads(await server.memory_usage())
+
+    usage = run(scenario)
+    assert not usage["pool"]["memory_mirror"]
+    assert "mirror_bytes" not in usage["pool"]
+
+
+def test_query_stats_groups_calls_by_fingerprint(db_path, monkeypatch):
+    monkeypatch.setattr(server, "query_log", server.QueryStatsLog(max_records=100))
+
+    async def scenario():
+        for region in ("r1", "r2", "r1"):
+            await server.execute_query(f"SELECT * FROM sales WHERE region = '{region}'")
+        await server.execute_query("SELECT COUNT(*) FROM sales")
+        return json.loads(await server.query_stats(order_by="calls"))
+
+    stats = run(scenario)
+    top = stats["fingerprints"][0]
+    assert stats["records"] == 4
+    assert stats["distinct_fingerprints"] == 2
+    assert top["fingerprint"] == "select * from sales where region = ?"
+    assert top["calls"] == 3
+    assert top["rows"] == 60
+    # The repeated query was answered from the result cache
+    assert top["cache_hit_rate"] == round(1 / 3, 4)
+
+
+def test_export_query_streams_every_row_to_a_file(db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_CHUNK_ROWS", 7)
+
+    async def scenario():
+        plain = json.loads(await server.export_query("SELECT id, region FROM sales ORDER BY id", file_name="sales"))
+        packed = json.loads(await server.export_query(
+            "SELECT id, note FROM sales WHERE region = 'r1'", file_format="ndjson", compress=True
+        ))
+        rejected = json.loads(await server.export_query("DELETE FROM sales"))
+        return plain, packed, rejected
+
+    plain, packed, rejected = run(scenario)
+    exports = tmp_path / "exports"
+    lines = (exports / plain["file_name"]).read_text().splitlines()
+    assert plain["row_count"] == 100
+    assert plain["file_name"].startswith("sales-")
+    assert lines[:2] == ["id,region", "1,r0"]
+    assert len(lines) == 101
+
+    with gzip.open(exports / packed["file_name"], "rt") as handle:
+        records = [json.loads(line) for line in handle]
+    assert packed["row_count"] == len(records) == 20
+    assert records[0] == {"id": 2, "note": "note 1"}
+    assert rejected["status"] == "error"
+    assert not list(exports.glob("*.part"))
+
+
+def test_sql_functions_are_available_on_readers_and_the_writer(db_path):
+    async def scenario():
+        read = json.loads(await server.execute_query(
+            "SELECT median(amount) AS m, stddev(amount) > 0 AS spread FROM sales"
+        ))
+        await server.execute_query("CREATE TABLE medians AS SELECT region, median(amount) AS m FROM sales GROUP BY region")
+        written = json.loads(await server.execute_query("SELECT m FROM medians WHERE region = 'r0'"))
+        return read, written
+
+    read, written = run(scenario)
+    assert read == [{"m": 74.25, "spread": 1}]
+    assert written == [{"m": 71.25}]
+
+
+def test_standby_open_database_succeeds_when_clients_cannot_be_notified(tmp_path, monkeypatch):
+    path = make_sales_db(tmp_path / "sales.db")
+    for name in ("STANDBY", "READ_ONLY", "ATTACHMENTS", "ATTACH_DIR", "EXPORT_URL"):
+        monkeypatch.setattr(server, name, getattr(server, name))
+    monkeypatch.setattr(server, "STANDBY", True)
+    server.mcp.add_tool(server.open_database)
+
+    async def scenario():
+        # Called outside an MCP request there is no session to notify
+        opened = json.loads(await server.open_database(str(path)))
+        rows = json.loads(await server.execute_query("SELECT COUNT(*) AS n FROM sales"))
+        return opened, rows
+
+    opened, rows = run(scenario)
+    assert opened["status"] == "success"
+    assert rows == [{"n": 100}]
+    assert not server.STANDBY
+    assert "open_database" not in {t.name for t in asyncio.run(server.mcp.list_tools())}
@@ -0,0 +1,38 @@
+"""
+Tests for the full-text search SQL builders
+Run with: python -m pytest -q test_text_search.py
+"""
+import sqlite3
+
+import pytest
+
+import text_search
+
+
+def test_match_query_quotes_every_word():
+    assert text_search.build_match_query("refund AND late!") == '"refund" "AND" "late"'
+    assert text_search.build_match_query("refund late", "any") == '"refund" OR "late"'
+    assert text_search.build_match_query("refund late", "phrase") == '"refund late"'
+    with pytest.raises(ValueError):
+        text_search.build_match_query("!!")
+
+
+def test_like_filter_matches_words_in_any_column():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (a TEXT, b TEXT)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [
+        ("late refund", None), ("refund", "was late"), ("late", "x"), ("snake_case", "100%"), ("snakeXcase", None),
+    ])
+
+    def search(text, mode="all"):
+        condition, params = text_search.build_like_filter(["a", "b"], text, mode)
+        return conn.execute(f"SELECT rowid FROM t WHERE {condition} ORDER BY rowid", params).fetchall()
+
+    assert search("refund late") == [(1,), (2,)]
+    assert search("refund late", "any") == [(1,), (2,), (3,)]
+    assert search("late refund", "phrase") == [(1,)]
+    # _ is a literal, not a LIKE wildcard
+    assert search("snake_case") == [(4,)]
+    with pytest.raises(ValueError):
+        text_search.build_like_filter(["a"], "x", "raw")
+    conn.close()
@@ -0,0 +1,124 @@
+"""
+Tests for per-user session eviction and restore
+Run with: python -m pytest -q test_user_sessions.py
+"""
+import asyncio
+
+import user_sessions
+from user_sessions import ANONYMOUS, SessionActivityMiddleware, UserSessionManager
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+async def connect(sessions, username):
+    client = sessions.clients[username] = FakeClient()
+    await sessions.connected(username, {"db_path": f"{username}.db"}, tools=["execute_query"])
+    return client
+
+
+def test_idle_users_are_evicted_and_restored_on_their_next_request():
+    restored = []
+
+    async def restore(username, snapshot):
+        restored.append((username, snapshot))
+        await connect(sessions, username)
+
+    async def scenario():
+        sessions.start(restore=restore)
+        try:
+            idle, active = await connect(sessions, "idle"), await connect(sessions, "active")
+            sessions.begin("active")
+            await sessions.sweep()
+            evicted = sessions.is_evicted("idle"), sessions.is_evicted("active")
+            tools = sessions.evicted_tools("idle")
+            sessions.end("active")
+            await sessions.restore("idle")
+        finally:
+            await sessions.close()
+        return idle, active, evicted, tools
+
+    sessions = UserSessionManager(idle_ttl_seconds=0.000001)
+    idle, active, evicted, tools = asyncio.run(scenario())
+    assert evicted == (True, False)
+    assert idle.closed and not active.closed
+    assert tools == ["execute_query"]
+    assert restored == [("idle", {"sqlite": {"db_path": "idle.db"}, "notion": []})]
+    assert "idle" in sessions.clients and not sessions.is_evicted("idle")
+    assert sessions.evictions["idle"] == 1 and sessions.restores == 1
+
+
+def test_capacity_evicts_the_least_recently_used_idle_user():
+    async def scenario():
+        first = await connect(sessions, "first")
+        second = await connect(sessions, "second")
+        sessions.touch("first")
+        third = await connect(sessions, "third")
+        return first, second, third
+
+    sessions = UserSessionManager(max_live=2)
+    first, second, third = asyncio.run(scenario())
+    assert second.closed and not first.closed and not third.closed
+    assert set(sessions.clients) == {"first", "third"}
+    assert sessions.evictions["capacity"] == 1
+
+
+def test_memory_pressure_evicts_a_bounded_number_of_users_per_sweep(monkeypatch):
+    # Memory stays short: closed servers do not give theirs back at once
+    monkeypatch.setattr(user_sessions, "available_memory_mb", lambda: 100.0)
+
+    async def scenario():
+        clients = [await connect(sessions, name) for name in ("a", "b", "c", "d")]
+        await sessions.sweep()
+        first = sorted(name for name in "abcd" if sessions.is_evicted(name))
+        await sessions.sweep()
+        second = sorted(name for name in "abcd" if sessions.is_evicted(name))
+        return clients, first, second
+
+    sessions = UserSessionManager(min_available_mb=512, memory_evictions_per_sweep=1)
+    clients, first, second = asyncio.run(scenario())
+    # Least recently used first, one per sweep
+    assert first == ["a"]
+    assert second == ["a", "b"]
+    assert [c.closed for c in clients] == [True, True, False, False]
+    assert sessions.evictions["memory"] == 2
+
+
+def test_eviction_skips_a_locked_user_and_keeps_their_lock():
+    async def scenario():
+        await connect(sessions, "u")
+        lock = sessions.lock("u")
+        async with lock:
+            held = await sessions.evict("u", "idle")
+        released = await sessions.evict("u", "idle")
+        return lock, held, released
+
+    sessions = UserSessionManager()
+    lock, held, released = asyncio.run(scenario())
+    assert not held and released
+    # Requests waiting on the old lock and new ones still serialize on one lock
+    assert sessions.lock("u") is lock
+
+
+def test_anonymous_requests_keep_the_anonymous_user_busy():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append({username: state.busy for username, state in sessions._states.items() if state.busy})
+
+    sessions = UserSessionManager()
+    middleware = SessionActivityMiddleware(app, sessions=sessions, passive_paths=("/api/status",))
+
+    async def scenario():
+        await middleware({"type": "http", "path": "/api/chat", "session": {}}, None, None)
+        await middleware({"type": "http", "path": "/api/status", "session": {}}, None, None)
+        await middleware({"type": "http", "path": "/api/chat", "session": {"username": "alice"}}, None, None)
+
+    asyncio.run(scenario())
+    assert seen == [{ANONYMOUS: 1}, {}, {"alice": 1}]
+    assert all(state.busy == 0 for state in sessions._states.values())
@@ -0,0 +1,108 @@
+"""
+Text Search
+FTS5 full-text indexes kept in sync with their base table by triggers
+"""
+import re
+from typing import List, Tuple
+
+# Prefix of every object created here; the server hides _mcp_* tables
+INDEX_PREFIX = "_mcp_fts_"
+
+MATCH_MODES = ("all", "any", "phrase", "raw")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def index_name(table: str) -> str:
+    """Name of the FTS5 table that indexes table"""
+    return f"{INDEX_PREFIX}{table}"
+
+
+def create_index_sql(table: str, columns: List[str]) -> List[str]:
+    """
+    Statements that create an external-content FTS5 index over columns,
+    triggers that keep it in sync, and fill it from the existing rows
+
+    The index stores only the inverted lists; the text itself is read back
+    from the base table by rowid when snippets are built.
+    """
+    fts = _quote(index_name(table))
+    base = _quote(table)
+    content = "'" + table.replace("'", "''") + "'"
+    cols = ", ".join(_quote(c) for c in columns)
+    new_values = ", ".join(f"new.{_quote(c)}" for c in columns)
+    old_values = ", ".join(f"old.{_quote(c)}" for c in columns)
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_values});"
+    insert_new = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_values});"
+
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content={content}, content_rowid='rowid', "
+        "tokenize='porter unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER {_quote(index_name(table) + '_ai')} AFTER INSERT ON {base} BEGIN {insert_new} END",
+        f"CREATE TRIGGER {_quote(index_name(table) + '_ad')} AFTER DELETE ON {base} BEGIN {delete_old} END",
+        f"CREATE TRIGGER {_quote(index_name(table) + '_au')} AFTER UPDATE ON {base} BEGIN {delete_old} {insert_new} END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def drop_index_sql(table: str) -> List[str]:
+    """Statements that remove the index and its triggers"""
+    return [
+        f"DROP TRIGGER IF EXISTS {_quote(index_name(table) + suffix)}"
+        for suffix in ("_ai", "_ad", "_au")
+    ] + [f"DROP TABLE IF EXISTS {_quote(index_name(table))}"]
+
+
+def build_match_query(text: str, mode: str = "all") -> str:
+    """
+    Turn user keywords into an FTS5 MATCH expression
+
+    Each word is quoted so punctuation and FTS5 operators in the input are
+    treated as plain text.
+
+    Args:
+        text: Keywords typed by the user
+        mode: "all" (every word), "any" (at least one word), "phrase"
+            (the words in order) or "raw" (text is already FTS5 syntax)
+    """
+    if mode == "raw":
+        return text
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        raise ValueError("Search text contains no words")
+    quoted = [f'"{t}"' for t in tokens]
+    if mode == "phrase":
+        return '"' + " ".join(tokens) + '"'
+    if mode == "any":
+        return " OR ".join(quoted)
+    return " ".join(quoted)
+
+
+def build_like_filter(columns: List[str], text: str, mode: str = "all") -> Tuple[str, List[str]]:
+    """
+    A WHERE expression matching the same keywords with LIKE, for tables
+    that have no full-text index
+
+    Words match as case-insensitive substrings, without stemming, and every
+    row is read, so this is a fallback rather than a replacement.
+
+    Returns:
+        (SQL expression, parameters)
+    """
+    if mode == "raw":
+        raise ValueError("mode 'raw' needs a full-text index; call create_text_index first")
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        raise ValueError("Search text contains no words")
+    words = [" ".join(tokens)] if mode == "phrase" else tokens
+    in_any_column = "(" + " OR ".join(f"{_quote(c)} LIKE ? ESCAPE '\\'" for c in columns) + ")"
+    params = []
+    for word in words:
+        escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params.extend([f"%{escaped}%"] * len(columns))
+    joiner = " OR " if mode == "any" else " AND "
+    return joiner.join([in_any_column] * len(words)), params
@@ -0,0 +1,349 @@
+"""
+User Sessions
+Per-user MCP clients and agents with idle, capacity and memory-pressure eviction
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Session key of visitors who have not logged in; they share one set of clients
+ANONYMOUS = "anonymous"
+
+
+def session_username(session: Dict[str, Any]) -> str:
+    """The user a session's requests are served as: its login, else ANONYMOUS"""
+    return session.get("username") or ANONYMOUS
+
+
+def available_memory_mb() -> Optional[float]:
+    """Memory the system can still hand out, where the platform exposes it"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.virtual_memory().available / 1024 / 1024
+
+
+@dataclass
+class _UserState:
+    """Bookkeeping for one user, kept while their clients are evicted"""
+    last_used: float = field(default_factory=time.monotonic)
+    # Requests being served for the user right now
+    busy: int = 0
+    # How to bring the SQLite client back (given to the restore callback)
+    sqlite: Optional[Dict[str, Any]] = None
+    # Tools of the SQLite client, shown while it is evicted
+    tools: list = field(default_factory=list)
+    # Notion workspaces the user had open when evicted
+    notion: list = field(default_factory=list)
+    evicted: bool = False
+
+
+class UserSessionManager:
+    """
+    Owns the per-user clients, agents, Notion clients and locks, and evicts
+    them when a user goes idle, when there are too many live clients, or
+    when the system runs low on memory
+
+    Evicting closes the user's clients (their SQLite server, for a process
+    per user) and drops the agents with their conversation history; only a
+    small record of how to reconnect is kept. The next chat request restores
+    the clients through the restore callback and the agents hydrate their
+    history from the chat database, so the user does not notice.
+    """
+
+    def __init__(
+        self,
+        idle_ttl_seconds: float = 1800,
+        max_live: int = 50,
+        min_available_mb: float = 0,
+        sweep_interval_seconds: float = 30,
+        forget_after_seconds: float = 7 * 24 * 3600,
+        memory_evictions_per_sweep: int = 1
+    ):
+        """
+        Args:
+            idle_ttl_seconds: Evict users with no request for this long (0 disables)
+            max_live: Most users with a live SQLite client; the least recently
+                used idle ones are evicted beyond it (0 disables)
+            min_available_mb: Evict least recently used idle users while the
+                system has less memory available than this (0 disables)
+            sweep_interval_seconds: How often idle TTL and memory are checked
+            forget_after_seconds: Drop the reconnect record of users evicted this long
+            memory_evictions_per_sweep: Most users evicted for memory by one
+                sweep; a closed server's memory is not available at once, so
+                the next sweep measures again before evicting more
+        """
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_live = max_live
+        self.min_available_mb = min_available_mb
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self.forget_after_seconds = forget_after_seconds
+        self.memory_evictions_per_sweep = max(1, memory_evictions_per_sweep)
+
+        self.clients: Dict[str, Any] = {}
+        self.agents: Dict[str, Any] = {}
+        self.stream_agents: Dict[str, Any] = {}
+        self.notion_clients: Dict[str, Dict[str, Any]] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+
+        # Least recently used first
+        self._states: "OrderedDict[str, _UserState]" = OrderedDict()
+        self._restore: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self.evictions = {"idle": 0, "capacity": 0, "memory": 0}
+        self.restores = 0
+        self.failed_restores = 0
+
+    def _state(self, username: str) -> _UserState:
+        state = self._states.get(username)
+        if state is None:
+            state = self._states[username] = _UserState()
+        return state
+
+    def lock(self, username: str) -> asyncio.Lock:
+        """The lock serializing connect/switch/restore for a user"""
+        if username not in self.locks:
+            self.locks[username] = asyncio.Lock()
+        return self.locks[username]
+
+    def touch(self, username: str) -> None:
+        """Record activity for a user"""
+        state = self._state(username)
+        state.last_used = time.monotonic()
+        self._states.move_to_end(username)
+
+    def begin(self, username: str) -> None:
+        """A request for the user started; busy users are never evicted"""
+        self.touch(username)
+        self._states[username].busy += 1
+
+    def end(self, username: str) -> None:
+        """A request started with begin() finished"""
+        state = self._states.get(username)
+        if state is not None:
+            state.busy -= 1
+            state.last_used = time.monotonic()
+
+    async def connected(self, username: str, sqlite: Dict[str, Any], tools: list) -> None:
+        """
+        The user has a new live SQLite client; may evict others beyond max_live
+
+        Args:
+            username: The user
+            sqlite: How to reconnect it, passed back to the restore callback
+            tools: The client's tools as shown by /api/status
+        """
+        state = self._state(username)
+        state.sqlite, state.tools, state.evicted = sqlite, tools, False
+        self.touch(username)
+        await self._enforce_capacity(keep=username)
+
+    def forget(self, username: str) -> None:
+        """The user disconnected on purpose: do not reconnect them"""
+        state = self._states.get(username)
+        if state is not None:
+            state.sqlite, state.tools, state.notion, state.evicted = None, [], [], False
+
+    def is_evicted(self, username: Optional[str]) -> bool:
+        state = self._states.get(username) if username else None
+        return state is not None and state.evicted
+
+    def evicted_tools(self, username: str) -> list:
+        """The SQLite tools of an evicted user, as they were when evicted"""
+        state = self._states.get(username)
+        return list(state.tools) if state is not None and state.evicted else []
+
+    def evicted_sqlite(self, username: str) -> Optional[Dict[str, Any]]:
+        """How an evicted user's SQLite client would be reconnected"""
+        state = self._states.get(username)
+        return state.sqlite if state is not None and state.evicted else None
+
+    def _evictable(self, username: str) -> bool:
+        state = self._states.get(username)
+        if state is None or state.busy > 0:
+            return False
+        lock = self.locks.get(username)
+        return lock is None or not lock.locked()
+
+    def _has_clients(self, username: str) -> bool:
+        return username in self.clients or bool(self.notion_clients.get(username)) or username in self.agents
+
+    async def evict(self, username: str, reason: str) -> bool:
+        """Close a user's clients and drop their agents; False if the user is busy"""
+        if not self._evictable(username) or not self._has_clients(username):
+            return False
+        state = self._states[username]
+        client = self.clients.pop(username, None)
+        self.agents.pop(username, None)
+        self.stream_agents.pop(username, None)
+        notion = self.notion_clients.pop(username, {})
+        # The lock stays: a request may be waiting on it, and a new lock would
+        # let the next one connect or restore alongside it
+        state.notion = list(notion)
+        state.evicted = (client is not None and state.sqlite is not None) or bool(notion)
+        if client is None:
+            state.sqlite, state.tools = None, []
+        self.evictions[reason] += 1
+        logger.info(f"Evicted session of {username} ({reason})")
+
+        for closing in [client, *notion.values()]:
+            if closing is None:
+                continue
+            try:
+                await closing.close()
+            except Exception as e:
+                logger.warning(f"Error closing evicted client of {username}: {e}")
+        return True
+
+    async def restore(self, username: str) -> bool:
+        """
+        Reconnect an evicted user's clients; True if anything was restored
+
+        History is not restored here: the fresh agents hydrate it from the
+        chat database on their first message.
+        """
+        if not self.is_evicted(username) or self._restore is None:
+            return False
+        async with self.lock(username):
+            state = self._states.get(username)
+            if state is None or not state.evicted:
+                return False
+            snapshot = {"sqlite": state.sqlite, "notion": list(state.notion)}
+            state.evicted = False
+            state.notion = []
+            try:
+                await self._restore(username, snapshot)
+            except Exception as e:
+                self.failed_restores += 1
+                logger.error(f"Could not restore session of {username}: {e}")
+                state.sqlite, state.tools = None, []
+                return False
+            self.restores += 1
+            self.touch(username)
+            logger.info(f"Restored session of {username}")
+        return True
+
+    async def _enforce_capacity(self, keep: str) -> None:
+        if self.max_live <= 0:
+            return
+        for username in list(self._states):
+            if len(self.clients) <= self.max_live:
+                return
+            if username != keep and username in self.clients:
+                await self.evict(username, "capacity")
+        if len(self.clients) > self.max_live:
+            logger.warning(f"{len(self.clients)} live sessions exceed the limit of {self.max_live}; all others are busy")
+
+    async def sweep(self) -> None:
+        """Evict idle users, then up to memory_evictions_per_sweep least recently used ones if memory is short"""
+        now = time.monotonic()
+        for username, state in list(self._states.items()):
+            idle_for = now - state.last_used
+            if self.idle_ttl_seconds > 0 and idle_for >= self.idle_ttl_seconds:
+                await self.evict(username, "idle")
+            if (
+                not self._has_clients(username)
+                and state.busy == 0
+                and (not state.evicted or idle_for >= self.forget_after_seconds)
+            ):
+                del self._states[username]
+
+        if self.min_available_mb > 0:
+            available = available_memory_mb()
+            if available is None or available >= self.min_available_mb:
+                return
+            evicted = 0
+            for username in list(self._states):
+                if evicted >= self.memory_evictions_per_sweep:
+                    break
+                if await self.evict(username, "memory"):
+                    evicted += 1
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+
+    def start(self, restore: Callable[[str, Dict[str, Any]], Awaitable[None]]) -> None:
+        """
+        Start the background sweep
+
+        Args:
+            restore: Called as restore(username, {"sqlite": ..., "notion": [...]})
+                to reconnect an evicted user's clients
+        """
+        self._restore = restore
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def close(self) -> None:
+        """Stop the sweep (the app closes the clients themselves)"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Live, idle (live but not serving a request) and evicted user counts"""
+        busy = sum(1 for username in self.clients if username in self._states and self._states[username].busy > 0)
+        return {
+            "live": len(self.clients),
+            "idle": len(self.clients) - busy,
+            "busy": busy,
+            "evicted": sum(1 for state in self._states.values() if state.evicted),
+            "evictions": dict(self.evictions),
+            "restores": self.restores,
+            "failed_restores": self.failed_restores,
+            "limits": {
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "max_live": self.max_live,
+                "min_available_mb": self.min_available_mb,
+            },
+            "available_memory_mb": available_memory_mb(),
+        }
+
+
+class SessionActivityMiddleware:
+    """
+    ASGI middleware marking the session's user busy for the whole request,
+    streamed responses included, so they are not evicted mid-request
+
+    Add it before SessionMiddleware so it runs inside it. Sessions without a
+    login count as ANONYMOUS, the key their clients are kept and evicted
+    under. Requests to passive_paths (status polls) neither keep a user
+    alive nor count as busy.
+    """
+
+    def __init__(self, app, sessions: UserSessionManager, passive_paths: tuple = ()):
+        self.app = app
+        self.sessions = sessions
+        self.passive_paths = passive_paths
+
+    async def __call__(self, scope, receive, send):
+        username = None
+        if scope["type"] == "http" and scope.get("path") not in self.passive_paths:
+            username = session_username(scope.get("session", {}))
+        if username is None:
+            await self.app(scope, receive, send)
+            return
+        self.sessions.begin(username)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.sessions.end(username)